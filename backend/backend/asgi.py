@@ -2,6 +2,10 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Unless DJANGO_ASYNC_VIEWS is set otherwise, the API is served by the async
+routers in ``sensors.async_views``. Run it in production with e.g.
+
+    uvicorn backend.asgi:application --host 0.0.0.0 --port 8000 --workers 4
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,5 +16,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
@@ -0,0 +1,19 @@
+"""
+ASGI config for the device ingestion fast path (see sensors.fastpath).
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it as its own server next to ``backend.asgi``, e.g.
+
+    uvicorn backend.ingest_asgi:application --host 0.0.0.0 --port 8001 --workers 4
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup(set_prefix=False)
+
+from sensors.fastpath import IngestASGIHandler  # noqa: E402
+
+application = IngestASGIHandler()
@@ -0,0 +1,17 @@
+"""
+WSGI config for the device ingestion fast path (see sensors.fastpath).
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+Run it as its own server next to ``backend.wsgi``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup(set_prefix=False)
+
+from sensors.fastpath import IngestWSGIHandler  # noqa: E402
+
+application = IngestWSGIHandler()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -54,6 +55,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request profiling (see sensors.profiling): Server-Timing headers, /metrics and sampled
+# cProfile/pyinstrument dumps of requests slower than PROFILING_SLOW_MS into PROFILING_DIR.
+
+PROFILING = os.getenv('PROFILING', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', '500'))
+PROFILING_PROFILER = os.getenv('PROFILING_PROFILER', 'cprofile')
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+# Bearer token /metrics requires when set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+if PROFILING:
+    MIDDLEWARE.insert(0, 'sensors.profiling.ProfilingMiddleware')
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -73,6 +88,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Serve the async sensors/readings routers (sensors.async_views). backend.asgi turns this on.
+ASYNC_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS', 'false').lower() == 'true'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -85,9 +103,117 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('POSTGRES_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+        'OPTIONS': {},
     }
 }
 
+# Connection reuse
+# With POSTGRES_POOL each process keeps a psycopg connection pool and requests borrow
+# from it; otherwise a thread keeps its connection for POSTGRES_CONN_MAX_AGE seconds
+# (0 closes it after every request). Persistent connections are per thread, which
+# doesn't fit async views, so the pool is the default under ASGI.
+
+if os.getenv('POSTGRES_POOL', str(ASYNC_VIEWS)).lower() == 'true':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT', '10')),
+    }
+
+
+# Cache
+# Local memory per process by default; set REDIS_URL to share one cache between workers.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Seconds a cached sensor list/detail/models response lives (0 disables the response cache).
+# Off without REDIS_URL: each worker's local memory would keep serving, and 304-ing, data
+# another worker has already changed.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300' if os.getenv('REDIS_URL') else '0'))
+
+
+# JWT authentication
+# Validated tokens are cached per process; set JWT_AUTH_CACHE_SIZE=0 to disable.
+# With JWT_TRUST_CLAIMS the signed user id and active flag are used without a DB lookup,
+# so a deactivated user keeps access until their token expires.
+
+JWT_AUTH_CACHE_SIZE = int(os.getenv('JWT_AUTH_CACHE_SIZE', '1024'))
+JWT_AUTH_CACHE_TTL = int(os.getenv('JWT_AUTH_CACHE_TTL', '60'))
+JWT_TRUST_CLAIMS = os.getenv('JWT_TRUST_CLAIMS', 'false').lower() == 'true'
+
+# Sensor ingest keys verified against the database are cached per process. A key revoked in
+# another process keeps working here for up to INGEST_KEY_CACHE_TTL seconds.
+INGEST_KEY_CACHE_SIZE = int(os.getenv('INGEST_KEY_CACHE_SIZE', '10000'))
+INGEST_KEY_CACHE_TTL = int(os.getenv('INGEST_KEY_CACHE_TTL', '60'))
+
+
+# Reading storage
+# On PostgreSQL readings are partitioned by month; partitions are created this many months ahead.
+# READING_RETENTION_DAYS is used by `manage.py prune_readings` (unset keeps readings forever).
+# READING_ARCHIVE_AFTER_DAYS is used by `manage.py archive_readings`, which packs older days into
+# compressed per-sensor chunks (unset keeps every reading as a row).
+
+READING_PARTITION_MONTHS_AHEAD = int(os.getenv('READING_PARTITION_MONTHS_AHEAD', '3'))
+READING_RETENTION_DAYS = int(os.getenv('READING_RETENTION_DAYS', '0')) or None
+READING_ARCHIVE_AFTER_DAYS = int(os.getenv('READING_ARCHIVE_AFTER_DAYS', '0')) or None
+
+# Retention per rollup tier in days (0 keeps the tier forever), applied by `manage.py build_rollups`.
+# Aggregate queries fall back to a finer tier or raw readings when a range reaches past a tier's retention.
+READING_ROLLUP_RETENTION_DAYS = {
+    '1m': int(os.getenv('READING_ROLLUP_1M_RETENTION_DAYS', '14')) or None,
+    '1h': int(os.getenv('READING_ROLLUP_1H_RETENTION_DAYS', '400')) or None,
+    '1d': int(os.getenv('READING_ROLLUP_1D_RETENTION_DAYS', '0')) or None,
+}
+
+
+# Live readings (Server-Sent Events, ASGI only)
+# Updates for one connection are sent at most every LIVE_READINGS_MIN_INTERVAL seconds,
+# coalesced to the latest reading per sensor in between. Publishing costs a pg_notify per
+# write, whose commit-time lock serializes ingestion, so it is on only under ASGI by default.
+
+LIVE_READINGS = os.getenv('LIVE_READINGS', str(ASYNC_VIEWS)).lower() == 'true'
+LIVE_READINGS_MIN_INTERVAL = float(os.getenv('LIVE_READINGS_MIN_INTERVAL', '0.5'))
+LIVE_READINGS_KEEPALIVE = float(os.getenv('LIVE_READINGS_KEEPALIVE', '15'))
+
+
+# Duplicate readings
+# A reading whose (sensor, timestamp) is already stored is a retry. INGEST_CONFLICT_POLICY picks
+# what happens to it unless the request passes ?on_conflict=: "ignore" keeps the stored values,
+# "overwrite" replaces them when they differ.
+
+INGEST_CONFLICT_POLICY = os.getenv('INGEST_CONFLICT_POLICY', 'ignore')
+if INGEST_CONFLICT_POLICY not in ('ignore', 'overwrite'):
+    raise ImproperlyConfigured(
+        f"INGEST_CONFLICT_POLICY must be ignore or overwrite, not {INGEST_CONFLICT_POLICY!r}"
+    )
+
+
+# Write-behind ingestion
+# With INGEST_BUFFER single readings are queued in memory and answered with 202; a background
+# thread in each process commits the queue every INGEST_BUFFER_FLUSH_MS or INGEST_BUFFER_BATCH_ROWS
+# readings. Past INGEST_BUFFER_MAX_DEPTH queued readings new ones are rejected with 503.
+
+INGEST_BUFFER = os.getenv('INGEST_BUFFER', 'false').lower() == 'true'
+INGEST_BUFFER_FLUSH_MS = int(os.getenv('INGEST_BUFFER_FLUSH_MS', '200'))
+INGEST_BUFFER_BATCH_ROWS = int(os.getenv('INGEST_BUFFER_BATCH_ROWS', '1000'))
+INGEST_BUFFER_MAX_DEPTH = int(os.getenv('INGEST_BUFFER_MAX_DEPTH', '50000'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
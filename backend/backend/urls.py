@@ -1,16 +1,27 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from ninja import NinjaAPI
-from sensors.views import sensors_router, readings_router
 from sensors.auth import auth_router
+from sensors.profiling import instrument_api, metrics_view
+
+if settings.ASYNC_VIEWS:
+    from sensors.async_views import sensors_router, readings_router, alerts_router
+else:
+    from sensors.views import sensors_router, readings_router, alerts_router
 
 api = NinjaAPI(title="Sensor Management API", version="1.0.0")
 
 api.add_router("/auth", auth_router)
 api.add_router("/sensors", sensors_router)
 api.add_router("/sensors", readings_router)
+api.add_router("/sensors", alerts_router)
+
+if settings.PROFILING:
+    instrument_api(api)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', api.urls),
+    path('metrics', metrics_view),
 ]
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""Shared bootstrapping for the benchmark scripts.
+
+Benchmarks run against a throwaway test database created from the configured
+``DATABASES`` (PostgreSQL by default), exactly like the pytest suite does.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+
+@contextmanager
+def test_database():
+    from django.test.utils import (
+        setup_databases, setup_test_environment,
+        teardown_databases, teardown_test_environment
+    )
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def timed(fn, iterations):
+    """Run ``fn`` ``iterations`` times and return (total seconds, calls per second)"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    return elapsed, iterations / elapsed
@@ -0,0 +1,21 @@
+"""Latency statistics shared by the benchmark scripts (no Django needed)."""
+import statistics
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """p50/p95/p99/mean in milliseconds and requests per second of ``latencies`` (seconds)"""
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'p50_ms': statistics.median(milliseconds),
+        'p95_ms': percentile(milliseconds, 95),
+        'p99_ms': percentile(milliseconds, 99),
+        'mean_ms': statistics.fmean(milliseconds),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,249 @@
+"""Scripted API scenarios with latency percentiles and query counts per endpoint.
+
+    python -m benchmarks.bench_api [--users 2 --sensors 20 --readings 2000]
+        [--scenario dashboard ...] [--iterations 50] [--output results.json]
+        [--baseline previous.json]
+
+Generates a dataset with ``benchmarks.datagen`` in a throwaway test database,
+then drives every scenario through the Django test client in-process, so the
+numbers cover routing, auth, validation, the ORM and serialization but not the
+network or server. Each endpoint reports p50/p95/p99 and mean latency,
+requests per second, and the most SQL queries one request made.
+
+``--output`` writes the results as JSON together with the commit, database and
+dataset they were measured on. Pass an earlier file as ``--baseline`` to print
+the change per endpoint, e.g. between two commits on the same machine.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from benchmarks._django import test_database
+from benchmarks._stats import summarize
+
+SEARCH_TERMS = ['greenhouse', 'bme', 'thermostat', 'gar', 'rack', 'nothing-matches']
+
+
+class Recorder:
+    """Latencies and query counts of the requests made through one client"""
+
+    def __init__(self, client, headers):
+        self.client = client
+        self.headers = headers
+        self.samples = {}
+
+    def request(self, scenario, endpoint, method, path, body=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        send = getattr(self.client, method)
+        kwargs = dict(self.headers)
+        if body is not None:
+            kwargs.update(data=json.dumps(body), content_type='application/json')
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = send(path, **kwargs)
+            if response.streaming:
+                # Exports do their queries while streaming
+                b''.join(response.streaming_content)
+            latency = time.perf_counter() - started
+        sample = self.samples.setdefault((scenario, endpoint), {'latencies': [], 'queries': 0, 'errors': 0})
+        sample['latencies'].append(latency)
+        sample['queries'] = max(sample['queries'], len(queries))
+        if response.status_code >= 400:
+            sample['errors'] += 1
+        return response
+
+    def results(self):
+        rows = []
+        for (scenario, endpoint), sample in self.samples.items():
+            latencies = sample['latencies']
+            row = {'scenario': scenario, 'endpoint': endpoint}
+            row.update(summarize(latencies, sum(latencies)))
+            row.update(max_queries=sample['queries'], errors=sample['errors'])
+            rows.append(row)
+        return rows
+
+
+def ingest_burst(recorder, sensor_ids, iterations, end, rng):
+    """Single readings from many devices, then bulk uploads"""
+    for i in range(iterations):
+        sensor_id = rng.choice(sensor_ids)
+        recorder.request('ingest_burst', 'POST /sensors/{id}/readings/', 'post', f'/api/sensors/{sensor_id}/readings/', {
+            'temperature': 21.5, 'humidity': 48.0, 'timestamp': (end + timedelta(seconds=i + 1)).isoformat()
+        })
+    for i in range(max(iterations // 10, 1)):
+        sensor_id = rng.choice(sensor_ids)
+        first = end + timedelta(days=1, hours=i)
+        recorder.request('ingest_burst', 'POST /sensors/{id}/readings/bulk/', 'post', f'/api/sensors/{sensor_id}/readings/bulk/', {
+            'readings': [
+                {'temperature': 20.0, 'humidity': 50.0, 'timestamp': (first + timedelta(seconds=j)).isoformat()}
+                for j in range(500)
+            ]
+        })
+
+
+def dashboard(recorder, sensor_ids, iterations, end, rng):
+    """What the dashboard loads: sensor page, models, and the overview of every sensor"""
+    series = urlencode({'bucket': '1h', 'timestamp_from': (end - timedelta(days=1)).isoformat()})
+    for _ in range(iterations):
+        recorder.request('dashboard', 'GET /sensors/', 'get', '/api/sensors/?page=1')
+        recorder.request('dashboard', 'GET /sensors/models/', 'get', '/api/sensors/models/')
+        recorder.request('dashboard', 'GET /sensors/readings/latest/', 'get', '/api/sensors/readings/latest/')
+        recorder.request('dashboard', 'GET /sensors/readings/series/', 'get', f'/api/sensors/readings/series/?{series}')
+
+
+def deep_pagination(recorder, sensor_ids, iterations, end, rng):
+    """Far pages of a sensor's readings by page number, and the same depth by cursor"""
+    sensor_id = sensor_ids[0]
+    first = recorder.request('deep_pagination', 'GET /sensors/{id}/readings/', 'get', f'/api/sensors/{sensor_id}/readings/')
+    pages = max(first.json()['count'] // 50, 1)
+    for i in range(iterations):
+        page = pages - i % max(pages // 2, 1)
+        recorder.request(
+            'deep_pagination', 'GET /sensors/{id}/readings/?page=N', 'get',
+            f'/api/sensors/{sensor_id}/readings/?page={page}'
+        )
+    cursor = None
+    for _ in range(iterations):
+        query = f'?{urlencode({"cursor": cursor})}' if cursor else ''
+        response = recorder.request(
+            'deep_pagination', 'GET /sensors/{id}/readings/cursor/', 'get',
+            f'/api/sensors/{sensor_id}/readings/cursor/{query}'
+        )
+        cursor = response.json().get('next')
+
+
+def date_range(recorder, sensor_ids, iterations, end, rng):
+    """Filtered reading lists, aggregates and exports over a time window"""
+    for _ in range(iterations):
+        sensor_id = rng.choice(sensor_ids)
+        window_end = end - timedelta(hours=rng.randint(0, 24))
+        window = urlencode({
+            'timestamp_from': (window_end - timedelta(hours=6)).isoformat(),
+            'timestamp_to': window_end.isoformat(),
+        })
+        recorder.request(
+            'date_range', 'GET /sensors/{id}/readings/?timestamp_from&to', 'get',
+            f'/api/sensors/{sensor_id}/readings/?{window}'
+        )
+        recorder.request(
+            'date_range', 'GET /sensors/{id}/readings/aggregate/', 'get',
+            f'/api/sensors/{sensor_id}/readings/aggregate/?bucket=5m&{window}'
+        )
+        recorder.request(
+            'date_range', 'GET /sensors/{id}/readings/export/', 'get',
+            f'/api/sensors/{sensor_id}/readings/export/?format=csv&{window}'
+        )
+
+
+def search(recorder, sensor_ids, iterations, end, rng):
+    """Sensor search with terms that hit names, models, descriptions and nothing"""
+    for i in range(iterations):
+        term = SEARCH_TERMS[i % len(SEARCH_TERMS)]
+        recorder.request('search', 'GET /sensors/?q=', 'get', f'/api/sensors/?q={term}')
+
+
+SCENARIOS = {
+    'ingest_burst': ingest_burst,
+    'dashboard': dashboard,
+    'deep_pagination': deep_pagination,
+    'date_range': date_range,
+    'search': search,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = {(row['scenario'], row['endpoint']): row for row in (baseline or {}).get('results', [])}
+    print(f"{'scenario':<16}{'endpoint':<48}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'errors':>8}")
+    for row in results:
+        line = (
+            f"{row['scenario']:<16}{row['endpoint']:<48}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+            f"{row['p99_ms']:>9.1f}{row['rps']:>9.0f}{row['max_queries']:>9}{row['errors']:>8}"
+        )
+        before = previous.get((row['scenario'], row['endpoint']))
+        if before:
+            change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            line += f"  p95 {change:+.0f}%, queries {before['max_queries']} -> {row['max_queries']}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scripted API scenarios against generated data")
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--sensors', type=int, default=20, help='Sensors per user')
+    parser.add_argument('--readings', type=int, default=2000, help='Readings per sensor')
+    parser.add_argument('--iterations', type=int, default=50, help='Requests per endpoint and scenario')
+    parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(SCENARIOS))
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Earlier --output file to compare against')
+    args = parser.parse_args()
+
+    with test_database():
+        from django import get_version
+        from django.db import connection
+        from django.test import Client
+        from sensors.auth import create_tokens
+        from sensors.models import Sensor
+        from benchmarks.datagen import generate
+
+        started = time.perf_counter()
+        users = generate(args.users, args.sensors, args.readings)
+        generate_seconds = time.perf_counter() - started
+
+        user = users[0]
+        token, _ = create_tokens(user)
+        recorder = Recorder(Client(), {'HTTP_AUTHORIZATION': f'Bearer {token}'})
+        sensor_ids = list(Sensor.objects.filter(owner=user).order_by('id').values_list('id', flat=True))
+        end = user.sensors.order_by().values_list('stats__last_reading_timestamp', flat=True).first()
+        rng = random.Random(0)
+
+        for name in args.scenarios or SCENARIOS:
+            SCENARIOS[name](recorder, sensor_ids, args.iterations, end, rng)
+        vendor = connection.vendor
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'database': vendor,
+            'python': platform.python_version(),
+            'django': get_version(),
+            'users': args.users,
+            'sensors_per_user': args.sensors,
+            'readings_per_sensor': args.readings,
+            'iterations': args.iterations,
+            'generate_seconds': generate_seconds,
+        },
+        'results': recorder.results(),
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(
+        f"{args.users} users x {args.sensors} sensors x {args.readings} readings on {vendor}, "
+        f"generated in {generate_seconds:.1f}s"
+    )
+    print_results(report['results'], baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
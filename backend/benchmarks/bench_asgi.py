@@ -0,0 +1,71 @@
+"""Load-test running servers and compare latency percentiles and throughput.
+
+Start the same code under WSGI and ASGI, e.g.
+
+    python manage.py runserver 0.0.0.0:8001
+    uvicorn backend.asgi:application --port 8002 --workers 4
+
+then point this script at both with a valid access token:
+
+    python -m benchmarks.bench_asgi --token TOKEN --concurrency 64 \\
+        http://localhost:8001 http://localhost:8002
+
+Unlike the other benchmarks this one talks HTTP to live servers, so it doesn't
+need Django or a test database.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from benchmarks._stats import summarize
+
+DEFAULT_PATHS = ['/api/sensors/', '/api/sensors/models/']
+
+
+def fetch(url, token):
+    request = Request(url, headers={'Authorization': f'Bearer {token}'})
+    start = time.perf_counter()
+    try:
+        with urlopen(request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    return time.perf_counter() - start, status
+
+
+def run(base_url, paths, token, requests, concurrency):
+    urls = [base_url.rstrip('/') + paths[i % len(paths)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda url: fetch(url, token), urls))
+    elapsed = time.perf_counter() - start
+    result = summarize([latency for latency, _ in results], elapsed)
+    result['errors'] = sum(1 for _, status in results if status >= 400)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base_urls', nargs='+', help='Server base URLs, e.g. http://localhost:8000')
+    parser.add_argument('--token', required=True, help='Access token of an existing user')
+    parser.add_argument('--path', action='append', dest='paths', help='API path to request (repeatable)')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    print(f"{'server':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    for base_url in args.base_urls:
+        fetch(base_url.rstrip('/') + paths[0], args.token)
+        result = run(base_url, paths, args.token, args.requests, args.concurrency)
+        print(
+            f"{base_url:<32}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['rps']:>10.0f}{result['errors']:>8}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Compare JWT authentication throughput with and without the token cache.
+
+    python -m benchmarks.bench_auth [iterations]
+"""
+import sys
+
+from benchmarks._django import test_database, timed
+
+
+def main(iterations=2000):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from sensors.auth import create_tokens, jwt_auth
+    from sensors.token_cache import TokenCache
+
+    user = User.objects.create_user(email="bench@example.com", username="bench", password="bench123")
+    token, _ = create_tokens(user)
+    client = Client()
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def request():
+        response = client.get('/api/sensors/models/', **headers)
+        assert response.status_code == 200
+
+    modes = [
+        ("no cache", TokenCache(maxsize=0), False),
+        ("token cache", TokenCache(maxsize=1024, ttl=60), False),
+        ("trusted claims", TokenCache(maxsize=0), True),
+    ]
+    original_cache, original_trust = jwt_auth.cache, settings.JWT_TRUST_CLAIMS
+    print(f"{'mode':<16}{'req/s':>10}{'queries/req':>14}")
+    try:
+        for name, cache, trust in modes:
+            jwt_auth.cache = cache
+            settings.JWT_TRUST_CLAIMS = trust
+            request()
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            query_count = len(queries)
+            _, rate = timed(request, iterations)
+            print(f"{name:<16}{rate:>10.0f}{query_count:>14}")
+    finally:
+        jwt_auth.cache, settings.JWT_TRUST_CLAIMS = original_cache, original_trust
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,62 @@
+"""Compare the JSON and packed columnar encodings of a large readings range.
+
+    python -m benchmarks.bench_columnar [rows] [iterations]
+"""
+import sys
+import zlib
+
+from benchmarks._django import test_database, timed
+
+
+def main(rows=50000, iterations=5):
+    import json
+    from datetime import datetime, timedelta, timezone as dt_timezone
+    from decimal import Decimal
+    from django.contrib.auth.models import User
+    from ninja.responses import NinjaJSONEncoder
+    from sensors.columnar import COLUMNAR_FIELDS, pack_rows
+    from sensors.models import Reading, Sensor
+    from sensors.schemas import ReadingOut
+
+    user = User.objects.create_user(email="bench@example.com", username="bench", password="bench123")
+    sensor = Sensor.objects.create(owner=user, name="bench", model="Bench")
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    Reading.objects.bulk_create(
+        [
+            Reading(
+                sensor=sensor,
+                timestamp=start + timedelta(seconds=10 * i),
+                temperature=Decimal(f'{20 + i % 500 / 100:.2f}'),
+                humidity=Decimal(f'{40 + i % 3000 / 100:.2f}'),
+            )
+            for i in range(rows)
+        ],
+        batch_size=5000
+    )
+    queryset = Reading.objects.filter(sensor=sensor).order_by('-timestamp')
+    instances = list(queryset)
+    tuples = list(queryset.values_list(*COLUMNAR_FIELDS))
+
+    def to_json(readings):
+        items = [ReadingOut.from_orm(reading).dict() for reading in readings]
+        return json.dumps(items, cls=NinjaJSONEncoder).encode()
+
+    encodings = [
+        ("json", lambda: to_json(instances), lambda: to_json(list(queryset.all()))),
+        ("columns", lambda: pack_rows(tuples), lambda: pack_rows(list(queryset.values_list(*COLUMNAR_FIELDS)))),
+    ]
+    print(f"{rows} readings")
+    print(f"{'format':<10}{'encode ms':>12}{'fetch+encode ms':>18}{'bytes':>12}{'gzip bytes':>12}")
+    for name, encode, fetch_and_encode in encodings:
+        body = encode()
+        encode_time, _ = timed(encode, iterations)
+        total_time, _ = timed(fetch_and_encode, iterations)
+        print(
+            f"{name:<10}{encode_time / iterations * 1000:>12.1f}{total_time / iterations * 1000:>18.1f}"
+            f"{len(body):>12}{len(zlib.compress(body)):>12}"
+        )
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,78 @@
+"""Compare per-request connection setup with persistent connections and the psycopg pool.
+
+    python -m benchmarks.bench_db_connections [iterations]
+
+The test client disconnects ``close_old_connections`` from the request signals,
+so every request is wrapped in the calls Django's handler makes: the connection
+is closed, kept or returned to the pool exactly as it would be in a server.
+Needs PostgreSQL; on other databases connecting is too cheap to be worth measuring.
+"""
+import sys
+import time
+
+from benchmarks._django import test_database, timed
+
+
+def configure(connection, conn_max_age, pool):
+    connection.close()
+    connection.close_pool()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    connection.settings_dict['OPTIONS'].pop('pool', None)
+    if pool:
+        connection.settings_dict['OPTIONS']['pool'] = pool
+
+
+def main(iterations=1000):
+    from django.contrib.auth.models import User
+    from django.db import close_old_connections, connection
+    from django.test import Client
+    from sensors.auth import create_tokens, jwt_auth
+    from sensors.token_cache import TokenCache
+
+    if connection.vendor != 'postgresql':
+        print("bench_db_connections needs PostgreSQL")
+        return
+
+    user = User.objects.create_user(email="bench@example.com", username="bench", password="bench123")
+    token, _ = create_tokens(user)
+    client = Client()
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    connect_times = []
+
+    def request():
+        # What the handler does on request_started, then what each request pays to connect
+        close_old_connections()
+        start = time.perf_counter()
+        connection.ensure_connection()
+        connect_times.append(time.perf_counter() - start)
+        response = client.get('/api/sensors/models/', **headers)
+        assert response.status_code == 200
+        # ... and on request_finished
+        close_old_connections()
+
+    modes = [
+        ("new connection", 0, None),
+        ("persistent", 600, None),
+        ("psycopg pool", 0, {'min_size': 2, 'max_size': 4}),
+    ]
+    original = connection.settings_dict['CONN_MAX_AGE'], connection.settings_dict['OPTIONS'].get('pool')
+    original_cache = jwt_auth.cache
+    # Keep the token cache out of the way so every request runs a query
+    jwt_auth.cache = TokenCache(maxsize=0)
+    print(f"{'mode':<16}{'req/s':>10}{'ms/req':>10}{'connect ms':>12}")
+    try:
+        for name, conn_max_age, pool in modes:
+            configure(connection, conn_max_age, pool)
+            request()
+            connect_times.clear()
+            elapsed, rate = timed(request, iterations)
+            connect_ms = sum(connect_times) / len(connect_times) * 1000
+            print(f"{name:<16}{rate:>10.0f}{elapsed / iterations * 1000:>10.2f}{connect_ms:>12.3f}")
+    finally:
+        jwt_auth.cache = original_cache
+        configure(connection, *original)
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(*map(int, sys.argv[1:]))
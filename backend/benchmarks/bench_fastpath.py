@@ -0,0 +1,82 @@
+"""Compare per-request overhead of the Ninja reading route and the ingestion fast path.
+
+    python -m benchmarks.bench_fastpath [iterations]
+
+Every mode posts ``iterations`` single readings for one sensor in-process:
+the Ninja route through the Django test client (full middleware stack, URL
+resolver and Ninja operation) with a JWT and with an ingest key, and the same
+request straight into ``sensors.fastpath.IngestWSGIHandler``. All of them do the
+same insert, so the difference between the rows is request-handling overhead.
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO
+
+from benchmarks._django import test_database
+from benchmarks._stats import summarize
+
+
+def main(iterations=2000):
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from sensors.auth import create_ingest_key, create_tokens
+    from sensors.fastpath import IngestWSGIHandler
+    from sensors.models import Sensor
+
+    user = User.objects.create_user(email="bench@example.com", username="bench", password="bench123")
+    sensor = Sensor.objects.create(owner=user, name="bench", model="Bench")
+    token, _ = create_tokens(user)
+    _, key = create_ingest_key(sensor, "bench")
+    path = f'/api/sensors/{sensor.id}/readings/'
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    client = Client()
+    handler = IngestWSGIHandler()
+    sent = 0
+
+    def body():
+        nonlocal sent
+        sent += 1
+        return {'temperature': 21.5, 'humidity': 48.0, 'timestamp': (start + timedelta(seconds=sent)).isoformat()}
+
+    def ninja(headers):
+        def request():
+            response = client.post(path, body(), content_type='application/json', **headers)
+            assert response.status_code == 201, response.content
+        return request
+
+    def fast_path():
+        payload = json.dumps(body()).encode()
+        statuses = []
+        handler({
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'QUERY_STRING': '',
+            'CONTENT_LENGTH': str(len(payload)), 'wsgi.input': BytesIO(payload),
+            'HTTP_X_INGEST_KEY': key,
+        }, lambda status, headers: statuses.append(status))
+        assert statuses[0].startswith('201'), statuses
+
+    modes = [
+        ("Ninja route, JWT", ninja({'HTTP_AUTHORIZATION': f'Bearer {token}'})),
+        ("Ninja route, ingest key", ninja({'HTTP_X_INGEST_KEY': key})),
+        ("fast path, ingest key", fast_path),
+    ]
+    print(f"{'mode':<26}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'req/s':>9}")
+    for name, request in modes:
+        request()
+        latencies = []
+        began = time.perf_counter()
+        for _ in range(iterations):
+            started = time.perf_counter()
+            request()
+            latencies.append(time.perf_counter() - started)
+        stats = summarize(latencies, time.perf_counter() - began)
+        print(
+            f"{name:<26}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+            f"{stats['mean_ms']:>9.2f}{stats['rps']:>9.0f}"
+        )
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(*map(int, sys.argv[1:]))
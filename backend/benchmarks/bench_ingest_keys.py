@@ -0,0 +1,82 @@
+"""Compare single-reading ingestion authenticated by JWT and by a sensor ingest key.
+
+    python -m benchmarks.bench_ingest_keys [iterations]
+
+Every mode posts ``iterations`` readings to ``POST /api/sensors/{id}/readings/``
+through the Django test client after one warm-up request, so caches are
+populated. Reported: p50/p95 latency, requests per second, and the SQL queries
+of one request, split into auth/ownership lookups and the rest (the insert and
+what follows it).
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from benchmarks._django import test_database
+from benchmarks._stats import summarize
+
+LOOKUP_TABLES = ('"auth_user"', '"sensors_sensor"', '"sensors_ingestkey"')
+
+
+def main(iterations=2000):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from sensors.auth import create_ingest_key, create_tokens, jwt_auth
+    from sensors.models import Sensor
+    from sensors.token_cache import TokenCache
+
+    user = User.objects.create_user(email="bench@example.com", username="bench", password="bench123")
+    sensor = Sensor.objects.create(owner=user, name="bench", model="Bench")
+    token, _ = create_tokens(user)
+    _, key = create_ingest_key(sensor, "bench")
+    client = Client()
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    sent = 0
+
+    def request(headers):
+        nonlocal sent
+        sent += 1
+        response = client.post(f'/api/sensors/{sensor.id}/readings/', {
+            'temperature': 21.5, 'humidity': 48.0, 'timestamp': (start + timedelta(seconds=sent)).isoformat()
+        }, content_type='application/json', **headers)
+        assert response.status_code == 201, response.content
+
+    modes = [
+        ("JWT, token cache", {'HTTP_AUTHORIZATION': f'Bearer {token}'}, False),
+        ("JWT, trusted claims", {'HTTP_AUTHORIZATION': f'Bearer {token}'}, True),
+        ("ingest key", {'HTTP_X_INGEST_KEY': key}, False),
+    ]
+    original_cache, original_trust = jwt_auth.cache, settings.JWT_TRUST_CLAIMS
+    print(f"{'mode':<22}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>9}{'lookups':>9}{'other':>9}")
+    try:
+        for name, headers, trust in modes:
+            jwt_auth.cache = TokenCache(maxsize=1024, ttl=60)
+            settings.JWT_TRUST_CLAIMS = trust
+            request(headers)
+            with CaptureQueriesContext(connection) as queries:
+                request(headers)
+            # Count before the next request's request_started signal resets the query log
+            query_count = len(queries)
+            lookups = sum(1 for query in queries if any(table in query['sql'] for table in LOOKUP_TABLES))
+
+            latencies = []
+            began = time.perf_counter()
+            for _ in range(iterations):
+                started = time.perf_counter()
+                request(headers)
+                latencies.append(time.perf_counter() - started)
+            stats = summarize(latencies, time.perf_counter() - began)
+            print(
+                f"{name:<22}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['rps']:>9.0f}"
+                f"{lookups:>9}{query_count - lookups:>9}"
+            )
+    finally:
+        jwt_auth.cache, settings.JWT_TRUST_CLAIMS = original_cache, original_trust
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,115 @@
+"""Compare wide ``Reading`` rows with narrow ``Measurement`` rows for the same values.
+
+    python -m benchmarks.bench_measurements [sensors] [readings per sensor] [iterations]
+
+Every sensor gets the same temperature and humidity series twice: once as
+wide readings (one row with both columns) and once as two measurements per
+timestamp. The report covers insert throughput, a 6-hour range read, 1-hour
+bucket aggregates over the whole range through the API's query functions, and
+table plus index size (PostgreSQL only, summed over reading partitions).
+"""
+import sys
+import time
+
+from benchmarks._django import test_database, timed
+
+
+def _size(cursor, table):
+    cursor.execute(f'ANALYZE "{table}"')
+    # pg_partition_tree has no rows for a table that isn't partitioned
+    cursor.execute(
+        'SELECT coalesce(sum(pg_table_size(relid)), pg_table_size(%s)), '
+        'coalesce(sum(pg_indexes_size(relid)), pg_indexes_size(%s)) FROM pg_partition_tree(%s)',
+        [table, table, table]
+    )
+    return cursor.fetchone()
+
+
+def main(sensors=20, readings=5000, iterations=20):
+    from datetime import datetime, timedelta, timezone as dt_timezone
+    from types import SimpleNamespace
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from sensors.aggregates import aggregate_readings
+    from sensors.measurements import aggregate_measurements, metric_ids
+    from sensors.models import Measurement, Reading, Sensor
+
+    user = User.objects.create_user(email="bench@example.com", username="bench", password="bench123")
+    sensor_ids = [
+        Sensor.objects.create(owner=user, name=f"bench-{i}", model="Bench").id
+        for i in range(sensors)
+    ]
+    ids = metric_ids(user.id, ['temperature', 'humidity'])
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    values = [
+        (sensor_id, start + timedelta(minutes=i), 15 + i % 2000 / 100, 30 + i % 6000 / 100)
+        for sensor_id in sensor_ids
+        for i in range(readings)
+    ]
+    window = (start + timedelta(hours=24), start + timedelta(hours=30))
+    full_range = SimpleNamespace(
+        metrics=None, bucket='1h', timestamp_from=start, timestamp_to=start + timedelta(minutes=readings)
+    )
+    probe = sensor_ids[len(sensor_ids) // 2]
+
+    layouts = [
+        (
+            "wide Reading", Reading,
+            lambda: [
+                Reading(sensor_id=sensor_id, timestamp=timestamp, temperature=temperature, humidity=humidity)
+                for sensor_id, timestamp, temperature, humidity in values
+            ],
+            lambda: list(
+                Reading.objects.filter(sensor_id=probe, timestamp__range=window)
+                .values_list('timestamp', 'temperature', 'humidity')
+            ),
+            lambda: list(aggregate_readings(
+                Reading.objects.filter(
+                    sensor_id=probe, timestamp__range=(full_range.timestamp_from, full_range.timestamp_to)
+                ), '1h'
+            )),
+        ),
+        (
+            "narrow Measurement", Measurement,
+            lambda: [
+                Measurement(sensor_id=sensor_id, metric_id=ids[name], timestamp=timestamp, value=value)
+                for sensor_id, timestamp, temperature, humidity in values
+                for name, value in (('temperature', temperature), ('humidity', humidity))
+            ],
+            lambda: list(
+                Measurement.objects.filter(sensor_id=probe, timestamp__range=window)
+                .values_list('timestamp', 'metric_id', 'value')
+            ),
+            lambda: aggregate_measurements(probe, full_range),
+        ),
+    ]
+
+    postgres = connection.vendor == 'postgresql'
+    print(f"{sensors} sensors x {readings} readings, 2 values each")
+    print(
+        f"{'layout':<20}{'rows':>10}{'insert values/s':>17}{'range ms':>10}{'aggregate ms':>14}"
+        f"{'table bytes':>14}{'index bytes':>14}"
+    )
+    for name, model, build, read_range, aggregate in layouts:
+        rows = build()
+        began = time.perf_counter()
+        model.objects.bulk_create(rows, batch_size=5000)
+        insert_rate = len(values) * 2 / (time.perf_counter() - began)
+
+        range_time, _ = timed(read_range, iterations)
+        aggregate_time, _ = timed(aggregate, iterations)
+
+        if postgres:
+            with connection.cursor() as cursor:
+                table_bytes, index_bytes = _size(cursor, model._meta.db_table)
+        else:
+            table_bytes = index_bytes = 'n/a'
+        print(
+            f"{name:<20}{len(rows):>10}{insert_rate:>17.0f}{range_time / iterations * 1000:>10.2f}"
+            f"{aggregate_time / iterations * 1000:>14.2f}{table_bytes:>14}{index_bytes:>14}"
+        )
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""Compare storing reading values as numeric(5, 2), real and scaled smallint.
+
+    python -m benchmarks.bench_storage [rows]
+
+Each layout gets its own scratch table shaped like sensors_reading, with the
+same (sensor_id, timestamp) index. Table and index sizes are only reported on
+PostgreSQL.
+"""
+import sys
+import time
+
+from benchmarks._django import test_database
+
+LAYOUTS = [
+    # (name, column type, value -> stored, stored -> float)
+    ("numeric", "numeric(5, 2)", lambda value: value, float),
+    ("real", "real", lambda value: value, lambda value: round(value, 2)),
+    ("smallint x100", "smallint", lambda value: round(value * 100), lambda value: value / 100),
+]
+
+
+def main(rows=200000):
+    from datetime import datetime, timedelta, timezone as dt_timezone
+    from django.db import connection
+
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    values = [
+        (i % 20, start + timedelta(seconds=10 * i), 15 + i % 2000 / 100, 30 + i % 6000 / 100)
+        for i in range(rows)
+    ]
+    postgres = connection.vendor == 'postgresql'
+
+    print(f"{rows} readings")
+    print(f"{'layout':<16}{'insert rows/s':>15}{'read rows/s':>14}{'table bytes':>14}{'index bytes':>14}")
+    for name, column_type, store, load in LAYOUTS:
+        table = f"bench_values_{name.split()[0]}"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {table} (id integer PRIMARY KEY, sensor_id integer NOT NULL, '
+                f'"timestamp" timestamp with time zone NOT NULL, '
+                f'temperature {column_type} NOT NULL, humidity {column_type} NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX {table}_sensor_ts ON {table} (sensor_id, "timestamp")')
+
+            began = time.perf_counter()
+            cursor.executemany(
+                f'INSERT INTO {table} VALUES (%s, %s, %s, %s, %s)',
+                [
+                    (i, sensor_id, timestamp, store(temperature), store(humidity))
+                    for i, (sensor_id, timestamp, temperature, humidity) in enumerate(values)
+                ]
+            )
+            insert_rate = rows / (time.perf_counter() - began)
+
+            began = time.perf_counter()
+            cursor.execute(f'SELECT "timestamp", temperature, humidity FROM {table} ORDER BY sensor_id, "timestamp"')
+            loaded = [(timestamp, load(temperature), load(humidity)) for timestamp, temperature, humidity in cursor.fetchall()]
+            read_rate = len(loaded) / (time.perf_counter() - began)
+
+            if postgres:
+                cursor.execute('ANALYZE ' + table)
+                cursor.execute('SELECT pg_table_size(%s), pg_indexes_size(%s)', [table, table])
+                table_bytes, index_bytes = cursor.fetchone()
+            else:
+                table_bytes = index_bytes = 'n/a'
+            cursor.execute(f'DROP TABLE {table}')
+
+        print(f"{name:<16}{insert_rate:>15.0f}{read_rate:>14.0f}{table_bytes:>14}{index_bytes:>14}")
+
+
+if __name__ == '__main__':
+    with test_database():
+        main(*map(int, sys.argv[1:]))
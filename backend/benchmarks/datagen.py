@@ -0,0 +1,112 @@
+"""Generate users x sensors x readings for benchmarks and load tests.
+
+Used by ``bench_api`` against its throwaway test database. Run directly it
+seeds the configured database instead and prints an access token for the
+first user, ready for ``bench_asgi``:
+
+    python -m benchmarks.datagen --users 10 --sensors 200 --readings 5000
+
+Everything is written with ``bulk_create`` and the per-sensor stats and
+rollups are rebuilt once at the end, so a million readings take seconds
+rather than the hours single inserts through the API would.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from benchmarks import _django  # noqa: F401  (configures Django)
+
+PASSWORD = 'bench123'
+BATCH_SIZE = 5000
+
+MODELS = ['DHT22', 'BME280', 'SHT31', 'AM2302', 'Si7021', 'HTU21D']
+PLACES = ['greenhouse', 'basement', 'attic', 'garage', 'kitchen', 'office', 'warehouse', 'cellar']
+DESCRIPTIONS = [
+    'Next to the thermostat', 'Mounted on the north wall', 'Inside the server rack',
+    'Near the ventilation shaft', '',
+]
+
+
+def sensor_name(index):
+    return f"{PLACES[index % len(PLACES)]}-{index:05d}"
+
+
+def generate(users=2, sensors=20, readings=2000, interval=timedelta(minutes=1), end=None, seed=0, prefix='bench'):
+    """
+    Create ``users`` users with ``sensors`` sensors each and ``readings`` readings per sensor.
+
+    Readings are ``interval`` apart and end at ``end`` (now by default). Returns
+    the created users, all with the password ``PASSWORD``.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from sensors.models import Reading, Sensor
+    from sensors.rollups import build_rollups
+    from sensors.stats import rebuild_sensor_stats
+
+    rng = random.Random(seed)
+    end = end or datetime.now(dt_timezone.utc).replace(second=0, microsecond=0)
+    start = end - interval * (readings - 1)
+    password = make_password(PASSWORD)
+
+    usernames = [f"{prefix}{i}" for i in range(users)]
+    User.objects.bulk_create([
+        User(username=username, email=f"{username}@example.com", password=password)
+        for username in usernames
+    ])
+    created_users = list(User.objects.filter(username__in=usernames).order_by('id'))
+
+    Sensor.objects.bulk_create([
+        Sensor(
+            owner=user,
+            name=sensor_name(index),
+            model=rng.choice(MODELS),
+            description=rng.choice(DESCRIPTIONS)
+        )
+        for user in created_users
+        for index in range(sensors)
+    ], batch_size=BATCH_SIZE)
+    sensor_ids = list(Sensor.objects.filter(owner__in=created_users).values_list('id', flat=True))
+
+    batch = []
+    for sensor_id in sensor_ids:
+        base = rng.uniform(15, 25)
+        for i in range(readings):
+            batch.append(Reading(
+                sensor_id=sensor_id,
+                timestamp=start + interval * i,
+                temperature=round(base + rng.uniform(-2, 2), 2),
+                humidity=round(rng.uniform(30, 70), 2),
+            ))
+            if len(batch) >= BATCH_SIZE:
+                Reading.objects.bulk_create(batch)
+                batch = []
+    Reading.objects.bulk_create(batch)
+
+    # bulk_create skips the post_save signal that creates the stats rows
+    rebuild_sensor_stats(sensor_ids)
+    while build_rollups():
+        pass
+    return created_users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the configured database with benchmark data")
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--sensors', type=int, default=20, help='Sensors per user')
+    parser.add_argument('--readings', type=int, default=2000, help='Readings per sensor')
+    parser.add_argument('--interval', type=int, default=60, help='Seconds between readings')
+    parser.add_argument('--prefix', default='bench', help='Username prefix of the generated users')
+    args = parser.parse_args()
+
+    from sensors.auth import create_tokens
+
+    users = generate(args.users, args.sensors, args.readings, timedelta(seconds=args.interval), prefix=args.prefix)
+    token, _ = create_tokens(users[0])
+    print(f"Created {len(users)} users x {args.sensors} sensors x {args.readings} readings")
+    print(f"Password: {PASSWORD}")
+    print(f"Access token of {users[0].email}: {token}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+from django.db.models import Avg, Count, DateTimeField, Func, Max, Min
+
+BUCKET_SECONDS = {
+    '1m': 60,
+    '5m': 5 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+MAX_BUCKETS = 10000
+
+
+class TimeBucket(Func):
+    """Floor a timestamp to the start of its fixed-width bucket (UTC aligned)"""
+    output_field = DateTimeField()
+
+    def __init__(self, expression, seconds, **extra):
+        self.seconds = int(seconds)
+        super().__init__(expression, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # date_bin (PostgreSQL 14+) does the whole bucketing in the index scan
+        template = (
+            "date_bin('%d seconds'::interval, %%(expressions)s, TIMESTAMPTZ '2000-01-01 00:00:00+00')"
+            % self.seconds
+        )
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        template = (
+            "datetime(CAST(round((julianday(%%(expressions)s) - 2440587.5) * 86400) AS INTEGER)"
+            " / %d * %d, 'unixepoch')" % (self.seconds, self.seconds)
+        )
+        return Func.as_sql(self, compiler, connection, template=template, **extra_context)
+
+
+def aggregate_readings(queryset, bucket):
+    """Group a Reading queryset into time buckets with min/max/avg/count per bucket"""
+    return (
+        queryset
+        .order_by()
+        .annotate(bucket=TimeBucket('timestamp', BUCKET_SECONDS[bucket]))
+        .values('bucket')
+        .annotate(
+            count=Count('id'),
+            temperature_min=Min('temperature'),
+            temperature_max=Max('temperature'),
+            temperature_avg=Avg('temperature'),
+            humidity_min=Min('humidity'),
+            humidity_max=Max('humidity'),
+            humidity_avg=Avg('humidity'),
+        )
+        .order_by('bucket')
+    )
@@ -0,0 +1,119 @@
+"""
+Alert rules evaluated as readings are ingested.
+
+``evaluate_readings`` runs inside the ingestion transaction. It loads the
+active rules of the affected sensors once, feeds each sensor's new readings
+through them oldest first and writes all events and rule state back in bulk.
+Every rule keeps rolling state on its row, so a reading costs O(1) per rule
+and history is never re-queried.
+
+Readings older than the last one a rule has seen still trip thresholds, but
+they don't move rate-of-change or z-score state, which only follows the
+newest data.
+"""
+import math
+from collections import defaultdict
+from django.db import transaction
+from .models import AlertEvent, AlertRule
+
+STATE_FIELDS = [
+    'last_value', 'last_timestamp', 'window_values', 'window_position',
+    'window_sum', 'window_sum_squares',
+]
+
+
+def _check_threshold(rule, value, timestamp):
+    if rule.min_value is not None and value < rule.min_value:
+        return f"{rule.metric} {value:g} is below {rule.min_value:g}"
+    if rule.max_value is not None and value > rule.max_value:
+        return f"{rule.metric} {value:g} is above {rule.max_value:g}"
+    return None
+
+
+def _check_rate_of_change(rule, value, timestamp):
+    detail = None
+    if rule.last_timestamp is not None:
+        minutes = (timestamp - rule.last_timestamp).total_seconds() / 60
+        rate = (value - rule.last_value) / minutes
+        if abs(rate) > rule.max_rate:
+            detail = f"{rule.metric} changed {rate:+.2f}/min, more than {rule.max_rate:g}/min"
+    rule.last_value = value
+    rule.last_timestamp = timestamp
+    return detail
+
+
+def _check_zscore(rule, value, timestamp):
+    """Compare ``value`` with the previous ``window`` values, then slide the window"""
+    detail = None
+    values = rule.window_values
+    if len(values) == rule.window:
+        mean = rule.window_sum / rule.window
+        variance = max(rule.window_sum_squares / rule.window - mean * mean, 0.0)
+        deviation = math.sqrt(variance)
+        if deviation > 0:
+            z = (value - mean) / deviation
+            if abs(z) > rule.z_threshold:
+                detail = f"{rule.metric} {value:g} is {z:+.1f} standard deviations from the last {rule.window} readings"
+        oldest = values[rule.window_position]
+        rule.window_sum -= oldest
+        rule.window_sum_squares -= oldest * oldest
+        values[rule.window_position] = value
+        rule.window_position = (rule.window_position + 1) % rule.window
+    else:
+        values.append(value)
+    rule.window_sum += value
+    rule.window_sum_squares += value * value
+    rule.last_timestamp = timestamp
+    return detail
+
+
+CHECKS = {
+    AlertRule.THRESHOLD: _check_threshold,
+    AlertRule.RATE_OF_CHANGE: _check_rate_of_change,
+    AlertRule.ZSCORE: _check_zscore,
+}
+
+# Rules whose state only moves forward in time
+STATEFUL_KINDS = {AlertRule.RATE_OF_CHANGE, AlertRule.ZSCORE}
+
+
+def evaluate_readings(readings):
+    """Run the active alert rules of the readings' sensors; returns the created events"""
+    by_sensor = defaultdict(list)
+    for reading in readings:
+        by_sensor[reading.sensor_id].append(reading)
+    if not by_sensor:
+        return []
+
+    with transaction.atomic():
+        # Row locks keep concurrent ingestion into one sensor from interleaving state updates
+        rules = list(
+            AlertRule.objects.select_for_update()
+            .filter(sensor_id__in=by_sensor, is_active=True)
+        )
+        if not rules:
+            return []
+
+        events = []
+        for rule in rules:
+            check = CHECKS[rule.kind]
+            sensor_readings = sorted(by_sensor[rule.sensor_id], key=lambda reading: reading.timestamp)
+            for reading in sensor_readings:
+                stale = rule.last_timestamp is not None and reading.timestamp <= rule.last_timestamp
+                if stale and rule.kind in STATEFUL_KINDS:
+                    continue
+                value = float(getattr(reading, rule.metric))
+                detail = check(rule, value, reading.timestamp)
+                if detail:
+                    events.append(AlertEvent(
+                        rule=rule,
+                        sensor_id=rule.sensor_id,
+                        timestamp=reading.timestamp,
+                        value=value,
+                        detail=detail
+                    ))
+
+        AlertEvent.objects.bulk_create(events)
+        stateful = [rule for rule in rules if rule.kind in STATEFUL_KINDS]
+        AlertRule.objects.bulk_update(stateful, STATE_FIELDS)
+    return events
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SensorsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sensors'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals
+        post_migrate.connect(signals.create_future_partitions, sender=self)
@@ -0,0 +1,587 @@
+"""
+Compressed archive of cold readings, one chunk per sensor and UTC day.
+
+``archive_readings`` packs whole days of readings older than a cutoff into a
+``ReadingChunk`` and deletes the source rows. A chunk stores its readings
+column by column, as zigzag varints:
+
+    id           delta from the previous id (ids of one sensor mostly step by 1)
+    timestamp    delta-of-delta in microseconds (0 for a fixed sample rate)
+    temperature  delta of the value in hundredths
+    humidity     delta of the value in hundredths
+
+and zlib compresses the result behind a ``b'RCH1'`` + uint32 count header. A
+day of minute readings takes a few kilobytes instead of 1440 rows plus their
+index entries. Values are stored in the same fixed-point precision as
+``Reading``, so decoding is lossless.
+
+Only readings already folded into the rollups are archived, so aggregates
+keep covering archived days. The reading lists, exports, the fleet's latest
+readings and aggregates that fall back to raw readings decode archived
+readings back in when a range reaches them. Readings that arrive later for
+an archived day stay rows until the next run merges them into the day's
+chunk; ``build_rollups`` folds them into the day's rollups together with
+the chunk's readings.
+
+Ingestion resolves a reading whose timestamp is already archived against its
+chunk (see ``archived_copies``), so the conflict policy holds for archived
+days too: a retry isn't stored a second time, and an overwrite rewrites the
+chunk and the rollup buckets around it.
+"""
+import heapq
+import struct
+import zlib
+from collections import defaultdict, namedtuple
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+from .aggregates import TimeBucket
+from .models import Reading, ReadingChunk, RollupWatermark
+from .pagination import seek
+from .rollups import WATERMARK
+
+MAGIC = b'RCH1'
+HEADER = struct.Struct('<4sI')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+DAY = timedelta(days=1)
+
+# Fixed-point scale of the stored values, matching Reading's decimal places
+SCALE = 10 ** Reading._meta.get_field('temperature').decimal_places
+
+# Days of one sensor archived per transaction
+ARCHIVE_BATCH_DAYS = 31
+
+ArchivedReading = namedtuple('ArchivedReading', ['id', 'sensor_id', 'timestamp', 'temperature', 'humidity'])
+
+
+class ArchiveConflict(Exception):
+    """Readings changed between reading and deleting them; the batch is retried on the next run"""
+
+
+def _write(out, values):
+    for value in values:
+        value = value * 2 if value >= 0 else -value * 2 - 1
+        while value >= 0x80:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def _read(data, offset, count):
+    values = []
+    for _ in range(count):
+        value = shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        values.append(value >> 1 if not value & 1 else -(value >> 1) - 1)
+    return values, offset
+
+
+def _deltas(values):
+    previous = 0
+    for value in values:
+        yield value - previous
+        previous = value
+
+
+def _undelta(deltas):
+    total = 0
+    for delta in deltas:
+        total += delta
+        yield total
+
+
+def pack_chunk(rows):
+    """Encode ``(id, timestamp, temperature, humidity)`` rows, oldest first"""
+    ids, timestamps, temperatures, humidities = zip(*rows) if rows else ((),) * 4
+    micros = [(timestamp - EPOCH) // MICROSECOND for timestamp in timestamps]
+    out = bytearray()
+    _write(out, _deltas(ids))
+    _write(out, _deltas(_deltas(micros)))
+    _write(out, _deltas(round(value * SCALE) for value in temperatures))
+    _write(out, _deltas(round(value * SCALE) for value in humidities))
+    return HEADER.pack(MAGIC, len(rows)) + zlib.compress(bytes(out), 9)
+
+
+def unpack_chunk(data, sensor_id):
+    """The ArchivedReadings of a chunk, oldest first"""
+    magic, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an archived readings chunk")
+    body = zlib.decompress(bytes(data[HEADER.size:]))
+    ids, offset = _read(body, 0, count)
+    micros, offset = _read(body, offset, count)
+    temperatures, offset = _read(body, offset, count)
+    humidities, offset = _read(body, offset, count)
+    return [
+        ArchivedReading(reading_id, sensor_id, EPOCH + MICROSECOND * micro, temperature / SCALE, humidity / SCALE)
+        for reading_id, micro, temperature, humidity in zip(
+            _undelta(ids), _undelta(_undelta(micros)), _undelta(temperatures), _undelta(humidities)
+        )
+    ]
+
+
+def _day_start(day):
+    return datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+
+
+def _utc(value):
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value.astimezone(dt_timezone.utc)
+
+
+def build_chunk(sensor_id, day, rows):
+    """A ReadingChunk for ``(id, timestamp, temperature, humidity)`` rows of one day, oldest first"""
+    temperatures = [row[2] for row in rows]
+    humidities = [row[3] for row in rows]
+    return ReadingChunk(
+        sensor_id=sensor_id,
+        day=day,
+        count=len(rows),
+        first_timestamp=rows[0][1],
+        last_timestamp=rows[-1][1],
+        temperature_min=min(temperatures),
+        temperature_max=max(temperatures),
+        humidity_min=min(humidities),
+        humidity_max=max(humidities),
+        data=pack_chunk(rows),
+    )
+
+
+def archive_readings(older_than, batch_days=ARCHIVE_BATCH_DAYS):
+    """
+    Pack every whole UTC day of readings before ``older_than`` into chunks.
+
+    Days that already have a chunk get their new readings merged in; a
+    reading whose timestamp is already archived is dropped. Returns
+    ``(chunks written, readings archived)``.
+    """
+    boundary = _day_start(_utc(older_than).date())
+    rolled_up = RollupWatermark.objects.filter(name=WATERMARK).values_list('last_reading_id', flat=True).first() or 0
+    pending = Reading.objects.filter(timestamp__lt=boundary, id__lte=rolled_up)
+
+    days = defaultdict(list)
+    for sensor_id, day in (
+        pending.order_by()
+        .annotate(day=TimeBucket('timestamp', DAY.total_seconds()))
+        .values_list('sensor_id', 'day')
+        .distinct()
+        .order_by('sensor_id', 'day')
+    ):
+        days[sensor_id].append(day.date())
+
+    chunks = archived = 0
+    for sensor_id, sensor_days in days.items():
+        for start in range(0, len(sensor_days), batch_days):
+            batch = sensor_days[start:start + batch_days]
+            try:
+                written, moved = _archive_days(pending.filter(sensor_id=sensor_id), sensor_id, batch[0], batch[-1])
+            except ArchiveConflict:
+                continue
+            chunks += written
+            archived += moved
+    return chunks, archived
+
+
+def _archive_days(pending, sensor_id, first_day, last_day):
+    window = pending.filter(timestamp__gte=_day_start(first_day), timestamp__lt=_day_start(last_day) + DAY)
+    with transaction.atomic():
+        rows = list(window.order_by('timestamp').values_list('id', 'timestamp', 'temperature', 'humidity'))
+        existing = {
+            chunk.day: chunk
+            for chunk in ReadingChunk.objects.select_for_update().filter(
+                sensor_id=sensor_id, day__gte=first_day, day__lte=last_day
+            )
+        }
+        by_day = defaultdict(list)
+        for row in rows:
+            by_day[_utc(row[1]).date()].append(row)
+
+        # A row for an archived timestamp only gets in when it races a run; settle it by the policy
+        overwrite = settings.INGEST_CONFLICT_POLICY != 'ignore'
+        chunks = []
+        for day, day_rows in by_day.items():
+            if day in existing:
+                merged = {
+                    reading.timestamp: (reading.id, reading.timestamp, reading.temperature, reading.humidity)
+                    for reading in unpack_chunk(existing[day].data, sensor_id)
+                }
+                for row in day_rows:
+                    stored = merged.get(row[1])
+                    if stored is None:
+                        merged[row[1]] = row
+                    elif overwrite:
+                        merged[row[1]] = (stored[0], *row[1:])
+                day_rows = sorted(merged.values(), key=lambda row: row[1])
+            chunks.append(build_chunk(sensor_id, day, day_rows))
+
+        ReadingChunk.objects.bulk_create(
+            chunks,
+            update_conflicts=True,
+            unique_fields=['sensor', 'day'],
+            update_fields=[
+                'count', 'first_timestamp', 'last_timestamp', 'temperature_min', 'temperature_max',
+                'humidity_min', 'humidity_max', 'data',
+            ]
+        )
+        deleted, _ = window.delete()
+        if deleted != len(rows):
+            raise ArchiveConflict(f"Sensor {sensor_id} changed while archiving {first_day}..{last_day}")
+    return len(chunks), len(rows)
+
+
+def _fixed(value):
+    """``value`` in the stored precision, as decoding a chunk returns it"""
+    return round(value * SCALE) / SCALE
+
+
+def _chunks(keys, lock=False):
+    """The chunks of ``keys``, a collection of ``(sensor_id, day)`` pairs"""
+    chunks = ReadingChunk.objects.filter(
+        sensor_id__in={sensor_id for sensor_id, _ in keys}, day__in={day for _, day in keys}
+    )
+    if lock:
+        chunks = chunks.select_for_update()
+    return [chunk for chunk in chunks if (chunk.sensor_id, chunk.day) in keys]
+
+
+def _by_day(readings):
+    """``{(sensor_id, day): {timestamp: reading}}`` for readings of days before today"""
+    today = _day_start(timezone.now().astimezone(dt_timezone.utc).date())
+    days = defaultdict(dict)
+    for reading in readings:
+        timestamp = _utc(reading.timestamp)
+        # archive_readings only packs whole days before its cutoff, never today
+        if timestamp < today:
+            days[(reading.sensor_id, timestamp.date())][timestamp] = reading
+    return days
+
+
+def archived_copies(readings):
+    """
+    ``{(sensor_id, timestamp): ArchivedReading}`` for ``readings`` whose timestamp is already archived.
+
+    Readings of today can't be archived yet, so live ingestion costs no query.
+    """
+    days = _by_day(readings)
+    copies = {}
+    if not days:
+        return copies
+    for chunk in _chunks(days):
+        timestamps = days[(chunk.sensor_id, chunk.day)]
+        if not any(chunk.first_timestamp <= timestamp <= chunk.last_timestamp for timestamp in timestamps):
+            continue
+        for archived in unpack_chunk(chunk.data, chunk.sensor_id):
+            if archived.timestamp in timestamps:
+                copies[(archived.sensor_id, archived.timestamp)] = archived
+    return copies
+
+
+def rewrite_archived(readings):
+    """
+    Write the values of already archived ``readings`` into their chunks.
+
+    Returns the ArchivedReadings whose values changed and were rewritten.
+    Like updated rows, their rollup buckets are refolded by ``refresh_rollups``,
+    together with any rows that arrived for the day since it was packed. The
+    chunks are locked like rows an UPDATE touches, so call this inside a
+    transaction.
+    """
+    written = []
+    days = _by_day(readings)
+    for chunk in _chunks(days, lock=True):
+        incoming = days[(chunk.sensor_id, chunk.day)]
+        stored = unpack_chunk(chunk.data, chunk.sensor_id)
+        changed = []
+        for position, archived in enumerate(stored):
+            reading = incoming.get(archived.timestamp)
+            if reading is None:
+                continue
+            values = _fixed(reading.temperature), _fixed(reading.humidity)
+            if values == (archived.temperature, archived.humidity):
+                continue
+            stored[position] = archived._replace(temperature=values[0], humidity=values[1])
+            changed.append(stored[position])
+        if not changed:
+            continue
+        rebuilt = build_chunk(chunk.sensor_id, chunk.day, [
+            (archived.id, archived.timestamp, archived.temperature, archived.humidity) for archived in stored
+        ])
+        rebuilt.pk = chunk.pk
+        rebuilt.save(update_fields=[
+            'temperature_min', 'temperature_max', 'humidity_min', 'humidity_max', 'data',
+        ])
+        written.extend(changed)
+    return written
+
+
+def _between(chunks, timestamp_from, timestamp_to):
+    """Chunks whose day overlaps the range"""
+    if timestamp_from:
+        chunks = chunks.filter(day__gte=_utc(timestamp_from).date())
+    if timestamp_to:
+        chunks = chunks.filter(day__lte=_utc(timestamp_to).date())
+    return chunks
+
+
+def filter_chunks(chunks, query):
+    """Chunks whose day overlaps the timestamp_from/timestamp_to range of a ReadingListQuery"""
+    return _between(chunks, query.timestamp_from, query.timestamp_to)
+
+
+def _in_range(readings, timestamp_from, timestamp_to):
+    return [
+        reading for reading in readings
+        if (timestamp_from is None or reading.timestamp >= timestamp_from)
+        and (timestamp_to is None or reading.timestamp <= timestamp_to)
+    ]
+
+
+def _decode(chunks, timestamp_from, timestamp_to):
+    timestamp_from, timestamp_to = _utc(timestamp_from), _utc(timestamp_to)
+    for chunk in chunks.order_by('sensor_id', 'day').iterator(chunk_size=100):
+        yield from _in_range(unpack_chunk(chunk.data, chunk.sensor_id), timestamp_from, timestamp_to)
+
+
+def archived_rows(chunks, query):
+    """ArchivedReadings of ``chunks`` within the query's range, by sensor and then timestamp"""
+    return _decode(chunks, query.timestamp_from, query.timestamp_to)
+
+
+async def aarchived_rows(chunks, query):
+    """Async counterpart of archived_rows"""
+    timestamp_from, timestamp_to = _utc(query.timestamp_from), _utc(query.timestamp_to)
+    async for chunk in chunks.order_by('sensor_id', 'day').aiterator(chunk_size=100):
+        for reading in _in_range(unpack_chunk(chunk.data, chunk.sensor_id), timestamp_from, timestamp_to):
+            yield reading
+
+
+def archived_readings(sensor_ids, timestamp_from=None, timestamp_to=None):
+    """ArchivedReadings of ``sensor_ids`` within the range, by sensor and then timestamp"""
+    chunks = ReadingChunk.objects.filter(sensor_id__in=sensor_ids)
+    return _decode(_between(chunks, timestamp_from, timestamp_to), timestamp_from, timestamp_to)
+
+
+def newest_archived(sensor_ids, timestamp_from=None, timestamp_to=None, found=None):
+    """
+    ``{sensor_id: ArchivedReading}``, the newest archived reading of each of ``sensor_ids`` in the range.
+
+    ``found`` maps sensor ids to the timestamp of a reading already found
+    for them; chunks of days before it aren't loaded.
+    """
+    found = found or {}
+    chunks = ReadingChunk.objects.filter(sensor_id__in=sensor_ids)
+    # The newest chunk reaching into the range holds the newest archived reading in it, if any
+    if timestamp_from:
+        chunks = chunks.filter(last_timestamp__gte=timestamp_from)
+    if timestamp_to:
+        chunks = chunks.filter(first_timestamp__lte=timestamp_to)
+    keys = {
+        (sensor_id, day)
+        for sensor_id, day in (
+            chunks.order_by().values('sensor_id').annotate(newest=Max('day')).values_list('sensor_id', 'newest')
+        )
+        if sensor_id not in found or _day_start(day) + DAY > found[sensor_id]
+    }
+    newest = {}
+    if not keys:
+        return newest
+    timestamp_from, timestamp_to = _utc(timestamp_from), _utc(timestamp_to)
+    for chunk in _chunks(keys):
+        readings = _in_range(unpack_chunk(chunk.data, chunk.sensor_id), timestamp_from, timestamp_to)
+        if readings:
+            newest[chunk.sensor_id] = readings[-1]
+    return newest
+
+
+def with_archive(rows, chunks, query):
+    """
+    ``rows`` (a sensor's readings queryset) extended with its archived readings.
+
+    Returns ``rows`` unchanged when no chunk overlaps the range, otherwise a
+    ReadingHistory that pages through both newest first.
+    """
+    chunks = list(filter_chunks(chunks, query).defer('data').order_by('-day'))
+    if not chunks:
+        return rows
+    return ReadingHistory(rows, chunks, _utc(query.timestamp_from), _utc(query.timestamp_to))
+
+
+class ReadingHistory:
+    """
+    A sensor's readings newest first, from rows and archived chunks, as a sliceable sequence.
+
+    Rows newer than the newest archived day are paged in the database as
+    usual. Older rows are only counted per day, so older pages skip whole
+    days by count and only decode the chunks the page falls into, merged
+    with the few rows that arrived for archived days after they were packed.
+    ``seek`` pages the same readings for CursorPagination.
+    """
+
+    def __init__(self, rows, chunks, timestamp_from, timestamp_to):
+        self.rows = rows
+        self.chunks = chunks
+        self.timestamp_from = timestamp_from
+        self.timestamp_to = timestamp_to
+        boundary = _day_start(chunks[0].day) + DAY
+        self.newer = rows.filter(timestamp__gte=boundary).order_by('-timestamp', '-id')
+        self.older = rows.filter(timestamp__lt=boundary).order_by('-timestamp', '-id')
+        self._newer_count = None
+        self._spans = None
+        self._decoded = {}
+
+    def _count_newer(self):
+        if self._newer_count is None:
+            self._newer_count = self.newer.count()
+        return self._newer_count
+
+    def _whole(self, chunk):
+        return (
+            (self.timestamp_from is None or chunk.first_timestamp >= self.timestamp_from)
+            and (self.timestamp_to is None or chunk.last_timestamp <= self.timestamp_to)
+        )
+
+    def _readings(self, chunk):
+        """A chunk's readings in range, newest first"""
+        if chunk.pk not in self._decoded:
+            readings = _in_range(unpack_chunk(chunk.data, chunk.sensor_id), self.timestamp_from, self.timestamp_to)
+            readings.reverse()
+            self._decoded[chunk.pk] = readings
+        return self._decoded[chunk.pk]
+
+    def _chunk_count(self, chunk):
+        return chunk.count if self._whole(chunk) else len(self._readings(chunk))
+
+    def _older_spans(self):
+        """
+        The readings older than the newest archived day as ``(count, chunk,
+        from, to)`` spans, newest first: each chunk's day, with its rows, and
+        the rows of the days between chunks (``chunk`` None).
+        """
+        if self._spans is None:
+            rows_per_day = defaultdict(int)
+            for day, count in (
+                self.older.order_by()
+                .annotate(day=TimeBucket('timestamp', DAY.total_seconds()))
+                .values('day')
+                .annotate(count=Count('id'))
+                .values_list('day', 'count')
+            ):
+                rows_per_day[_utc(day).date()] += count
+            days = sorted(rows_per_day, reverse=True)
+            position = 0
+            spans = []
+            for chunk in self.chunks:
+                start = _day_start(chunk.day)
+                between = 0
+                while position < len(days) and days[position] > chunk.day:
+                    between += rows_per_day[days[position]]
+                    position += 1
+                if between:
+                    spans.append((between, None, start + DAY, spans[-1][2] if spans else None))
+                spans.append((self._chunk_count(chunk) + rows_per_day.get(chunk.day, 0), chunk, start, start + DAY))
+                if position < len(days) and days[position] == chunk.day:
+                    position += 1
+            rest = sum(rows_per_day[day] for day in days[position:])
+            if rest:
+                spans.append((rest, None, None, spans[-1][2]))
+            self._spans = spans
+        return self._spans
+
+    def __len__(self):
+        return self._count_newer() + sum(count for count, _, _, _ in self._older_spans())
+
+    def _cold(self, skip, limit):
+        """Up to ``limit`` readings older than the newest archived day, newest first, after skipping ``skip``"""
+        items = []
+        for count, chunk, timestamp_from, timestamp_to in self._older_spans():
+            if len(items) >= limit:
+                break
+            if skip >= count:
+                skip -= count
+                continue
+            rows = self.older
+            if timestamp_from is not None:
+                rows = rows.filter(timestamp__gte=timestamp_from)
+            if timestamp_to is not None:
+                rows = rows.filter(timestamp__lt=timestamp_to)
+            wanted = limit - len(items)
+            if chunk is None:
+                items.extend(rows[skip:skip + wanted])
+            else:
+                merged = heapq.merge(self._readings(chunk), rows, key=lambda reading: reading.timestamp, reverse=True)
+                items.extend(islice(merged, skip, skip + wanted))
+            skip = 0
+        return items
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError("ReadingHistory only supports [start:stop] slices")
+        start, stop = index.start or 0, index.stop
+        newer_count = self._count_newer()
+        items = list(self.newer[start:min(stop, newer_count)]) if start < newer_count else []
+        if stop > newer_count:
+            items.extend(self._cold(max(start - newer_count, 0), stop - start - len(items)))
+        return items
+
+    def seek(self, position, limit):
+        """
+        The first ``limit`` readings past a decoded cursor ``position``, like
+        ``sensors.pagination.seek`` does for rows. Chunks are decoded from
+        the cursor's day on until the page is full.
+        """
+        newest_first = position is None or position[0] == 'next'
+        after = None if position is None else (_utc(position[1]), position[2])
+        archived = []
+        for chunk in (self.chunks if newest_first else reversed(self.chunks)):
+            if len(archived) >= limit:
+                break
+            if after is not None and (
+                chunk.first_timestamp > after[0] if newest_first else chunk.last_timestamp < after[0]
+            ):
+                continue
+            readings = self._readings(chunk) if newest_first else reversed(self._readings(chunk))
+            for reading in readings:
+                key = (reading.timestamp, reading.id)
+                if after is None or (key < after if newest_first else key > after):
+                    archived.append(reading)
+                    if len(archived) >= limit:
+                        break
+        merged = heapq.merge(
+            seek(self.rows, position, limit), archived,
+            key=lambda reading: (reading.timestamp, reading.id), reverse=newest_first
+        )
+        return list(islice(merged, limit))
+
+
+def archived_stats(sensor_id):
+    """Count, first/last timestamp and value bounds of a sensor's archived readings"""
+    return ReadingChunk.objects.filter(sensor_id=sensor_id).aggregate(
+        readings_count=Sum('count'),
+        chunks=Count('id'),
+        first_reading_timestamp=Min('first_timestamp'),
+        last_reading_timestamp=Max('last_timestamp'),
+        min_temperature=Min('temperature_min'),
+        max_temperature=Max('temperature_max'),
+        min_humidity=Min('humidity_min'),
+        max_humidity=Max('humidity_max'),
+    )
+
+
+def newest_archived_reading(sensor_id):
+    chunk = ReadingChunk.objects.filter(sensor_id=sensor_id).order_by('-day').first()
+    return unpack_chunk(chunk.data, sensor_id)[-1] if chunk else None
@@ -0,0 +1,277 @@
+"""
+Async versions of the sensors and readings routers.
+
+They expose the same paths and schemas as ``sensors.views`` but run on the
+async ORM, so under ASGI a slow client holds a coroutine instead of a worker
+thread. ``backend.urls`` mounts these instead of the sync routers when
+``ASYNC_VIEWS`` is enabled (the default for ``backend.asgi``).
+"""
+from typing import List
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+from ninja import Router, Query
+from ninja.decorators import decorate_view
+from ninja.pagination import paginate
+from .models import Sensor, SensorStats, IngestKey, Reading, ReadingChunk, Measurement, AlertRule, AlertEvent
+from .schemas import (
+    SensorIn, SensorOut, SensorUpdateSchema, IngestKeyIn, IngestKeyOut, IngestKeyCreatedOut, ReadingIn, ReadingOut,
+    ReadingBulkIn, MultiSensorReadingBulkIn, ReadingBulkOut, ReadingBucketOut,
+    ReadingQueuedOut, IngestBufferStatsOut, SensorReadingOut, SensorSeriesOut, AlertRuleIn, AlertRuleOut, AlertEventOut,
+    MeasurementBulkIn, MeasurementBulkOut, MeasurementOut, MeasurementBucketOut
+)
+from .query_schemas import (
+    SensorListQuery, ReadingListQuery, ReadingAggregateQuery,
+    ReadingExportQuery, FleetReadingExportQuery, FleetReadingListQuery, FleetReadingAggregateQuery,
+    LiveReadingsQuery, AlertEventQuery, MeasurementListQuery, MeasurementAggregateQuery, IngestQuery
+)
+from .auth import async_ingest_key_auth, async_jwt_auth, async_jwt_query_auth, create_ingest_key, revoke_ingest_key
+from .ingest import ingest_readings
+from .pagination import AsyncPageNumberPagination, CursorPagination
+from .rollups import aggregate_series
+from .overview import latest_readings
+from .measurements import list_measurements, aggregate_measurements
+from .export import export_response
+from .archive import aarchived_rows, filter_chunks, with_archive
+from .columnar import columnar_response, columnar_rows
+from .response_cache import cached_response
+from .live import live_response
+from .views import (
+    sensors_with_stats, filter_sensors, filter_readings, stored_range, stored_reading_range, check_bucket_count, queue_reading, save_reading, save_measurements, buffer_stats,
+    owned_sensor_ids, fleet_series, key_sensor
+)
+
+sensors_router = Router()
+readings_router = Router()
+alerts_router = Router()
+
+@sensors_router.get("/", response=List[SensorOut], auth=async_jwt_auth)
+@decorate_view(cached_response('sensors'))
+@paginate(AsyncPageNumberPagination, page_size=6)
+async def list_sensors(request, query: SensorListQuery = Query()):
+    return filter_sensors(sensors_with_stats(request.auth), query)
+
+@sensors_router.get("/models/", auth=async_jwt_auth)
+@decorate_view(cached_response('models'))
+async def get_available_models(request):
+    """Get list of unique sensor models for the authenticated user"""
+    models = Sensor.objects.filter(owner=request.auth).values_list('model', flat=True).distinct()
+    models_list = [model async for model in models if model]
+    return JsonResponse(models_list, safe=False)
+
+@sensors_router.post("/", response=SensorOut, auth=async_jwt_auth)
+async def create_sensor(request, data: SensorIn):
+    sensor = await Sensor.objects.acreate(
+        owner=request.auth,
+        name=data.name,
+        model=data.model,
+        description=data.description or ""
+    )
+    sensor.readings_count = 0
+    return sensor
+
+@sensors_router.get("/{sensor_id}/", response=SensorOut, auth=async_jwt_auth)
+@decorate_view(cached_response('sensor'))
+async def get_sensor(request, sensor_id: int):
+    return await aget_object_or_404(sensors_with_stats(request.auth), id=sensor_id)
+
+@sensors_router.put("/{sensor_id}/", response=SensorOut, auth=async_jwt_auth)
+async def update_sensor(request, sensor_id: int, data: SensorUpdateSchema):
+    sensor = await aget_object_or_404(sensors_with_stats(request.auth), id=sensor_id)
+
+    update_fields = data.dict(exclude_unset=True)
+    for field, value in update_fields.items():
+        setattr(sensor, field, value)
+
+    await sensor.asave()
+    return sensor
+
+@sensors_router.delete("/{sensor_id}/", auth=async_jwt_auth)
+async def delete_sensor(request, sensor_id: int):
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    await sensor.adelete()
+    return {"message": "Sensor deleted successfully"}
+
+@sensors_router.get("/{sensor_id}/ingest-keys/", response=List[IngestKeyOut], auth=async_jwt_auth)
+async def list_ingest_keys(request, sensor_id: int):
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return [ingest_key async for ingest_key in IngestKey.objects.filter(sensor=sensor).order_by('-created_at')]
+
+@sensors_router.post("/{sensor_id}/ingest-keys/", response=IngestKeyCreatedOut, auth=async_jwt_auth)
+async def create_sensor_ingest_key(request, sensor_id: int, data: IngestKeyIn):
+    """Issue a key that lets a device write this sensor's readings; the key is only shown here"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    ingest_key, key = await sync_to_async(create_ingest_key)(sensor, data.name)
+    ingest_key.key = key
+    return ingest_key
+
+@sensors_router.delete("/{sensor_id}/ingest-keys/{key_id}/", auth=async_jwt_auth)
+async def revoke_sensor_ingest_key(request, sensor_id: int, key_id: int):
+    ingest_key = await aget_object_or_404(IngestKey, id=key_id, sensor_id=sensor_id, sensor__owner=request.auth)
+    await sync_to_async(revoke_ingest_key)(ingest_key)
+    return {"message": "Ingest key revoked successfully"}
+
+async def ingest_sensor(request, sensor_id):
+    """The sensor a write goes to, from the ingest key without a query or owned by the JWT user"""
+    if isinstance(request.auth, IngestKey):
+        return key_sensor(request.auth, sensor_id)
+    return await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+
+@readings_router.get("/{sensor_id}/readings/", response=List[ReadingOut], auth=async_jwt_auth)
+@columnar_response
+@paginate(AsyncPageNumberPagination, page_size=50)
+async def list_readings(request, sensor_id: int, query: ReadingListQuery = Query()):
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    rows = columnar_rows(request, filter_readings(Reading.objects.filter(sensor=sensor), query))
+    return await sync_to_async(with_archive)(rows, ReadingChunk.objects.filter(sensor=sensor), query)
+
+@readings_router.get("/{sensor_id}/readings/cursor/", response=List[ReadingOut], auth=async_jwt_auth)
+@columnar_response
+@paginate(CursorPagination, page_size=50)
+async def list_readings_cursor(request, sensor_id: int, query: ReadingListQuery = Query()):
+    """List readings newest first using opaque next/previous cursors instead of page numbers"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    rows = columnar_rows(request, filter_readings(Reading.objects.filter(sensor=sensor), query))
+    return await sync_to_async(with_archive)(rows, ReadingChunk.objects.filter(sensor=sensor), query)
+
+@readings_router.get("/{sensor_id}/readings/aggregate/", response=List[ReadingBucketOut], auth=async_jwt_auth)
+async def aggregate_sensor_readings(request, sensor_id: int, query: ReadingAggregateQuery = Query()):
+    """Min/max/avg/count of readings per time bucket, computed in the database"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    check_bucket_count(query, await sync_to_async(stored_reading_range)(SensorStats.objects.filter(sensor=sensor), query))
+    return await sync_to_async(aggregate_series)(
+        sensor.id, query.bucket, query.timestamp_from, query.timestamp_to
+    )
+
+@readings_router.get("/readings/latest/", response=List[SensorReadingOut], auth=async_jwt_auth)
+async def fleet_latest_readings(request, query: FleetReadingListQuery = Query()):
+    """The newest reading of each (or each selected) sensor of the user in one query"""
+    sensor_ids = [sensor_id async for sensor_id in owned_sensor_ids(request.auth, query.sensor_ids)]
+    return await sync_to_async(latest_readings)(sensor_ids, query.timestamp_from, query.timestamp_to)
+
+@readings_router.get("/readings/series/", response=List[SensorSeriesOut], auth=async_jwt_auth)
+async def fleet_aggregate_readings(request, query: FleetReadingAggregateQuery = Query()):
+    """Downsampled series of each (or each selected) sensor of the user"""
+    sensor_ids = [sensor_id async for sensor_id in owned_sensor_ids(request.auth, query.sensor_ids)]
+    stored = await sync_to_async(stored_reading_range)(SensorStats.objects.filter(sensor_id__in=sensor_ids), query)
+    check_bucket_count(query, stored, len(sensor_ids))
+    return await sync_to_async(fleet_series)(sensor_ids, query)
+
+@readings_router.get("/{sensor_id}/readings/export/", auth=async_jwt_auth)
+async def export_sensor_readings(request, sensor_id: int, query: ReadingExportQuery = Query()):
+    """Stream a sensor's readings as CSV or NDJSON, optionally gzipped"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    queryset = filter_readings(Reading.objects.filter(sensor=sensor), query)
+    archived = aarchived_rows(filter_chunks(ReadingChunk.objects.filter(sensor=sensor), query), query)
+    return export_response(
+        queryset, query.format, query.gzip, f"sensor-{sensor.id}-readings", asynchronous=True, archived=archived
+    )
+
+@readings_router.get("/readings/export/", auth=async_jwt_auth)
+async def export_fleet_readings(request, query: FleetReadingExportQuery = Query()):
+    """Stream readings of all (or the selected) sensors of the user"""
+    queryset = Reading.objects.filter(sensor__owner=request.auth)
+    chunks = ReadingChunk.objects.filter(sensor__owner=request.auth)
+    if query.sensor_ids:
+        queryset = queryset.filter(sensor_id__in=query.sensor_ids)
+        chunks = chunks.filter(sensor_id__in=query.sensor_ids)
+    queryset = filter_readings(queryset, query)
+    archived = aarchived_rows(filter_chunks(chunks, query), query)
+    return export_response(queryset, query.format, query.gzip, "readings", asynchronous=True, archived=archived)
+
+@readings_router.get("/readings/live/", auth=[async_jwt_auth, async_jwt_query_auth])
+async def live_readings(request, query: LiveReadingsQuery = Query()):
+    """Server-Sent Events stream of new readings for the user's sensors"""
+    sensors = Sensor.objects.filter(owner=request.auth)
+    if query.sensor_ids:
+        sensors = sensors.filter(id__in=query.sensor_ids)
+    sensor_ids = {sensor_id async for sensor_id in sensors.values_list('id', flat=True)}
+    return live_response(sensor_ids)
+
+@readings_router.post("/{sensor_id}/readings/", response={200: ReadingOut, 201: ReadingOut, 202: ReadingQueuedOut}, auth=[async_ingest_key_auth, async_jwt_auth])
+async def create_reading(request, sensor_id: int, data: ReadingIn, query: IngestQuery = Query()):
+    sensor = await ingest_sensor(request, sensor_id)
+    if settings.INGEST_BUFFER:
+        return 202, queue_reading(sensor, data)
+    return await sync_to_async(save_reading)(sensor, data, query.on_conflict)
+
+@readings_router.get("/readings/buffer/", response=IngestBufferStatsOut, auth=async_jwt_auth)
+async def ingest_buffer_stats(request):
+    """Queue depth, flush latency and dropped rows of this worker's ingestion buffer"""
+    return buffer_stats(request.auth)
+
+@readings_router.post("/{sensor_id}/readings/bulk/", response=ReadingBulkOut, auth=[async_ingest_key_auth, async_jwt_auth])
+async def create_readings_bulk(request, sensor_id: int, data: ReadingBulkIn, query: IngestQuery = Query()):
+    """Create many readings for one sensor, reporting rows that conflict"""
+    sensor = await ingest_sensor(request, sensor_id)
+    return await sync_to_async(ingest_readings)(
+        [(sensor.id, reading) for reading in data.readings],
+        allowed_sensor_ids={sensor.id},
+        policy=query.on_conflict
+    )
+
+@readings_router.post("/readings/bulk/", response=ReadingBulkOut, auth=async_jwt_auth)
+async def create_readings_bulk_multi(request, data: MultiSensorReadingBulkIn, query: IngestQuery = Query()):
+    """Create readings for several of the user's sensors in one request"""
+    sensor_ids = {reading.sensor_id for reading in data.readings}
+    owned = Sensor.objects.filter(owner=request.auth, id__in=sensor_ids).values_list('id', flat=True)
+    owned_ids = {sensor_id async for sensor_id in owned}
+    return await sync_to_async(ingest_readings)(
+        [(reading.sensor_id, reading) for reading in data.readings],
+        allowed_sensor_ids=owned_ids,
+        policy=query.on_conflict
+    )
+
+@readings_router.post("/{sensor_id}/measurements/", response=MeasurementBulkOut, auth=[async_ingest_key_auth, async_jwt_auth])
+async def create_measurements(request, sensor_id: int, data: MeasurementBulkIn):
+    """Store any metric channels of a sensor, adding metric names on first use"""
+    sensor = await ingest_sensor(request, sensor_id)
+    return await sync_to_async(save_measurements)(sensor, data.measurements)
+
+@readings_router.get("/{sensor_id}/measurements/", response=List[MeasurementOut], auth=async_jwt_auth)
+@paginate(AsyncPageNumberPagination, page_size=50)
+async def list_sensor_measurements(request, sensor_id: int, query: MeasurementListQuery = Query()):
+    """A sensor's measurements newest first, optionally only some metrics"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return list_measurements(sensor.id, query)
+
+@readings_router.get("/{sensor_id}/measurements/aggregate/", response=List[MeasurementBucketOut], auth=async_jwt_auth)
+async def aggregate_sensor_measurements(request, sensor_id: int, query: MeasurementAggregateQuery = Query()):
+    """Min/max/avg/count per metric and time bucket, computed in the database"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    check_bucket_count(query, await sync_to_async(stored_range)(Measurement.objects.filter(sensor=sensor), query))
+    return await sync_to_async(aggregate_measurements)(sensor.id, query)
+
+@alerts_router.get("/{sensor_id}/alert-rules/", response=List[AlertRuleOut], auth=async_jwt_auth)
+async def list_alert_rules(request, sensor_id: int):
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return [rule async for rule in AlertRule.objects.filter(sensor=sensor)]
+
+@alerts_router.post("/{sensor_id}/alert-rules/", response=AlertRuleOut, auth=async_jwt_auth)
+async def create_alert_rule(request, sensor_id: int, data: AlertRuleIn):
+    """Add a rule that is checked against every new reading of the sensor"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return await AlertRule.objects.acreate(sensor=sensor, **data.dict())
+
+@alerts_router.delete("/{sensor_id}/alert-rules/{rule_id}/", auth=async_jwt_auth)
+async def delete_alert_rule(request, sensor_id: int, rule_id: int):
+    rule = await aget_object_or_404(AlertRule, id=rule_id, sensor_id=sensor_id, sensor__owner=request.auth)
+    await rule.adelete()
+    return {"message": "Alert rule deleted successfully"}
+
+@alerts_router.get("/{sensor_id}/alerts/", response=List[AlertEventOut], auth=async_jwt_auth)
+@paginate(AsyncPageNumberPagination, page_size=50)
+async def list_sensor_alerts(request, sensor_id: int, query: ReadingListQuery = Query()):
+    """Alert events of one sensor, newest first"""
+    sensor = await aget_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return filter_readings(AlertEvent.objects.filter(sensor=sensor), query)
+
+@alerts_router.get("/alerts/events/", response=List[AlertEventOut], auth=async_jwt_auth)
+@paginate(AsyncPageNumberPagination, page_size=50)
+async def list_alerts(request, query: AlertEventQuery = Query()):
+    """Alert events of all (or the selected) sensors of the user, newest first"""
+    queryset = AlertEvent.objects.filter(sensor__owner=request.auth)
+    if query.sensor_ids:
+        queryset = queryset.filter(sensor_id__in=query.sensor_ids)
+    return filter_readings(queryset, query)
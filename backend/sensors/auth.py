@@ -1,31 +1,214 @@
 from ninja import Router
-from ninja.security import HttpBearer
+from ninja.security import APIKeyHeader, APIKeyQuery, HttpBearer
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+import hashlib
 import jwt
 import datetime
+import secrets
 from django.conf import settings
+from django.utils import timezone
+from .models import IngestKey
 from .schemas import UserRegisterSchema, UserLoginSchema, TokenResponseSchema
+from .token_cache import TokenCache
+from .profiling import timed
 
 auth_router = Router()
 
+token_cache = TokenCache(
+    maxsize=settings.JWT_AUTH_CACHE_SIZE,
+    ttl=settings.JWT_AUTH_CACHE_TTL
+)
+
+ingest_key_cache = TokenCache(
+    maxsize=settings.INGEST_KEY_CACHE_SIZE,
+    ttl=settings.INGEST_KEY_CACHE_TTL
+)
+
 class JWTAuth(HttpBearer):
+    def __init__(self, cache=None):
+        super().__init__()
+        self.cache = cache if cache is not None else token_cache
+
+    def __call__(self, request):
+        user = authenticated_user(request)
+        if user is not None:
+            return user
+        with timed('auth'):
+            return super().__call__(request)
+
     def authenticate(self, request, token):
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            user_id = payload.get('user_id')
-            if user_id:
-                user = User.objects.get(id=user_id)
-                return user
-        except (jwt.InvalidTokenError, User.DoesNotExist):
+        user = self.cache.get(token_signature(token))
+        if user is not None:
+            return user
+        
+        payload = decode_token(token)
+        if payload is None:
+            return None
+        
+        user = claims_user(payload)
+        if user is None:
+            try:
+                user = User.objects.get(id=payload['user_id'])
+            except User.DoesNotExist:
+                return None
+        return self.remember(token, payload, user)
+
+    def remember(self, token, payload, user):
+        if not user.is_active:
+            return None
+        self.cache.set(token_signature(token), user, token_exp=payload.get('exp'))
+        return user
+
+class AsyncJWTAuth(JWTAuth):
+    """JWTAuth for async views; the user lookup goes through the async ORM"""
+
+    async def __call__(self, request):
+        user = authenticated_user(request)
+        if user is not None:
+            return user
+        with timed('auth'):
+            # None when the request has no bearer token
+            authenticating = HttpBearer.__call__(self, request)
+            return await authenticating if authenticating is not None else None
+
+    async def authenticate(self, request, token):
+        user = self.cache.get(token_signature(token))
+        if user is not None:
+            return user
+        
+        payload = decode_token(token)
+        if payload is None:
+            return None
+        
+        user = claims_user(payload)
+        if user is None:
+            try:
+                user = await User.objects.aget(id=payload['user_id'])
+            except User.DoesNotExist:
+                return None
+        return self.remember(token, payload, user)
+
+class AsyncJWTQueryAuth(APIKeyQuery):
+    """Access token passed as ``?token=``, for clients such as EventSource that can't set headers"""
+    param_name = "token"
+
+    async def __call__(self, request):
+        with timed('auth'):
+            authenticating = super().__call__(request)
+            return await authenticating if authenticating is not None else None
+
+    async def authenticate(self, request, key):
+        return await async_jwt_auth.authenticate(request, key)
+
+class IngestKeyAuth(APIKeyHeader):
+    """
+    Per-sensor device key sent as ``X-Ingest-Key``.
+
+    ``request.auth`` becomes the IngestKey (with its sensor), which only
+    authorizes writes to that sensor. Once a key has been verified it is served
+    from ``ingest_key_cache``, so a device's requests need no auth queries.
+    """
+    param_name = "X-Ingest-Key"
+
+    def __init__(self, cache=None):
+        super().__init__()
+        self.cache = cache if cache is not None else ingest_key_cache
+
+    def __call__(self, request):
+        with timed('auth'):
+            return super().__call__(request)
+
+    def authenticate(self, request, key):
+        if not key:
+            return None
+        key_hash = hash_ingest_key(key)
+        ingest_key = self.cache.get(key_hash)
+        if ingest_key is None:
+            ingest_key = active_ingest_keys().filter(key_hash=key_hash).first()
+            if ingest_key is not None:
+                self.cache.set(key_hash, ingest_key)
+        return ingest_key
+
+class AsyncIngestKeyAuth(IngestKeyAuth):
+    """IngestKeyAuth for async views; the key lookup goes through the async ORM"""
+
+    async def __call__(self, request):
+        with timed('auth'):
+            authenticating = APIKeyHeader.__call__(self, request)
+            return await authenticating if authenticating is not None else None
+
+    async def authenticate(self, request, key):
+        if not key:
             return None
+        key_hash = hash_ingest_key(key)
+        ingest_key = self.cache.get(key_hash)
+        if ingest_key is None:
+            ingest_key = await active_ingest_keys().filter(key_hash=key_hash).afirst()
+            if ingest_key is not None:
+                self.cache.set(key_hash, ingest_key)
+        return ingest_key
+
+def authenticated_user(request):
+    """The user a bearer token already authenticated earlier in this request, if any"""
+    user = getattr(request, 'auth', None)
+    return user if isinstance(user, User) else None
+
+def active_ingest_keys():
+    return IngestKey.objects.select_related('sensor').filter(
+        revoked_at__isnull=True, sensor__owner__is_active=True
+    )
+
+def hash_ingest_key(key):
+    # Keys are 256 random bits, so unlike a password a plain SHA-256 can't be brute-forced
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def create_ingest_key(sensor, name=''):
+    """Add a key for ``sensor``; returns the IngestKey and the key, which is shown only once"""
+    key = f"ik_{secrets.token_urlsafe(32)}"
+    ingest_key = IngestKey.objects.create(
+        sensor=sensor, name=name, prefix=key[:10], key_hash=hash_ingest_key(key)
+    )
+    return ingest_key, key
+
+def revoke_ingest_key(ingest_key):
+    """Stop accepting a key; other processes drop it within INGEST_KEY_CACHE_TTL"""
+    if ingest_key.revoked_at is None:
+        ingest_key.revoked_at = timezone.now()
+        ingest_key.save(update_fields=['revoked_at'])
+    ingest_key_cache.invalidate(ingest_key.pk)
+
+def token_signature(token):
+    return token.rsplit('.', 1)[-1]
+
+def decode_token(token):
+    """The token's payload, or None when it is invalid or names no user"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return None
+    if not payload.get('user_id'):
+        return None
+    return payload
+
+def claims_user(payload):
+    """Build the user from signed claims when JWT_TRUST_CLAIMS allows skipping the DB"""
+    if settings.JWT_TRUST_CLAIMS and 'is_active' in payload:
+        return User(id=payload['user_id'], username=payload.get('username', ''), is_active=payload['is_active'])
+    return None
 
 jwt_auth = JWTAuth()
+async_jwt_auth = AsyncJWTAuth()
+async_jwt_query_auth = AsyncJWTQueryAuth()
+ingest_key_auth = IngestKeyAuth()
+async_ingest_key_auth = AsyncIngestKeyAuth()
 
 def create_tokens(user):
     """Create access and refresh tokens for user"""
     access_payload = {
         'user_id': user.id,
+        'username': user.username,
+        'is_active': user.is_active,
         'type': 'access',
         'exp': datetime.datetime.now(datetime.UTC) + datetime.timedelta(hours=1)
     }
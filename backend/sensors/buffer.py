@@ -0,0 +1,176 @@
+"""
+Write-behind buffer for single-reading ingestion.
+
+With ``INGEST_BUFFER`` enabled, ``POST /{sensor_id}/readings/`` validates the
+reading, appends it to this process's buffer and answers ``202`` right away. A
+background thread group-commits the buffer through ``ingest_readings`` every
+``INGEST_BUFFER_FLUSH_MS`` milliseconds, or as soon as
+``INGEST_BUFFER_BATCH_ROWS`` readings are waiting, so a thousand devices
+posting one reading each cost one ``bulk_create`` instead of a thousand
+transactions. Stats, alerts, live updates and cache invalidation run once per
+flush.
+
+Rows that can't be stored at flush time (duplicate timestamps, sensors deleted
+in the meantime, a failing database) are counted as dropped. A batch that fails
+as a whole is retried sensor by sensor, so one sensor's rows can't take the
+other sensors' readings down with them. When the buffer
+holds ``INGEST_BUFFER_MAX_DEPTH`` rows new readings are rejected, so clients
+see back-pressure instead of the process growing without bound.
+
+The buffer lives in memory: it is drained on a clean interpreter shutdown
+(SIGTERM/SIGINT to gunicorn or uvicorn), but rows still queued when a worker
+is killed outright are lost.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from .ingest import MAX_BULK_READINGS, _clean_values, ingest_readings
+from .models import Sensor
+
+logger = logging.getLogger(__name__)
+
+# How long shutdown waits for the flusher thread to drain the buffer
+SHUTDOWN_TIMEOUT_SECONDS = 30
+
+
+class BufferFull(Exception):
+    pass
+
+
+class IngestBuffer:
+    """Readings waiting to be committed, with the counters describing the queue"""
+
+    def __init__(self):
+        self._rows = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def enqueue(self, sensor_id, data):
+        """Validate ``data`` and queue it for ``sensor_id``; raises ValidationError or BufferFull"""
+        _clean_values(data.temperature, data.humidity)
+        with self._condition:
+            if len(self._rows) >= settings.INGEST_BUFFER_MAX_DEPTH:
+                self.rejected += 1
+                raise BufferFull("Ingestion buffer is full, retry later")
+            self._rows.append((sensor_id, data))
+            self.enqueued += 1
+            if len(self._rows) >= settings.INGEST_BUFFER_BATCH_ROWS:
+                self._condition.notify()
+        self.start()
+
+    def start(self):
+        """Start the flusher thread of this process if it isn't running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='ingest-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        interval = settings.INGEST_BUFFER_FLUSH_MS / 1000
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._stopping or len(self._rows) >= settings.INGEST_BUFFER_BATCH_ROWS,
+                        timeout=interval
+                    )
+                    stopping = self._stopping
+                # The flusher thread's own connection, treated like a request's
+                close_old_connections()
+                self.flush()
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Commit everything queued so far; returns the number of readings stored"""
+        with self._flush_lock:
+            with self._condition:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+
+            started = time.monotonic()
+            created = 0
+            for start in range(0, len(rows), MAX_BULK_READINGS):
+                created += self._store(rows[start:start + MAX_BULK_READINGS])
+            elapsed = time.monotonic() - started
+
+            self.flushed += created
+            self.flushes += 1
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+            return created
+
+    def _store(self, batch):
+        """Commit one batch; returns the number of readings stored"""
+        sensor_ids = {sensor_id for sensor_id, _ in batch}
+        # Readings of sensors deleted since they were queued come back as conflicts
+        existing = set(Sensor.objects.filter(id__in=sensor_ids).values_list('id', flat=True))
+        try:
+            result = ingest_readings(batch, allowed_sensor_ids=existing)
+        except Exception:
+            if len(sensor_ids) == 1:
+                logger.exception("Dropping %d buffered readings after a failed flush", len(batch))
+                self.dropped += len(batch)
+                return 0
+            logger.exception("Flush of %d buffered readings failed, retrying sensor by sensor", len(batch))
+            by_sensor = defaultdict(list)
+            for row in batch:
+                by_sensor[row[0]].append(row)
+            return sum(self._store(sensor_rows) for sensor_rows in by_sensor.values())
+        self.dropped += len(result['conflicts']) + result['duplicates']
+        return result['created'] + result['updated']
+
+    def close(self):
+        """Stop the flusher once it has drained the buffer"""
+        thread = self._thread
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if thread is not None and thread.is_alive():
+            thread.join(SHUTDOWN_TIMEOUT_SECONDS)
+        # Rows that arrived after the last flush, or with no flusher running
+        self.flush()
+
+    def stats(self):
+        with self._condition:
+            depth = len(self._rows)
+        return {
+            'depth': depth,
+            'max_depth': settings.INGEST_BUFFER_MAX_DEPTH,
+            'enqueued': self.enqueued,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'flushes': self.flushes,
+            'last_flush_seconds': self.last_flush_seconds,
+            'max_flush_seconds': self.max_flush_seconds,
+            'avg_flush_seconds': self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+        }
+
+
+ingest_buffer = IngestBuffer()
+
+# Runs while daemon threads are still alive, before the interpreter tears down
+atexit.register(ingest_buffer.close)
@@ -0,0 +1,199 @@
+import heapq
+import json
+import zlib
+from django.http import StreamingHttpResponse
+from .columnar import COLUMNAR_CONTENT_TYPE, COLUMNAR_FIELDS, pack_rows
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = ('sensor_id', 'timestamp', 'temperature', 'humidity')
+
+# Rows are joined into chunks of roughly this many bytes before being sent
+STREAM_CHUNK_BYTES = 64 * 1024
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'columns': COLUMNAR_CONTENT_TYPE,
+}
+
+
+def export_rows(queryset):
+    """(sensor_id, timestamp, temperature, humidity) tuples in export order"""
+    return queryset.order_by('sensor_id', 'timestamp').values_list(*EXPORT_COLUMNS)
+
+
+def _export_row(reading):
+    return (reading.sensor_id, reading.timestamp, reading.temperature, reading.humidity)
+
+
+def _export_key(row):
+    return row[0], row[1]
+
+
+def _column_key(row):
+    return row[1], row[2]
+
+
+def _merge(rows, archived, project, key):
+    """Stored rows merged with ArchivedReadings, both ordered by sensor and timestamp"""
+    if archived is None:
+        return rows
+    return heapq.merge(rows, map(project, archived), key=key)
+
+
+async def _amerge(rows, archived, project, key):
+    """Async counterpart of _merge"""
+    if archived is None:
+        async for row in rows:
+            yield row
+        return
+    pending = await anext(archived, None)
+    async for row in rows:
+        while pending is not None and key(project(pending)) <= key(row):
+            yield project(pending)
+            pending = await anext(archived, None)
+        yield row
+    while pending is not None:
+        yield project(pending)
+        pending = await anext(archived, None)
+
+
+def csv_line(row):
+    sensor_id, timestamp, temperature, humidity = row
+    # Every column is numeric or an ISO timestamp, so nothing ever needs quoting
+    return f"{sensor_id},{timestamp.isoformat()},{temperature},{humidity}\r\n"
+
+
+def ndjson_line(row):
+    sensor_id, timestamp, temperature, humidity = row
+    return json.dumps({
+        'sensor_id': sensor_id,
+        'timestamp': timestamp.isoformat(),
+        'temperature': float(temperature),
+        'humidity': float(humidity),
+    }) + '\n'
+
+
+FORMATTERS = {
+    'csv': (','.join(EXPORT_COLUMNS) + '\r\n', csv_line),
+    'ndjson': ('', ndjson_line),
+}
+
+
+class _Chunker:
+    """Joins formatted lines into chunks and optionally gzips them"""
+
+    def __init__(self, header, compress):
+        self.lines = [header] if header else []
+        self.size = len(header)
+        self.compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def add(self, line):
+        self.lines.append(line)
+        self.size += len(line)
+        if self.size >= STREAM_CHUNK_BYTES:
+            return self.take()
+        return None
+
+    def take(self):
+        data = ''.join(self.lines).encode()
+        self.lines, self.size = [], 0
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        return data or None
+
+    def finish(self):
+        data = self.take() or b''
+        if self.compressor is not None:
+            data += self.compressor.flush()
+        return data
+
+
+def stream_export(queryset, export_format, compress, archived=None):
+    """Server-side cursor backed byte stream for WSGI"""
+    header, format_line = FORMATTERS[export_format]
+    chunker = _Chunker(header, compress)
+    rows = export_rows(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for row in _merge(rows, archived, _export_row, _export_key):
+        chunk = chunker.add(format_line(row))
+        if chunk:
+            yield chunk
+    yield chunker.finish()
+
+
+async def astream_export(queryset, export_format, compress, archived=None):
+    """Async byte stream for ASGI, reading rows through the async ORM"""
+    header, format_line = FORMATTERS[export_format]
+    chunker = _Chunker(header, compress)
+    rows = export_rows(queryset).aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    async for row in _amerge(rows, archived, _export_row, _export_key):
+        chunk = chunker.add(format_line(row))
+        if chunk:
+            yield chunk
+    yield chunker.finish()
+
+
+def _column_rows(queryset):
+    return queryset.order_by('sensor_id', 'timestamp').values_list(*COLUMNAR_FIELDS)
+
+
+def _encode_block(rows, compressor, last=False):
+    data = pack_rows(rows)
+    if compressor is None:
+        return data
+    data = compressor.compress(data)
+    return data + compressor.flush() if last else data
+
+
+def stream_columns(queryset, compress, archived=None):
+    """Columnar blocks of EXPORT_CHUNK_SIZE rows, ended by an empty block"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    stored = _column_rows(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    rows = []
+    for row in _merge(stored, archived, tuple, _column_key):
+        rows.append(row)
+        if len(rows) == EXPORT_CHUNK_SIZE:
+            yield _encode_block(rows, compressor)
+            rows = []
+    if rows:
+        yield _encode_block(rows, compressor)
+    yield _encode_block([], compressor, last=True)
+
+
+async def astream_columns(queryset, compress, archived=None):
+    """Async counterpart of stream_columns"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    stored = _column_rows(queryset).aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    rows = []
+    async for row in _amerge(stored, archived, tuple, _column_key):
+        rows.append(row)
+        if len(rows) == EXPORT_CHUNK_SIZE:
+            yield _encode_block(rows, compressor)
+            rows = []
+    if rows:
+        yield _encode_block(rows, compressor)
+    yield _encode_block([], compressor, last=True)
+
+
+def export_response(queryset, export_format, compress, filename, asynchronous=False, archived=None):
+    """
+    A StreamingHttpResponse whose memory use doesn't grow with the number of rows.
+
+    ``archived`` is an (async, with ``asynchronous``) iterable of
+    ArchivedReadings in sensor and timestamp order, merged into the stream.
+    """
+    if export_format == 'columns':
+        stream = astream_columns if asynchronous else stream_columns
+        content = stream(queryset, compress, archived)
+    else:
+        stream = astream_export if asynchronous else stream_export
+        content = stream(queryset, export_format, compress, archived)
+
+    filename = f"{filename}.{export_format}"
+    if compress:
+        response = StreamingHttpResponse(content, content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
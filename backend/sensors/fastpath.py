@@ -0,0 +1,210 @@
+"""
+Minimal WSGI/ASGI apps for device ingestion, outside Django's request stack.
+
+Devices with an ingest key (see sensors.auth) can post to a separate server
+process instead of the API:
+
+    uvicorn backend.ingest_asgi:application --port 8001
+    gunicorn backend.ingest_wsgi:application --bind :8001
+
+It serves the same two routes with the same bodies and responses as the API:
+
+    POST /api/sensors/{id}/readings/        one reading
+    POST /api/sensors/{id}/readings/bulk/   up to MAX_BULK_READINGS readings
+
+and nothing else: no middleware, URL resolver, sessions or Ninja operation.
+The body is parsed and validated against ReadingIn/ReadingBulkIn in one pass
+by pydantic-core's JSON parser. Readings are written through ``store_reading`` /
+``ingest_readings``, so stats, alerts, live readings, caches and
+INGEST_BUFFER behave as they do through the API. JWTs are not accepted here.
+"""
+import json
+import logging
+import re
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import pydantic
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import RequestAborted, ValidationError
+from django.db import close_old_connections
+from ninja.responses import NinjaJSONEncoder
+from .auth import ingest_key_auth
+from .buffer import BufferFull, ingest_buffer
+from .ingest import CONFLICT_POLICIES, ingest_readings, store_reading
+from .schemas import ReadingBulkIn, ReadingBulkOut, ReadingIn, ReadingOut, ReadingQueuedOut
+
+logger = logging.getLogger(__name__)
+
+ROUTE = re.compile(r'^/api/sensors/(?P<sensor_id>\d+)/readings/(?P<bulk>bulk/)?$')
+
+
+def _json(status, payload):
+    # Ninja's encoder, so timestamps are rendered exactly as the API renders them
+    return status, json.dumps(payload, cls=NinjaJSONEncoder).encode()
+
+
+def _error(status, detail):
+    return _json(status, {"detail": detail})
+
+
+def _schema_errors(e):
+    # Shaped like Ninja's 422 body, minus the pydantic context
+    return [
+        {**error, "loc": ["body", "data", *error["loc"]]}
+        for error in e.errors(include_url=False, include_context=False, include_input=False)
+    ]
+
+
+def ingest(method, path, query_string, key, body):
+    """Serve one ingestion request; returns (status, JSON body)"""
+    match = ROUTE.match(path)
+    if match is None:
+        return _error(404, "Not Found")
+    if method != 'POST':
+        return _error(405, "Method not allowed")
+
+    ingest_key = ingest_key_auth.authenticate(None, key)
+    if ingest_key is None:
+        return _error(401, "Unauthorized")
+    sensor_id = int(match['sensor_id'])
+    if ingest_key.sensor_id != sensor_id:
+        return _error(404, "Not Found")
+
+    policy = parse_qs(query_string).get('on_conflict', [None])[-1]
+    if policy is not None and policy not in CONFLICT_POLICIES:
+        return _error(422, f"on_conflict must be one of {', '.join(CONFLICT_POLICIES)}")
+
+    schema = ReadingBulkIn if match['bulk'] else ReadingIn
+    try:
+        data = schema.model_validate_json(body)
+    except pydantic.ValidationError as e:
+        if any(error['type'] == 'json_invalid' for error in e.errors()):
+            return _error(400, "Cannot parse request body")
+        return _error(422, _schema_errors(e))
+
+    if match['bulk']:
+        result = ingest_readings(
+            [(sensor_id, reading) for reading in data.readings],
+            allowed_sensor_ids={sensor_id},
+            policy=policy
+        )
+        return _json(200, ReadingBulkOut.model_validate(result).model_dump())
+
+    try:
+        if settings.INGEST_BUFFER:
+            ingest_buffer.enqueue(sensor_id, data)
+            queued = {"sensor_id": sensor_id, "timestamp": data.timestamp, "status": "queued"}
+            return _json(202, ReadingQueuedOut.model_validate(queued).model_dump())
+        reading, created = store_reading(ingest_key.sensor, data, policy)
+    except ValidationError as e:
+        return _error(422, "; ".join(e.messages))
+    except BufferFull as e:
+        return _error(503, str(e))
+    return _json(201 if created else 200, ReadingOut.model_validate(reading).model_dump())
+
+
+def serve(method, path, query_string, key, body):
+    """``ingest`` with the connection housekeeping Django does around each request"""
+    close_old_connections()
+    try:
+        return ingest(method, path, query_string, key, body)
+    except Exception:
+        logger.exception("Ingestion request failed: %s %s", method, path)
+        return _error(500, "Internal server error")
+    finally:
+        close_old_connections()
+
+
+def _too_large(length):
+    limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    return limit is not None and length > limit
+
+
+class IngestWSGIHandler:
+    def __call__(self, environ, start_response):
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if _too_large(length):
+            status, body = _error(413, "Request body too large")
+        else:
+            status, body = serve(
+                environ['REQUEST_METHOD'],
+                environ.get('PATH_INFO', ''),
+                environ.get('QUERY_STRING', ''),
+                environ.get('HTTP_X_INGEST_KEY'),
+                environ['wsgi.input'].read(length) if length else b''
+            )
+        start_response(f'{status} {HTTPStatus(status).phrase}', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+        ])
+        return [body]
+
+
+class IngestASGIHandler:
+    """
+    The ASGI flavour. Requests run in a thread pool rather than Django's single
+    thread for sync code, since every request holds its own DB connection.
+    """
+
+    def __init__(self):
+        self._serve = sync_to_async(serve, thread_sensitive=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Ingestion can't handle {scope['type']} connections")
+
+        headers = dict(scope['headers'])
+        try:
+            body = await self._read_body(receive)
+        except RequestAborted:
+            return
+        if body is None:
+            status, payload = _error(413, "Request body too large")
+        else:
+            key = headers.get(b'x-ingest-key')
+            status, payload = await self._serve(
+                scope['method'],
+                scope['path'],
+                scope.get('query_string', b'').decode('latin-1'),
+                key.decode('latin-1') if key is not None else None,
+                body
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _read_body(self, receive):
+        """The whole request body, or None once it grows past DATA_UPLOAD_MAX_MEMORY_SIZE"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise RequestAborted
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if _too_large(size):
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,56 @@
+import math
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+from django.utils.functional import cached_property
+
+
+def validate_finite(value):
+    # NaN compares False with everything, so the range validators let it through
+    if not math.isfinite(value):
+        raise ValidationError("Ensure this value is a finite number.", code='invalid')
+
+
+class RealField(models.FloatField):
+    """
+    A single-precision float column (``real`` on PostgreSQL) for values with a
+    fixed number of decimal places.
+
+    Values are rounded to ``decimal_places`` when saved and when loaded, so the
+    float32 representation error never reaches the API. ``max_digits`` bounds the
+    value the same way it does for a DecimalField, and like a DecimalField it
+    rejects NaN and infinities.
+    """
+
+    def __init__(self, *args, max_digits=5, decimal_places=2, **kwargs):
+        self.max_digits = max_digits
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def validators(self):
+        limit = 10 ** (self.max_digits - self.decimal_places) - 10 ** -self.decimal_places
+        return [*super().validators, validate_finite, MinValueValidator(-limit), MaxValueValidator(limit)]
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['max_digits'] = self.max_digits
+        kwargs['decimal_places'] = self.decimal_places
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'real'
+        return super().db_type(connection)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return round(value, self.decimal_places)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return round(value, self.decimal_places)
@@ -0,0 +1,219 @@
+"""
+Reading ingestion, idempotent under retries.
+
+A reading is identified by ``(sensor, timestamp)``; storing one that already
+exists is a retry, not an error. Rows go in with ``INSERT ... ON CONFLICT DO
+NOTHING RETURNING`` and, depending on the conflict policy, the rows that were
+already there are then rewritten with one ``UPDATE ... FROM (VALUES ...)``:
+
+    ignore     the stored values win (and within a batch, the first copy)
+    overwrite  the last copy wins; only rows whose values differ are
+               written, so replaying an unchanged buffer writes nothing
+
+Every call reports how many rows were created, updated and deduplicated, so
+gateways can replay their buffers without checking what already made it in.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+from .alerts import evaluate_readings
+from .archive import archived_copies, rewrite_archived
+from .live import publish_readings
+from .models import Reading, Sensor
+from .response_cache import invalidate_readings
+from .rollups import refresh_rollups
+from .stats import record_readings
+
+BULK_BATCH_SIZE = 1000
+MAX_BULK_READINGS = 10000
+
+CONFLICT_POLICIES = ('ignore', 'overwrite')
+
+
+def _normalize_timestamp(value):
+    if timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def _clean_values(temperature, humidity):
+    """Run the model field validation so one bad row can't abort the INSERT"""
+    temperature = Reading._meta.get_field('temperature').clean(temperature, None)
+    humidity = Reading._meta.get_field('humidity').clean(humidity, None)
+    return temperature, humidity
+
+
+def _policy(policy):
+    policy = policy or settings.INGEST_CONFLICT_POLICY
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy {policy!r}, expected one of {', '.join(CONFLICT_POLICIES)}")
+    return policy
+
+
+def _params(readings):
+    fields = [Reading._meta.get_field(name) for name in ('temperature', 'humidity')]
+    params = []
+    for reading in readings:
+        params.append(reading.sensor_id)
+        params.append(connection.ops.adapt_datetimefield_value(reading.timestamp))
+        params.extend(field.get_db_prep_save(getattr(reading, field.attname), connection) for field in fields)
+    return params
+
+
+def _insert(readings):
+    """Insert ``readings``, skipping the ones that exist; returns the inserted rows"""
+    table = connection.ops.quote_name(Reading._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(readings))
+    return list(Reading.objects.raw(
+        f'INSERT INTO {table} (sensor_id, "timestamp", temperature, humidity) VALUES {values} '
+        f'ON CONFLICT (sensor_id, "timestamp") DO NOTHING '
+        f'RETURNING id, sensor_id, "timestamp", temperature, humidity',
+        _params(readings)
+    ))
+
+
+def _update(readings):
+    """Write the values of ``readings`` over the stored rows that differ; returns the rows that were written"""
+    table = connection.ops.quote_name(Reading._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(readings))
+    db_type = Reading._meta.get_field('temperature').db_type(connection)
+    temperature = f'CAST(incoming.temperature AS {db_type})'
+    humidity = f'CAST(incoming.humidity AS {db_type})'
+    return list(Reading.objects.raw(
+        f'WITH incoming (sensor_id, "timestamp", temperature, humidity) AS (VALUES {values}) '
+        f'UPDATE {table} SET temperature = {temperature}, humidity = {humidity} FROM incoming '
+        f'WHERE {table}.sensor_id = incoming.sensor_id AND {table}."timestamp" = incoming."timestamp" '
+        f'AND ({table}.temperature <> {temperature} OR {table}.humidity <> {humidity}) '
+        f'RETURNING {table}.id, {table}.sensor_id, {table}."timestamp", {table}.temperature, {table}.humidity',
+        _params(readings)
+    ))
+
+
+def _upsert(readings, policy):
+    """Store deduplicated ``readings`` under ``policy``; returns (created, updated) rows"""
+    created = []
+    updated = []
+    # Readings of archived days are no longer rows; match them against their chunks
+    archived = archived_copies(readings)
+    if archived:
+        if policy != 'ignore':
+            updated.extend(rewrite_archived(
+                [reading for reading in readings if (reading.sensor_id, reading.timestamp) in archived]
+            ))
+        readings = [reading for reading in readings if (reading.sensor_id, reading.timestamp) not in archived]
+    for start in range(0, len(readings), BULK_BATCH_SIZE):
+        batch = readings[start:start + BULK_BATCH_SIZE]
+        inserted = _insert(batch)
+        created.extend(inserted)
+        if policy == 'ignore' or len(inserted) == len(batch):
+            continue
+        keys = {(reading.sensor_id, reading.timestamp) for reading in inserted}
+        existing = [reading for reading in batch if (reading.sensor_id, reading.timestamp) not in keys]
+        updated.extend(_update(existing))
+    return created, updated
+
+
+def _after_write(created, updated, owners=None):
+    """Stats, alerts, live updates, rollups and caches for the rows a write changed"""
+    record_readings(created)
+    record_readings(updated, inserted=False)
+    # Alerts fire once per reading, when it first arrives
+    evaluate_readings(created)
+    publish_readings(created + updated)
+    refresh_rollups(updated)
+    if not (created or updated):
+        return
+    if owners is None:
+        owners = dict(
+            Sensor.objects.filter(id__in={reading.sensor_id for reading in created + updated})
+            .values_list('id', 'owner_id')
+        )
+    invalidate_readings(owners)
+
+
+def store_reading(sensor, data, policy=None):
+    """
+    Store a single reading and fold it into the sensor's stats.
+
+    Returns ``(reading, created)``. A retry of a reading that is already stored
+    isn't an error: it returns the stored row, rewritten first if ``policy``
+    says so, with ``created`` False. Raises ValidationError for values the
+    column can't hold.
+    """
+    temperature, humidity = _clean_values(data.temperature, data.humidity)
+    reading = Reading(
+        sensor_id=sensor.id,
+        temperature=temperature,
+        humidity=humidity,
+        timestamp=_normalize_timestamp(data.timestamp)
+    )
+    with transaction.atomic():
+        created, updated = _upsert([reading], _policy(policy))
+        _after_write(created, updated, owners={sensor.id: sensor.owner_id})
+    if created:
+        return created[0], True
+    if updated:
+        return updated[0], False
+    stored = Reading.objects.filter(sensor_id=sensor.id, timestamp=reading.timestamp).first()
+    if stored is None:
+        stored = archived_copies([reading])[(sensor.id, reading.timestamp)]
+    return stored, False
+
+
+def ingest_readings(rows, allowed_sensor_ids, policy=None):
+    """
+    Validate and store a batch of readings in one pass.
+
+    ``rows`` is a sequence of ``(sensor_id, ReadingIn)`` pairs. Rows that can't be
+    stored are reported back with their index instead of failing the whole batch;
+    readings that are already stored (or repeated within the batch) are handled
+    by the conflict ``policy`` and counted, not reported.
+    """
+    policy = _policy(policy)
+    conflicts = []
+    candidates = {}
+    duplicates = 0
+
+    for index, (sensor_id, data) in enumerate(rows):
+        timestamp = _normalize_timestamp(data.timestamp)
+        if sensor_id not in allowed_sensor_ids:
+            conflicts.append(_conflict(index, sensor_id, timestamp, "Sensor not found"))
+            continue
+        try:
+            temperature, humidity = _clean_values(data.temperature, data.humidity)
+        except ValidationError as e:
+            conflicts.append(_conflict(index, sensor_id, timestamp, "; ".join(e.messages)))
+            continue
+        key = (sensor_id, timestamp)
+        if key in candidates:
+            duplicates += 1
+            if policy == 'ignore':
+                continue
+        candidates[key] = Reading(
+            sensor_id=sensor_id,
+            temperature=temperature,
+            humidity=humidity,
+            timestamp=timestamp
+        )
+
+    readings = list(candidates.values())
+    with transaction.atomic():
+        created, updated = _upsert(readings, policy)
+        _after_write(created, updated)
+
+    return {
+        "created": len(created),
+        "updated": len(updated),
+        "duplicates": duplicates + len(readings) - len(created) - len(updated),
+        "conflicts": conflicts
+    }
+
+
+def _conflict(index, sensor_id, timestamp, detail):
+    return {
+        "index": index,
+        "sensor_id": sensor_id,
+        "timestamp": timestamp,
+        "detail": detail
+    }
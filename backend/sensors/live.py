@@ -0,0 +1,213 @@
+"""
+Live push of newly ingested readings to Server-Sent Events subscribers.
+
+Ingestion calls ``publish_readings`` inside its transaction. On PostgreSQL the
+updates are sent with ``pg_notify``, so they are delivered on commit to every
+worker listening on ``LIVE_CHANNEL`` (including the one that ingested them);
+elsewhere they go straight to this process's broker after commit.
+
+Each subscription keeps only the latest pending reading per sensor plus how
+many readings it stands for. A client that reads slowly therefore gets fewer,
+coalesced events instead of an ever-growing backlog, and the ASGI server's
+flow control on ``send`` is the only buffer between the stream and the socket.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+LIVE_CHANNEL = 'sensor_readings'
+
+# pg_notify payloads must stay below 8000 bytes
+NOTIFY_BATCH_SIZE = 50
+
+LISTENER_RECONNECT_SECONDS = 5
+
+# How long EventSource clients wait before reconnecting
+RETRY_MILLISECONDS = 3000
+
+
+def reading_updates(readings):
+    """Coalesce readings into one update per sensor: its latest reading and the count"""
+    updates = {}
+    for reading in readings:
+        update = updates.get(reading.sensor_id)
+        if update is not None:
+            update['count'] += 1
+            if reading.timestamp < update['timestamp']:
+                continue
+        else:
+            update = updates[reading.sensor_id] = {'sensor_id': reading.sensor_id, 'count': 1}
+        update.update(
+            timestamp=reading.timestamp,
+            temperature=float(reading.temperature),
+            humidity=float(reading.humidity),
+        )
+    for update in updates.values():
+        update['timestamp'] = update['timestamp'].astimezone(dt_timezone.utc).isoformat()
+    return list(updates.values())
+
+
+class Subscription:
+    """Pending updates of one connection, coalesced per sensor"""
+
+    def __init__(self, broker, sensor_ids, loop):
+        self.broker = broker
+        self.sensor_ids = frozenset(sensor_ids)
+        self.loop = loop
+        self.pending = {}
+        self.event = asyncio.Event()
+        self.last_sent = 0.0
+
+    def push(self, update):
+        """Merge ``update`` into the pending batch; runs on the subscription's loop"""
+        current = self.pending.get(update['sensor_id'])
+        if current is not None:
+            update = dict(update, count=current['count'] + update['count'])
+            if update['timestamp'] < current['timestamp']:
+                update.update({key: current[key] for key in ('timestamp', 'temperature', 'humidity')})
+        self.pending[update['sensor_id']] = update
+        self.event.set()
+
+    async def next_batch(self, timeout):
+        """The pending updates, or None if nothing arrived within ``timeout`` seconds"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        # Let a burst settle so it goes out as one event
+        delay = self.last_sent + settings.LIVE_READINGS_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.event.clear()
+        batch, self.pending = list(self.pending.values()), {}
+        self.last_sent = time.monotonic()
+        return batch
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """In-process fan-out of reading updates to the subscriptions of each sensor"""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def subscribe(self, sensor_ids):
+        """Subscribe the running event loop to updates of ``sensor_ids``"""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, sensor_ids, loop)
+        with self._lock:
+            for sensor_id in subscription.sensor_ids:
+                self._subscriptions[sensor_id].add(subscription)
+        if connection.vendor == 'postgresql':
+            self._ensure_listener(loop)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for sensor_id in subscription.sensor_ids:
+                subscribers = self._subscriptions.get(sensor_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[sensor_id]
+
+    def publish(self, updates):
+        """Hand ``updates`` to their subscribers; safe to call from any thread"""
+        with self._lock:
+            deliveries = [
+                (subscription, update)
+                for update in updates
+                for subscription in self._subscriptions.get(update['sensor_id'], ())
+            ]
+        for subscription, update in deliveries:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, update)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+
+    def _ensure_listener(self, loop):
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        """Forward NOTIFYs from every worker to local subscribers, reconnecting on errors"""
+        import psycopg
+        from psycopg.conninfo import make_conninfo
+
+        database = settings.DATABASES['default']
+        conninfo = make_conninfo(
+            dbname=database['NAME'],
+            user=database['USER'],
+            password=database['PASSWORD'],
+            host=database['HOST'],
+            port=database['PORT'],
+        )
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {LIVE_CHANNEL}')
+                    async for notify in conn.notifies():
+                        self.publish(json.loads(notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live readings listener failed, reconnecting")
+                await asyncio.sleep(LISTENER_RECONNECT_SECONDS)
+
+
+broker = Broker()
+
+
+def publish_readings(readings):
+    """Announce newly inserted readings once the surrounding transaction commits"""
+    if not settings.LIVE_READINGS or not readings:
+        return
+    updates = reading_updates(readings)
+    if connection.vendor != 'postgresql':
+        transaction.on_commit(lambda: broker.publish(updates))
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(updates), NOTIFY_BATCH_SIZE):
+            payload = json.dumps(updates[start:start + NOTIFY_BATCH_SIZE], cls=DjangoJSONEncoder)
+            cursor.execute("SELECT pg_notify(%s, %s)", [LIVE_CHANNEL, payload])
+
+
+async def event_stream(subscription):
+    """SSE frames for ``subscription``, with a comment line as keep-alive"""
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        while True:
+            batch = await subscription.next_batch(settings.LIVE_READINGS_KEEPALIVE)
+            if batch is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: readings\ndata: {json.dumps(batch)}\n\n"
+    finally:
+        subscription.close()
+
+
+def live_response(sensor_ids):
+    response = StreamingHttpResponse(
+        event_stream(broker.subscribe(sensor_ids)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from sensors.archive import archive_readings
+
+
+class Command(BaseCommand):
+    help = "Pack readings older than the archive age into compressed per-sensor daily chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help="Archive age in days (defaults to READING_ARCHIVE_AFTER_DAYS)")
+
+    def handle(self, *args, **options):
+        days = options['older_than_days'] or settings.READING_ARCHIVE_AFTER_DAYS
+        if not days:
+            raise CommandError("No archive age configured; pass --older-than-days or set READING_ARCHIVE_AFTER_DAYS")
+
+        chunks, archived = archive_readings(timezone.now() - timedelta(days=days))
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} readings into {chunks} daily chunks"))
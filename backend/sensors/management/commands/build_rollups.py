@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from sensors.rollups import apply_retention, build_rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new readings into the 1m/1h/1d rollup tiers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help="New readings processed per pass")
+        parser.add_argument('--apply-retention', action='store_true',
+                            help="Delete rollup rows older than their tier's retention")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running as a background worker")
+        parser.add_argument('--interval', type=float, default=60,
+                            help="Seconds to sleep between passes with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            while True:
+                batch = build_rollups(options['batch_size'])
+                processed += batch
+                if batch < options['batch_size']:
+                    break
+            self.stdout.write(f"Rolled up {processed} new readings")
+
+            if options['apply_retention']:
+                for tier, deleted in apply_retention().items():
+                    self.stdout.write(f"Deleted {deleted} expired {tier} rollups")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
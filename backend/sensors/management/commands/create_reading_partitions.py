@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from sensors.partitions import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = "Create monthly readings partitions ahead of time (PostgreSQL only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help="How many future months to create (defaults to READING_PARTITION_MONTHS_AHEAD)")
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write("Readings table is not partitioned, nothing to do")
+            return
+        created = ensure_partitions(options['months_ahead'])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created"))
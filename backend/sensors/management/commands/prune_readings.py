@@ -0,0 +1,47 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from sensors.models import Reading, ReadingChunk
+from sensors.partitions import delete_default_rows_before, drop_partitions_before, is_partitioned
+from sensors.stats import rebuild_sensor_stats
+
+
+class Command(BaseCommand):
+    help = "Delete readings older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help="Retention in days (defaults to READING_RETENTION_DAYS)")
+
+    def handle(self, *args, **options):
+        days = options['older_than_days'] or settings.READING_RETENTION_DAYS
+        if not days:
+            raise CommandError("No retention configured; pass --older-than-days or set READING_RETENTION_DAYS")
+        cutoff = timezone.now() - timedelta(days=days)
+
+        if is_partitioned():
+            # Whole months are dropped; the month containing the cutoff is kept until it fully expires
+            dropped, sensor_ids = drop_partitions_before(cutoff)
+            for name in dropped:
+                self.stdout.write(f"Dropped {name}")
+            # Months without a partition of their own sit in the default partition
+            deleted, default_sensor_ids = delete_default_rows_before(cutoff)
+            sensor_ids |= default_sensor_ids
+            summary = f"{len(dropped)} partitions dropped, {deleted} readings deleted"
+        else:
+            expired = Reading.objects.filter(timestamp__lt=cutoff)
+            sensor_ids = set(expired.values_list('sensor_id', flat=True).distinct())
+            deleted, _ = expired.delete()
+            summary = f"{deleted} readings deleted"
+
+        # Archived days that ended before the cutoff
+        expired_chunks = ReadingChunk.objects.filter(day__lt=cutoff.date())
+        sensor_ids = set(sensor_ids) | set(expired_chunks.values_list('sensor_id', flat=True).distinct())
+        chunks, _ = expired_chunks.delete()
+        if chunks:
+            summary += f", {chunks} archived days deleted"
+
+        if sensor_ids:
+            rebuild_sensor_stats(sensor_ids)
+        self.stdout.write(self.style.SUCCESS(summary))
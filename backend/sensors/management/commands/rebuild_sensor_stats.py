@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from sensors.stats import rebuild_sensor_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-sensor reading statistics from the readings table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', type=int, action='append', dest='sensor_ids',
+                            help="Only rebuild this sensor id (can be repeated)")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_sensor_stats(options['sensor_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} sensors"))
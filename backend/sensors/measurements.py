@@ -0,0 +1,158 @@
+"""
+Arbitrary metric channels per sensor, stored one value per row.
+
+``Reading`` keeps its fixed temperature/humidity columns. Everything else a
+device reports (CO2, pressure, battery, ...) goes into ``Measurement``:
+``(sensor, metric, timestamp, value)`` where the metric name is
+dictionary-encoded through the small ``Metric`` table. Unknown metric names are
+added on first ingestion, so a new channel needs no migration and sensors that
+don't report it store nothing for it. Metric names belong to the sensor's owner,
+who may have at most MAX_METRICS_PER_OWNER of them and add MAX_NEW_METRICS per
+request, so no user can use up the metrics of others.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F, Max, Min
+from django.utils import timezone
+from .aggregates import BUCKET_SECONDS, TimeBucket
+from .models import Measurement, Metric
+
+BULK_BATCH_SIZE = 1000
+
+# New metric names one request may add, and the most metrics one user may have
+MAX_NEW_METRICS = 20
+MAX_METRICS_PER_OWNER = 200
+
+
+def metric_ids(owner_id, names):
+    """
+    {name: id} for ``names`` of ``owner_id``'s metrics, adding the ones that don't exist yet.
+
+    Raises ValidationError when that would add more than MAX_NEW_METRICS names,
+    or give the owner more than MAX_METRICS_PER_OWNER metrics.
+    """
+    # All of the owner's metrics: never more than the cap, and their count comes with them
+    owned = dict(Metric.objects.filter(owner_id=owner_id).values_list('name', 'id'))
+    names = set(names)
+    missing = names - owned.keys()
+    if len(missing) > MAX_NEW_METRICS:
+        raise ValidationError(f"At most {MAX_NEW_METRICS} new metrics per request")
+    if len(owned) + len(missing) > MAX_METRICS_PER_OWNER:
+        raise ValidationError(f"At most {MAX_METRICS_PER_OWNER} metrics per user")
+    if missing:
+        # ignore_conflicts lets concurrent requests add the same new metric
+        Metric.objects.bulk_create(
+            [Metric(owner_id=owner_id, name=name) for name in sorted(missing)], ignore_conflicts=True
+        )
+        owned.update(Metric.objects.filter(owner_id=owner_id, name__in=missing).values_list('name', 'id'))
+    return {name: owned[name] for name in names}
+
+
+def ingest_measurements(sensor, rows):
+    """
+    Insert the metric values of ``rows`` for one sensor.
+
+    ``rows`` is a sequence of MeasurementIn, each a timestamp with a
+    ``{metric: value}`` dict. Values that already exist for their metric and
+    timestamp are reported back instead of failing the whole batch. Raises
+    ValidationError if the rows name too many new metrics (see metric_ids).
+    """
+    sensor_id = sensor.id
+    ids = metric_ids(sensor.owner_id, (name for row in rows for name in row.values))
+    conflicts = []
+    candidates = []
+    seen = set()
+
+    for index, row in enumerate(rows):
+        timestamp = row.timestamp
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+        for name, value in row.values.items():
+            key = (ids[name], timestamp)
+            if key in seen:
+                conflicts.append(_conflict(index, name, timestamp, "Duplicate timestamp in batch"))
+                continue
+            seen.add(key)
+            candidates.append((index, name, Measurement(
+                sensor_id=sensor_id,
+                metric_id=ids[name],
+                timestamp=timestamp,
+                value=value
+            )))
+
+    inserted = set()
+    with transaction.atomic():
+        for start in range(0, len(candidates), BULK_BATCH_SIZE):
+            batch = [measurement for _, _, measurement in candidates[start:start + BULK_BATCH_SIZE]]
+            inserted.update((row.metric_id, row.timestamp) for row in _insert(batch))
+
+    for index, name, measurement in candidates:
+        if (measurement.metric_id, measurement.timestamp) not in inserted:
+            conflicts.append(_conflict(
+                index, name, measurement.timestamp, "Measurement already exists for this timestamp"
+            ))
+
+    conflicts.sort(key=lambda conflict: conflict['index'])
+    return {"created": len(inserted), "conflicts": conflicts}
+
+
+def _insert(measurements):
+    """Insert ``measurements``, skipping the ones that exist; returns the inserted rows"""
+    table = connection.ops.quote_name(Measurement._meta.db_table)
+    value = Measurement._meta.get_field('value')
+    params = []
+    for measurement in measurements:
+        params.extend([
+            measurement.sensor_id,
+            measurement.metric_id,
+            connection.ops.adapt_datetimefield_value(measurement.timestamp),
+            value.get_db_prep_save(measurement.value, connection),
+        ])
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(measurements))
+    return list(Measurement.objects.raw(
+        f'INSERT INTO {table} (sensor_id, metric_id, "timestamp", value) VALUES {values} '
+        f'ON CONFLICT (sensor_id, metric_id, "timestamp") DO NOTHING '
+        f'RETURNING id, metric_id, "timestamp"',
+        params
+    ))
+
+
+def _conflict(index, metric, timestamp, detail):
+    return {
+        "index": index,
+        "metric": metric,
+        "timestamp": timestamp,
+        "detail": detail
+    }
+
+
+def filter_measurements(queryset, query):
+    """Apply the metrics filter and timestamp range of a MeasurementListQuery"""
+    if query.metrics:
+        queryset = queryset.filter(metric__name__in=query.metrics)
+    if query.timestamp_from:
+        queryset = queryset.filter(timestamp__gte=query.timestamp_from)
+    if query.timestamp_to:
+        queryset = queryset.filter(timestamp__lte=query.timestamp_to)
+    return queryset
+
+
+def list_measurements(sensor_id, query):
+    """A sensor's measurements newest first, with the metric name instead of its id"""
+    return (
+        filter_measurements(Measurement.objects.filter(sensor_id=sensor_id), query)
+        .values('timestamp', 'value', metric_name=F('metric__name'))
+        .order_by('-timestamp', 'metric_id')
+    )
+
+
+def aggregate_measurements(sensor_id, query):
+    """Min/max/avg/count per metric and time bucket, computed in the database"""
+    return list(
+        filter_measurements(Measurement.objects.filter(sensor_id=sensor_id), query)
+        .order_by()
+        .annotate(bucket=TimeBucket('timestamp', BUCKET_SECONDS[query.bucket]))
+        .values('bucket', metric_name=F('metric__name'))
+        .annotate(count=Count('id'), min=Min('value'), max=Max('value'), avg=Avg('value'))
+        .order_by('metric_name', 'bucket')
+    )
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.2 on 2026-10-17 23:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def populate_sensor_stats(apps, schema_editor):
+    Sensor = apps.get_model('sensors', 'Sensor')
+    Reading = apps.get_model('sensors', 'Reading')
+    SensorStats = apps.get_model('sensors', 'SensorStats')
+
+    for sensor_id in Sensor.objects.values_list('id', flat=True).iterator():
+        readings = Reading.objects.filter(sensor_id=sensor_id)
+        totals = readings.order_by().aggregate(
+            readings_count=Count('id'),
+            first_reading_timestamp=Min('timestamp'),
+            last_reading_timestamp=Max('timestamp'),
+            min_temperature=Min('temperature'),
+            max_temperature=Max('temperature'),
+            min_humidity=Min('humidity'),
+            max_humidity=Max('humidity'),
+        )
+        latest = readings.order_by('-timestamp').values('temperature', 'humidity').first() or {}
+        SensorStats.objects.create(
+            sensor_id=sensor_id,
+            last_temperature=latest.get('temperature'),
+            last_humidity=latest.get('humidity'),
+            **totals
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0002_alter_reading_options_alter_reading_humidity_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorStats',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='sensors.sensor')),
+                ('readings_count', models.BigIntegerField(default=0)),
+                ('first_reading_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_reading_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_temperature', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('last_humidity', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('min_temperature', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('max_temperature', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('min_humidity', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('max_humidity', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['readings_count'], name='sensors_sen_reading_a7a6ed_idx'), models.Index(fields=['last_reading_timestamp'], name='sensors_sen_last_re_9b1af7_idx')],
+            },
+        ),
+        migrations.RunPython(populate_sensor_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations
+
+
+def _add_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_reading_table(apps, schema_editor):
+    """
+    Rebuild sensors_reading as a table range-partitioned by month on timestamp.
+
+    PostgreSQL requires the partition key in every unique constraint, so the
+    primary key becomes (id, timestamp); ids still come from a single sequence.
+    Other databases keep the plain table.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'sensors_reading' AND pg_table_is_visible(c.oid)"
+        )
+        if cursor.fetchone():
+            return
+
+        cursor.execute('ALTER TABLE sensors_reading RENAME TO sensors_reading_unpartitioned')
+        cursor.execute('ALTER TABLE sensors_reading_unpartitioned ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute('ALTER TABLE sensors_reading_unpartitioned ALTER COLUMN id DROP DEFAULT')
+        cursor.execute('ALTER SEQUENCE IF EXISTS sensors_reading_id_seq RENAME TO sensors_reading_unpartitioned_id_seq')
+        cursor.execute('CREATE SEQUENCE sensors_reading_id_seq AS integer')
+        cursor.execute("""
+            CREATE TABLE sensors_reading (
+                id integer NOT NULL DEFAULT nextval('sensors_reading_id_seq'),
+                temperature numeric(5, 2) NOT NULL,
+                humidity numeric(5, 2) NOT NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                sensor_id integer NOT NULL
+            ) PARTITION BY RANGE ("timestamp")
+        """)
+        cursor.execute('ALTER SEQUENCE sensors_reading_id_seq OWNED BY sensors_reading.id')
+        cursor.execute('CREATE TABLE sensors_reading_default PARTITION OF sensors_reading DEFAULT')
+
+        cursor.execute('SELECT min("timestamp"), max("timestamp") FROM sensors_reading_unpartitioned')
+        first, last = cursor.fetchone()
+        today = date.today()
+        oldest = first.date() if first else today
+        newest = max(last.date(), today) if last else today
+        month = date(oldest.year, oldest.month, 1)
+        end = date(newest.year, newest.month, 1)
+        for _ in range(settings.READING_PARTITION_MONTHS_AHEAD):
+            end = _add_month(end)
+        while month <= end:
+            cursor.execute(
+                f"CREATE TABLE sensors_reading_p{month:%Y_%m} PARTITION OF sensors_reading "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{_add_month(month).isoformat()} 00:00:00+00')"
+            )
+            month = _add_month(month)
+
+        cursor.execute("""
+            INSERT INTO sensors_reading (id, temperature, humidity, "timestamp", sensor_id)
+            SELECT id, temperature, humidity, "timestamp", sensor_id FROM sensors_reading_unpartitioned
+        """)
+        cursor.execute("SELECT setval('sensors_reading_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM sensors_reading")
+        cursor.execute('DROP TABLE sensors_reading_unpartitioned')
+
+        cursor.execute('ALTER TABLE sensors_reading ADD CONSTRAINT sensors_reading_pkey PRIMARY KEY (id, "timestamp")')
+        cursor.execute(
+            'ALTER TABLE sensors_reading ADD CONSTRAINT sensors_reading_sensor_id_timestamp_uniq '
+            'UNIQUE (sensor_id, "timestamp")'
+        )
+        cursor.execute('CREATE INDEX sensors_rea_sensor__eb947e_idx ON sensors_reading (sensor_id, "timestamp")')
+        cursor.execute(
+            'ALTER TABLE sensors_reading ADD CONSTRAINT sensors_reading_sensor_id_fk_sensors_sensor_id '
+            'FOREIGN KEY (sensor_id) REFERENCES sensors_sensor (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0003_sensorstats'),
+    ]
+
+    operations = [
+        # Reversing leaves the partitioned table in place; the ORM works with either layout.
+        migrations.RunPython(partition_reading_table, migrations.RunPython.noop),
+    ]
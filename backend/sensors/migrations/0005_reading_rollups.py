@@ -0,0 +1,82 @@
+# Generated by Django 5.1.2 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0004_partition_reading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_reading_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('temperature_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('temperature_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('temperature_sum', models.FloatField()),
+                ('humidity_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('humidity_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('humidity_sum', models.FloatField()),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sensors.sensor')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'abstract': False,
+                'unique_together': {('sensor', 'bucket')},
+            },
+        ),
+        migrations.CreateModel(
+            name='HourRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('temperature_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('temperature_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('temperature_sum', models.FloatField()),
+                ('humidity_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('humidity_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('humidity_sum', models.FloatField()),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sensors.sensor')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'abstract': False,
+                'unique_together': {('sensor', 'bucket')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MinuteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('temperature_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('temperature_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('temperature_sum', models.FloatField()),
+                ('humidity_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('humidity_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('humidity_sum', models.FloatField()),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sensors.sensor')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'abstract': False,
+                'unique_together': {('sensor', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-17 23:55
+
+import sensors.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0005_reading_rollups'),
+    ]
+
+    # On PostgreSQL this rewrites the readings table with numeric values cast to real
+    # (USING ...::real). Reversing casts back to numeric(5, 2) without loss, since the
+    # values were rounded to two decimals on the way in.
+    operations = [
+        migrations.AlterField(
+            model_name='reading',
+            name='humidity',
+            field=sensors.fields.RealField(decimal_places=2, help_text='Humidity percentage', max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='reading',
+            name='temperature',
+            field=sensors.fields.RealField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5),
+        ),
+    ]
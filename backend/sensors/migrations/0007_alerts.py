@@ -0,0 +1,55 @@
+# Generated by Django 5.1.2 on 2026-10-17 23:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0006_reading_real_values'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('threshold', 'Threshold'), ('rate_of_change', 'Rate of change'), ('zscore', 'Rolling z-score')], max_length=20)),
+                ('metric', models.CharField(choices=[('temperature', 'Temperature'), ('humidity', 'Humidity')], max_length=20)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('max_rate', models.FloatField(blank=True, help_text='Largest allowed change per minute', null=True)),
+                ('window', models.PositiveIntegerField(default=20, help_text='Readings in the z-score window')),
+                ('z_threshold', models.FloatField(default=3.0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_value', models.FloatField(blank=True, null=True)),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('window_values', models.JSONField(default=list)),
+                ('window_position', models.PositiveIntegerField(default=0)),
+                ('window_sum', models.FloatField(default=0)),
+                ('window_sum_squares', models.FloatField(default=0)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='sensors.sensor')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('value', models.FloatField()),
+                ('detail', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_events', to='sensors.sensor')),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='sensors.alertrule')),
+            ],
+            options={
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['sensor', 'timestamp'], name='sensors_ale_sensor__65abe2_idx')],
+            },
+        ),
+    ]
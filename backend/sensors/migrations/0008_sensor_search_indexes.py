@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Django's icontains compares UPPER(column::text) on PostgreSQL, so the
+# indexes are built on that expression for LIKE '%...%' to use them
+SEARCH_COLUMNS = ('name', 'model', 'description')
+
+
+def create_search_indexes(apps, schema_editor):
+    """Trigram GIN indexes for the sensor search; other databases do without"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in SEARCH_COLUMNS:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS sensors_sensor_{column}_trgm '
+                f'ON sensors_sensor USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for column in SEARCH_COLUMNS:
+            cursor.execute(f'DROP INDEX IF EXISTS sensors_sensor_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0007_alerts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
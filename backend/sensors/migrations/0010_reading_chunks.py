@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0009_measurements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+                ('humidity_min', models.FloatField()),
+                ('humidity_max', models.FloatField()),
+                ('data', models.BinaryField()),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sensors.sensor')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('sensor', 'day')},
+            },
+        ),
+    ]
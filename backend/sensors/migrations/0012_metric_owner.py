@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0011_ingest_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Metric names become per user, so one user can't use up the ids everyone shares.
+    # 0013 gives every user whose sensors measured a metric their own copy of it, and
+    # 0014 then requires the owner; each runs in its own transaction on PostgreSQL.
+    operations = [
+        migrations.AlterField(
+            model_name='metric',
+            name='id',
+            field=models.AutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='metric',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddField(
+            model_name='metric',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='measurement',
+            name='metric',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='sensors.metric'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:37
+
+from django.db import migrations
+from django.db.models import Min
+
+
+def split_metrics_by_owner(apps, schema_editor):
+    Metric = apps.get_model('sensors', 'Metric')
+    Measurement = apps.get_model('sensors', 'Measurement')
+
+    names = dict(Metric.objects.values_list('id', 'name'))
+    used = list(
+        Measurement.objects.order_by()
+        .values_list('sensor__owner_id', 'metric_id')
+        .distinct()
+    )
+    for owner_id, metric_id in used:
+        metric = Metric.objects.create(owner_id=owner_id, name=names[metric_id])
+        Measurement.objects.filter(sensor__owner_id=owner_id, metric_id=metric_id).update(metric_id=metric.id)
+    # The shared metrics are now unused, and metrics nobody measured have no owner to go to
+    Metric.objects.filter(owner__isnull=True).delete()
+
+
+def merge_metrics_by_name(apps, schema_editor):
+    Metric = apps.get_model('sensors', 'Metric')
+    Measurement = apps.get_model('sensors', 'Measurement')
+
+    for name, kept in Metric.objects.values('name').annotate(kept=Min('id')).values_list('name', 'kept'):
+        copies = Metric.objects.filter(name=name).exclude(id=kept)
+        # Different owners never share a sensor, so the measurements can't collide
+        Measurement.objects.filter(metric__in=copies).update(metric_id=kept)
+        copies.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0012_metric_owner'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_metrics_by_owner, merge_metrics_by_name),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0014_metric_owner_required'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # The sensor list filters by owner before it sorts, which single-column indexes
+    # on the stats can't serve. 0016 copies each sensor's owner onto its stats and
+    # 0017 indexes (owner, readings_count) and (owner, last_reading_timestamp).
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sensorstats',
+            name='sensors_sen_reading_a7a6ed_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='sensorstats',
+            name='sensors_sen_last_re_9b1af7_idx',
+        ),
+        migrations.AddField(
+            model_name='sensorstats',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
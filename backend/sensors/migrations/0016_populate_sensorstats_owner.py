@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:41
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def copy_sensor_owners(apps, schema_editor):
+    Sensor = apps.get_model('sensors', 'Sensor')
+    SensorStats = apps.get_model('sensors', 'SensorStats')
+
+    SensorStats.objects.update(
+        owner_id=Subquery(Sensor.objects.filter(id=OuterRef('sensor_id')).values('owner_id'))
+    )
+    # The sensor list now joins stats rows; `rebuild_sensor_stats` fills in any created here
+    SensorStats.objects.bulk_create([
+        SensorStats(sensor_id=sensor_id, owner_id=owner_id)
+        for sensor_id, owner_id in Sensor.objects.filter(stats__isnull=True).values_list('id', 'owner_id')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0015_sensorstats_owner'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_sensor_owners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0016_populate_sensorstats_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sensorstats',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='sensorstats',
+            index=models.Index(fields=['owner', 'readings_count'], name='sensors_sen_owner_i_23bfe4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorstats',
+            index=models.Index(fields=['owner', 'last_reading_timestamp'], name='sensors_sen_owner_i_409781_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .fields import RealField
 
 class Sensor(models.Model):
     id = models.AutoField(primary_key=True)
@@ -12,11 +13,29 @@ class Sensor(models.Model):
     def __str__(self):
         return f"{self.name} ({self.model})"
 
+class IngestKey(models.Model):
+    """
+    A device credential that may write readings for one sensor (see sensors.auth).
+
+    Only the SHA-256 of the key is stored; ``prefix`` tells keys apart in listings.
+    Revoked keys are kept so the listing shows when they stopped working.
+    """
+    id = models.AutoField(primary_key=True)
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='ingest_keys')
+    name = models.CharField(max_length=100, blank=True)
+    prefix = models.CharField(max_length=12)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    revoked_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.sensor_id} - {self.prefix}..."
+
 class Reading(models.Model):
     id = models.AutoField(primary_key=True)
     sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='readings')
-    temperature = models.DecimalField(max_digits=5, decimal_places=2, help_text="Temperature in Celsius")
-    humidity = models.DecimalField(max_digits=5, decimal_places=2, help_text="Humidity percentage")
+    temperature = RealField(max_digits=5, decimal_places=2, help_text="Temperature in Celsius")
+    humidity = RealField(max_digits=5, decimal_places=2, help_text="Humidity percentage")
     timestamp = models.DateTimeField()
     
     class Meta:
@@ -27,4 +46,184 @@ class Reading(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.sensor.name} - {self.timestamp}"
\ No newline at end of file
+        return f"{self.sensor.name} - {self.timestamp}"
+
+class Metric(models.Model):
+    """A user's measurement channel such as ``co2`` or ``pressure``, stored once and referenced by its id"""
+    id = models.AutoField(primary_key=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=50)
+    
+    class Meta:
+        unique_together = ['owner', 'name']
+    
+    def __str__(self):
+        return self.name
+
+class Measurement(models.Model):
+    """
+    One value of one metric of a sensor (see sensors.measurements).
+
+    The narrow layout takes new metrics without a migration, and a sensor that
+    reports one channel stores one value per timestamp, not a whole wide row.
+    """
+    id = models.BigAutoField(primary_key=True)
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='measurements')
+    # RESTRICT still lets a user's deletion cascade to both their measurements and metrics
+    metric = models.ForeignKey(Metric, on_delete=models.RESTRICT, related_name='+')
+    timestamp = models.DateTimeField()
+    value = models.FloatField()
+    
+    class Meta:
+        ordering = ['-timestamp']
+        # The unique index on (sensor, metric, timestamp) also serves range queries
+        unique_together = ['sensor', 'metric', 'timestamp']
+    
+    def __str__(self):
+        return f"{self.sensor_id} - {self.metric_id} @ {self.timestamp}"
+
+class ReadingChunk(models.Model):
+    """A sensor's archived readings of one UTC day, packed and compressed (see sensors.archive)"""
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    count = models.IntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    humidity_min = models.FloatField()
+    humidity_max = models.FloatField()
+    data = models.BinaryField()
+    
+    class Meta:
+        ordering = ['-day']
+        unique_together = ['sensor', 'day']
+    
+    def __str__(self):
+        return f"{self.sensor_id} - {self.day} ({self.count} readings)"
+
+class SensorStats(models.Model):
+    """Per-sensor reading summary kept up to date on ingestion (see sensors.stats)"""
+    sensor = models.OneToOneField(Sensor, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    # The sensor's owner, so a user's sensors can be read in stats order from one index
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    readings_count = models.BigIntegerField(default=0)
+    first_reading_timestamp = models.DateTimeField(blank=True, null=True)
+    last_reading_timestamp = models.DateTimeField(blank=True, null=True)
+    last_temperature = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    last_humidity = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    min_temperature = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    max_temperature = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    min_humidity = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    max_humidity = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'readings_count']),
+            models.Index(fields=['owner', 'last_reading_timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sensor_id} - {self.readings_count} readings"
+
+class ReadingRollup(models.Model):
+    """Pre-aggregated readings for one sensor over one fixed-width time bucket"""
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='+')
+    bucket = models.DateTimeField()
+    count = models.IntegerField()
+    temperature_min = models.DecimalField(max_digits=5, decimal_places=2)
+    temperature_max = models.DecimalField(max_digits=5, decimal_places=2)
+    temperature_sum = models.FloatField()
+    humidity_min = models.DecimalField(max_digits=5, decimal_places=2)
+    humidity_max = models.DecimalField(max_digits=5, decimal_places=2)
+    humidity_sum = models.FloatField()
+    
+    class Meta:
+        abstract = True
+        ordering = ['bucket']
+        unique_together = ['sensor', 'bucket']
+    
+    def __str__(self):
+        return f"{self.sensor_id} - {self.bucket}"
+
+class MinuteRollup(ReadingRollup):
+    pass
+
+class HourRollup(ReadingRollup):
+    pass
+
+class DayRollup(ReadingRollup):
+    pass
+
+class RollupWatermark(models.Model):
+    """Highest reading id already folded into the rollup tiers"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_reading_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_reading_id}"
+
+class AlertRule(models.Model):
+    """
+    A per-sensor condition checked against every new reading (see sensors.alerts).
+
+    The rolling fields hold just enough state to evaluate the next reading in
+    O(1): the previous value for rate-of-change, and a ring buffer with running
+    sums for the z-score window.
+    """
+    THRESHOLD = 'threshold'
+    RATE_OF_CHANGE = 'rate_of_change'
+    ZSCORE = 'zscore'
+    KIND_CHOICES = [
+        (THRESHOLD, 'Threshold'),
+        (RATE_OF_CHANGE, 'Rate of change'),
+        (ZSCORE, 'Rolling z-score'),
+    ]
+    METRIC_CHOICES = [
+        ('temperature', 'Temperature'),
+        ('humidity', 'Humidity'),
+    ]
+    
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='alert_rules')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    min_value = models.FloatField(blank=True, null=True)
+    max_value = models.FloatField(blank=True, null=True)
+    max_rate = models.FloatField(blank=True, null=True, help_text="Largest allowed change per minute")
+    window = models.PositiveIntegerField(default=20, help_text="Readings in the z-score window")
+    z_threshold = models.FloatField(default=3.0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Rolling state
+    last_value = models.FloatField(blank=True, null=True)
+    last_timestamp = models.DateTimeField(blank=True, null=True)
+    window_values = models.JSONField(default=list)
+    window_position = models.PositiveIntegerField(default=0)
+    window_sum = models.FloatField(default=0)
+    window_sum_squares = models.FloatField(default=0)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.sensor_id} - {self.kind} on {self.metric}"
+
+class AlertEvent(models.Model):
+    """A reading that tripped an AlertRule"""
+    rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name='events')
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='alert_events')
+    timestamp = models.DateTimeField()
+    value = models.FloatField()
+    detail = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            models.Index(fields=['sensor', 'timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sensor_id} - {self.timestamp}: {self.detail}"
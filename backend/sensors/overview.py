@@ -0,0 +1,74 @@
+"""
+Newest reading of many sensors in one query, for the dashboard overview.
+
+On PostgreSQL a LATERAL join probes the (sensor, timestamp) index once per
+sensor and reads a single row each. ``DISTINCT ON (sensor_id)`` would give the
+same rows but walks every reading in the range first, which for a busy fleet
+is most of the table. Other databases rank readings per sensor with a window
+function instead. Sensors whose newest reading in the range is archived get
+it from their newest chunk (see ``sensors.archive.newest_archived``).
+"""
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .archive import newest_archived
+from .models import Reading
+
+LATEST_SQL = """
+    SELECT latest.*
+    FROM unnest(%s::integer[]) AS sensor(id)
+    CROSS JOIN LATERAL (
+        SELECT *
+        FROM {table}
+        WHERE {sensor_id} = sensor.id{conditions}
+        ORDER BY {timestamp} DESC
+        LIMIT 1
+    ) AS latest
+    ORDER BY latest.{sensor_id}
+"""
+
+
+def _column(name):
+    return connection.ops.quote_name(Reading._meta.get_field(name).column)
+
+
+def latest_readings(sensor_ids, timestamp_from=None, timestamp_to=None):
+    """The newest reading of each of ``sensor_ids`` within the range; sensors without one are left out"""
+    sensor_ids = sorted(sensor_ids)
+    if not sensor_ids:
+        return []
+
+    if connection.vendor == 'postgresql':
+        timestamp = _column('timestamp')
+        conditions, params = [], [sensor_ids]
+        if timestamp_from:
+            conditions.append(f'{timestamp} >= %s')
+            params.append(timestamp_from)
+        if timestamp_to:
+            conditions.append(f'{timestamp} <= %s')
+            params.append(timestamp_to)
+        sql = LATEST_SQL.format(
+            table=connection.ops.quote_name(Reading._meta.db_table),
+            sensor_id=_column('sensor'),
+            timestamp=timestamp,
+            conditions=''.join(f' AND {condition}' for condition in conditions),
+        )
+        rows = Reading.objects.raw(sql, params)
+    else:
+        queryset = Reading.objects.filter(sensor_id__in=sensor_ids)
+        if timestamp_from:
+            queryset = queryset.filter(timestamp__gte=timestamp_from)
+        if timestamp_to:
+            queryset = queryset.filter(timestamp__lte=timestamp_to)
+        rows = queryset.annotate(position=Window(
+            RowNumber(),
+            partition_by=F('sensor_id'),
+            order_by=F('timestamp').desc()
+        )).filter(position=1)
+
+    latest = {reading.sensor_id: reading for reading in rows}
+    found = {sensor_id: reading.timestamp for sensor_id, reading in latest.items()}
+    for sensor_id, reading in newest_archived(sensor_ids, timestamp_from, timestamp_to, found).items():
+        if sensor_id not in latest or reading.timestamp > latest[sensor_id].timestamp:
+            latest[sensor_id] = reading
+    return [latest[sensor_id] for sensor_id in sorted(latest)]
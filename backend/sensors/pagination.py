@@ -0,0 +1,117 @@
+import base64
+from datetime import datetime
+from typing import Any, List, Optional
+from asgiref.sync import sync_to_async
+from django.db.models import QuerySet
+from ninja import Schema
+from ninja.errors import HttpError
+from ninja.pagination import AsyncPaginationBase, PageNumberPagination
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination whose async path fetches the page with async iteration"""
+
+    async def apaginate_queryset(self, queryset, pagination, **params):
+        if not isinstance(queryset, QuerySet):
+            # Sequences such as ReadingHistory run their own (sync) queries
+            return await sync_to_async(self.paginate_queryset)(queryset, pagination, **params)
+        offset = (pagination.page - 1) * self.page_size
+        return {
+            "items": [item async for item in queryset[offset:offset + self.page_size]],
+            "count": await self._aitems_count(queryset),
+        }
+
+
+class CursorPagination(AsyncPaginationBase):
+    """
+    Keyset pagination over ``(timestamp, id)`` in ``-timestamp`` order.
+
+    Pages seek from the last row seen instead of using OFFSET and never run a
+    COUNT(*), so every page costs the same on the ``(sensor, timestamp)`` index.
+    """
+
+    class Input(Schema):
+        cursor: Optional[str] = None
+
+    class Output(Schema):
+        items: List[Any]
+        next: Optional[str] = None
+        previous: Optional[str] = None
+
+    def __init__(self, page_size=50, **kwargs):
+        self.page_size = page_size
+        super().__init__(**kwargs)
+
+    def paginate_queryset(self, queryset, pagination, **params):
+        position = decode_cursor(pagination.cursor) if pagination.cursor else None
+        # One extra row tells whether there is a page beyond this one
+        limit = self.page_size + 1
+        if not isinstance(queryset, QuerySet):
+            # Sequences such as ReadingHistory seek through readings that aren't rows as well
+            return self._page(queryset.seek(position, limit), position)
+        return self._page(list(seek(queryset, position, limit)), position)
+
+    async def apaginate_queryset(self, queryset, pagination, **params):
+        if not isinstance(queryset, QuerySet):
+            return await sync_to_async(self.paginate_queryset)(queryset, pagination, **params)
+        position = decode_cursor(pagination.cursor) if pagination.cursor else None
+        rows = [row async for row in seek(queryset, position, self.page_size + 1)]
+        return self._page(rows, position)
+
+    def _page(self, rows, position):
+        has_more = len(rows) > self.page_size
+        items = rows[:self.page_size]
+        if position is None:
+            return {
+                "items": items,
+                "next": encode_cursor('next', items[-1]) if has_more else None,
+                "previous": None,
+            }
+        if position[0] == 'next':
+            return {
+                "items": items,
+                "next": encode_cursor('next', items[-1]) if has_more else None,
+                "previous": encode_cursor('previous', items[0]) if items else None,
+            }
+        items.reverse()
+        return {
+            "items": items,
+            "next": encode_cursor('next', items[-1]) if items else None,
+            "previous": encode_cursor('previous', items[0]) if has_more else None,
+        }
+
+
+def seek(queryset, position, limit):
+    """
+    The first ``limit`` rows of ``queryset`` past a decoded cursor ``position``:
+    newest first for a next page (or no cursor), oldest first for a previous one.
+    """
+    if position is None:
+        return queryset.order_by('-timestamp', '-id')[:limit]
+    direction, timestamp, pk = position
+    if direction == 'next':
+        return (
+            queryset.filter(timestamp__lte=timestamp)
+            .exclude(timestamp=timestamp, id__gte=pk)
+            .order_by('-timestamp', '-id')[:limit]
+        )
+    return (
+        queryset.filter(timestamp__gte=timestamp)
+        .exclude(timestamp=timestamp, id__lte=pk)
+        .order_by('timestamp', 'id')[:limit]
+    )
+
+
+def encode_cursor(direction, reading):
+    raw = f"{direction}|{reading.timestamp.isoformat()}|{reading.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        direction, timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        if direction not in ('next', 'previous'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise HttpError(400, "Invalid cursor")
@@ -0,0 +1,161 @@
+"""
+Monthly range partitions for the readings table on PostgreSQL.
+
+Migration 0004 turns ``sensors_reading`` into a table partitioned by
+``timestamp`` with a ``sensors_reading_default`` catch-all partition. The
+helpers here keep future months created ahead of time and let retention drop
+whole months instead of deleting rows one by one.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from .models import Reading
+
+DEFAULT_PARTITION_SUFFIX = 'default'
+
+
+def reading_table():
+    return Reading._meta.db_table
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [reading_table()]
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def month_starts(first, last):
+    """Every first-of-month from the month of ``first`` to the month of ``last``, inclusive"""
+    current = month_start(first)
+    end = month_start(last)
+    while current <= end:
+        yield current
+        current = add_months(current, 1)
+
+
+def partition_name(month):
+    return f"{reading_table()}_p{month:%Y_%m}"
+
+
+def _bound(month):
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def list_partitions():
+    """(name, lower bound, upper bound) for each monthly partition, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s ORDER BY c.relname",
+            [reading_table()]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    prefix = f"{reading_table()}_p"
+    partitions = []
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        lower = datetime.strptime(name[len(prefix):], '%Y_%m').date()
+        partitions.append((name, lower, add_months(lower, 1)))
+    return partitions
+
+
+def default_partition():
+    return f"{reading_table()}_{DEFAULT_PARTITION_SUFFIX}"
+
+
+def create_partition(month):
+    """
+    Create the partition for ``month`` if it doesn't exist yet.
+
+    Rows that already landed in the default partition for that month are moved
+    into the new partition before it is attached.
+    """
+    name = partition_name(month)
+    table = reading_table()
+    default = default_partition()
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{default}" '
+            f'WHERE "timestamp" >= {lower} AND "timestamp" < {upper} RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        )
+        cursor.execute(
+            f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM ({lower}) TO ({upper})'
+        )
+    return True
+
+
+def ensure_partitions(months_ahead=None, today=None):
+    """Create partitions from the current month through ``months_ahead`` months ahead"""
+    if not is_partitioned():
+        return []
+    if months_ahead is None:
+        months_ahead = settings.READING_PARTITION_MONTHS_AHEAD
+    today = today or datetime.now(dt_timezone.utc).date()
+    first = month_start(today)
+    return [
+        partition_name(month)
+        for month in month_starts(first, add_months(first, months_ahead))
+        if create_partition(month)
+    ]
+
+
+def drop_partitions_before(cutoff):
+    """
+    Drop every monthly partition that only holds readings older than ``cutoff``.
+
+    Returns ``(dropped partition names, ids of sensors that had readings in them)``.
+    """
+    cutoff = cutoff.date() if isinstance(cutoff, datetime) else cutoff
+    dropped = []
+    sensor_ids = set()
+    for name, _, upper in list_partitions():
+        if upper > cutoff:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SELECT DISTINCT sensor_id FROM "{name}"')
+            sensor_ids.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f'DROP TABLE "{name}"')
+        dropped.append(name)
+    return dropped, sensor_ids
+
+
+def delete_default_rows_before(cutoff):
+    """
+    Delete readings older than ``cutoff`` from the default partition, which
+    holds months without a partition of their own and is never dropped.
+
+    Returns ``(rows deleted, ids of sensors that had readings deleted)``.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM "{default_partition()}" WHERE "timestamp" < %s RETURNING sensor_id',
+            [cutoff]
+        )
+        sensor_ids = [row[0] for row in cursor.fetchall()]
+    return len(sensor_ids), set(sensor_ids)
@@ -0,0 +1,318 @@
+"""
+Opt-in request profiling: SQL, auth and serialization time per request.
+
+With ``PROFILING`` enabled, ``ProfilingMiddleware`` is the first entry of
+``MIDDLEWARE``. For every request it records:
+
+    db         time in SQL and the number of queries (every connection's
+               ``execute_wrappers``, so async views running the ORM in worker
+               threads are counted too)
+    auth       time in the JWT authenticators, including their user lookup
+    serialize  time validating the result against the response schema and
+               rendering it to JSON
+
+and returns them in a ``Server-Timing`` header, which browser dev tools show
+next to the request. Streamed responses (exports, live readings) are timed only
+until the view returns the response object, not while their body streams. The
+same numbers are aggregated per route into Prometheus histograms served at
+``/metrics``. Metrics are per process; scrape each worker, or run one worker
+per container.
+
+A ``PROFILING_SAMPLE_RATE`` share of requests also run under cProfile (or
+pyinstrument with ``PROFILING_PROFILER=pyinstrument``); those slower than
+``PROFILING_SLOW_MS`` are written to ``PROFILING_DIR``. Only one request per
+process is profiled at a time.
+"""
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+PHASES = ('db', 'auth', 'serialize')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.phases = defaultdict(float)
+
+    def server_timing(self, total):
+        entries = [f'total;dur={total * 1000:.1f}']
+        for phase in PHASES:
+            entry = f'{phase};dur={self.phases[phase] * 1000:.1f}'
+            if phase == 'db':
+                entry += f';desc="{self.queries} queries"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the current request, if it is profiled"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - started
+
+
+def _time_queries(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.phases['db'] += time.perf_counter() - started
+        timings.queries += 1
+
+
+def _install_query_timer(connection, **kwargs):
+    if _time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_queries)
+
+
+def instrument_api(api):
+    """Time response validation and rendering of every operation of a NinjaAPI"""
+    for _, router in api._routers:
+        for path_view in router.path_operations.values():
+            for operation in path_view.operations:
+                operation._result_to_response = _timed_serialization(operation._result_to_response)
+
+
+def _timed_serialization(result_to_response):
+    @wraps(result_to_response)
+    def wrapper(*args, **kwargs):
+        with timed('serialize'):
+            return result_to_response(*args, **kwargs)
+    return wrapper
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """Per-route request histograms of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, labels, total, timings):
+        with self._lock:
+            route = self._routes.get(labels)
+            if route is None:
+                route = self._routes[labels] = {
+                    'duration': Histogram(DURATION_BUCKETS),
+                    'queries': Histogram(QUERY_BUCKETS),
+                    'phases': dict.fromkeys(PHASES, 0.0),
+                }
+            route['duration'].observe(total)
+            route['queries'].observe(timings.queries)
+            for phase in PHASES:
+                route['phases'][phase] += timings.phases[phase]
+
+    def render(self):
+        """The Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for name, key, help_text in (
+                ('http_request_duration_seconds', 'duration', 'Request latency by route'),
+                ('http_request_db_queries', 'queries', 'SQL queries per request by route'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, route in routes:
+                    histogram = route[key]
+                    label_text = _labels(labels)
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{label_text},le="{bound:g}"}} {count}')
+                    lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{label_text}}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{{label_text}}} {histogram.count}')
+            lines.append('# HELP http_request_phase_seconds_total Time spent in each request phase by route')
+            lines.append('# TYPE http_request_phase_seconds_total counter')
+            for labels, route in routes:
+                for phase, seconds in route['phases'].items():
+                    lines.append(f'http_request_phase_seconds_total{{{_labels(labels)},phase="{phase}"}} {seconds:.6f}')
+        lines.extend(_buffer_metrics())
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    method, route, status = labels
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{route}",status="{status}"'
+
+
+def _buffer_metrics():
+    from .buffer import ingest_buffer
+
+    stats = ingest_buffer.stats()
+    return [
+        '# HELP ingest_buffer_depth Readings waiting in the write-behind buffer',
+        '# TYPE ingest_buffer_depth gauge',
+        f'ingest_buffer_depth {stats["depth"]}',
+        '# HELP ingest_buffer_rows_total Readings that went through the write-behind buffer',
+        '# TYPE ingest_buffer_rows_total counter',
+        *(
+            f'ingest_buffer_rows_total{{state="{state}"}} {stats[state]}'
+            for state in ('enqueued', 'flushed', 'dropped', 'rejected')
+        ),
+        '# HELP ingest_buffer_flush_seconds Time spent committing the buffer',
+        '# TYPE ingest_buffer_flush_seconds summary',
+        f'ingest_buffer_flush_seconds_sum {stats["avg_flush_seconds"] * stats["flushes"]:.6f}',
+        f'ingest_buffer_flush_seconds_count {stats["flushes"]}',
+    ]
+
+
+metrics = Metrics()
+
+
+class Profiler:
+    """Sampled cProfile/pyinstrument capture of slow requests, one at a time per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def sample(self, request):
+        """Profile the block if the request is sampled; a no-op otherwise"""
+        if random.random() >= settings.PROFILING_SAMPLE_RATE or not self._lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            profiler = self._start()
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - started
+                self._stop(profiler, request, elapsed)
+        finally:
+            self._lock.release()
+
+    def _start(self):
+        if settings.PROFILING_PROFILER == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as Pyinstrument
+            except ImportError:
+                raise ImproperlyConfigured("PROFILING_PROFILER=pyinstrument needs the pyinstrument package")
+            profiler = Pyinstrument(async_mode='enabled')
+            profiler.start()
+            return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop(self, profiler, request, elapsed):
+        pyinstrument = not isinstance(profiler, cProfile.Profile)
+        if pyinstrument:
+            profiler.stop()
+        else:
+            profiler.disable()
+        if elapsed * 1000 < settings.PROFILING_SLOW_MS:
+            return
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', f'{request.method} {request.path}').strip('-')
+        name = f'{time.strftime("%Y%m%dT%H%M%S")}-{elapsed * 1000:.0f}ms-{slug}'
+        path = os.path.join(settings.PROFILING_DIR, name)
+        if pyinstrument:
+            with open(f'{path}.html', 'w') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.dump_stats(f'{path}.prof')
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """Time requests, add ``Server-Timing`` and feed the ``/metrics`` histograms"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(_install_query_timer, dispatch_uid='sensors.profiling')
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with profiler.sample(request):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with profiler.sample(request):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        response['Server-Timing'] = timings.server_timing(total)
+        match = request.resolver_match
+        route = '/' + match.route if match is not None else 'unmatched'
+        metrics.observe((request.method, route, response.status_code), total, timings)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; only served while profiling is enabled"""
+    if not settings.PROFILING:
+        raise Http404
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
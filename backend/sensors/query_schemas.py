@@ -1,12 +1,45 @@
 from ninja import Schema
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class SensorListQuery(Schema):
     q: Optional[str] = None
     model: Optional[str] = None
-    sort_by: Optional[str] = "name"
+    # Defaults to "relevance" when searching, otherwise "name"
+    sort_by: Optional[str] = None
+
+class IngestQuery(Schema):
+    # Defaults to settings.INGEST_CONFLICT_POLICY
+    on_conflict: Optional[Literal['ignore', 'overwrite']] = None
 
 class ReadingListQuery(Schema):
     timestamp_from: Optional[datetime] = None
-    timestamp_to: Optional[datetime] = None
\ No newline at end of file
+    timestamp_to: Optional[datetime] = None
+
+class ReadingAggregateQuery(ReadingListQuery):
+    bucket: Literal['1m', '5m', '1h', '1d'] = '1h'
+
+class FleetReadingListQuery(ReadingListQuery):
+    sensor_ids: Optional[List[int]] = None
+
+class FleetReadingAggregateQuery(ReadingAggregateQuery):
+    sensor_ids: Optional[List[int]] = None
+
+class ReadingExportQuery(ReadingListQuery):
+    format: Literal['csv', 'ndjson', 'columns'] = 'csv'
+    gzip: bool = False
+
+class FleetReadingExportQuery(ReadingExportQuery):
+    sensor_ids: Optional[List[int]] = None
+
+class MeasurementListQuery(ReadingListQuery):
+    metrics: Optional[List[str]] = None
+
+class MeasurementAggregateQuery(MeasurementListQuery):
+    bucket: Literal['1m', '5m', '1h', '1d'] = '1h'
+
+class LiveReadingsQuery(Schema):
+    sensor_ids: Optional[List[int]] = None
+
+class AlertEventQuery(ReadingListQuery):
+    sensor_ids: Optional[List[int]] = None
@@ -0,0 +1,184 @@
+"""
+Per-user caching of read-mostly sensor responses, with ETags.
+
+Cached entries are keyed by user, path and the current version token of every
+scope the response depends on:
+
+    models:<user id>    the user's distinct sensor models
+    sensors:<user id>   the user's sensor list (names, counts, last readings)
+    sensor:<sensor id>  one sensor's details
+
+Writes never delete entries; they replace the version tokens of the scopes they
+touch (``invalidate_sensor``, ``invalidate_readings``), so the old entries are
+simply never looked up again and age out. Tokens are replaced both immediately
+and again on commit, so a request racing the transaction can't cache the old
+data under the new token.
+
+Uses the ``default`` cache, which has to be shared by every worker (Redis):
+version tokens in one process's local memory can't be replaced by a write
+handled in another. RESPONSE_CACHE_TIMEOUT is therefore 0 unless ``REDIS_URL``
+is set; with local memory the cache only suits a single process.
+"""
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from ninja.utils import is_async_callable
+
+KEY_PREFIX = 'response'
+
+
+def _version_key(scope, ident):
+    return f"{KEY_PREFIX}:version:{scope}:{ident}"
+
+
+def _scope_keys(scopes, user, kwargs):
+    keys = []
+    for scope in scopes:
+        ident = kwargs['sensor_id'] if scope == 'sensor' else user.id
+        keys.append(_version_key(scope, ident))
+    return keys
+
+
+def _new_token():
+    return uuid.uuid4().hex
+
+
+def _entry_key(request, user, versions):
+    location = f"{request.path}?{request.GET.urlencode()}"
+    digest = hashlib.md5('|'.join([location, *versions]).encode()).hexdigest()
+    return f"{KEY_PREFIX}:entry:{user.id}:{digest}"
+
+
+def _missing_versions(keys, found):
+    # An unknown (never set or evicted) scope gets a fresh token, never an old one
+    return {key: _new_token() for key in keys if key not in found}
+
+
+def entry_key(request, user, keys):
+    found = cache.get_many(keys)
+    for key, token in _missing_versions(keys, found).items():
+        cache.add(key, token, timeout=None)
+        found[key] = cache.get(key, token)
+    return _entry_key(request, user, [found[key] for key in keys])
+
+
+async def aentry_key(request, user, keys):
+    found = await cache.aget_many(keys)
+    for key, token in _missing_versions(keys, found).items():
+        await cache.aadd(key, token, timeout=None)
+        found[key] = await cache.aget(key, token)
+    return _entry_key(request, user, [found[key] for key in keys])
+
+
+def make_entry(response):
+    content = response.content
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+    return etag, response['Content-Type'], content
+
+
+def respond(request, entry):
+    etag, content_type, content = entry
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    # Revalidate every time; the ETag makes that a cheap 304
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Authorization'
+    return response
+
+
+def cached_response(*scopes):
+    """
+    ``decorate_view`` decorator that caches the operation's 200 GET responses per user.
+
+    ``scopes`` are the version scopes the response depends on: ``models``,
+    ``sensors`` and/or ``sensor`` (the ``sensor_id`` path parameter).
+
+    Wraps ``Operation.run``, so it runs before the operation's own checks. The
+    user it authenticates is kept as ``request.auth``, which the JWT auth then
+    reuses instead of validating the token a second time.
+    """
+    # Imported here since auth -> schemas -> ingest imports this module for invalidation
+    from .auth import async_jwt_auth, jwt_auth
+
+    def decorator(run):
+        if is_async_callable(run):
+            @wraps(run)
+            async def async_view(request, **kwargs):
+                if not _cacheable(request):
+                    return await run(request, **kwargs)
+                user = request.auth = await async_jwt_auth(request)
+                if not user:
+                    return await run(request, **kwargs)
+                key = await aentry_key(request, user, _scope_keys(scopes, user, kwargs))
+                entry = await cache.aget(key)
+                if entry is None:
+                    response = await run(request, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    entry = make_entry(response)
+                    await cache.aset(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+                return respond(request, entry)
+            return async_view
+
+        @wraps(run)
+        def view(request, **kwargs):
+            if not _cacheable(request):
+                return run(request, **kwargs)
+            user = request.auth = jwt_auth(request)
+            if not user:
+                return run(request, **kwargs)
+            key = entry_key(request, user, _scope_keys(scopes, user, kwargs))
+            entry = cache.get(key)
+            if entry is None:
+                response = run(request, **kwargs)
+                if response.status_code != 200:
+                    return response
+                entry = make_entry(response)
+                cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+            return respond(request, entry)
+        return view
+    return decorator
+
+
+def _cacheable(request):
+    return request.method == 'GET' and settings.RESPONSE_CACHE_TIMEOUT > 0
+
+
+def _bump(keys):
+    if settings.RESPONSE_CACHE_TIMEOUT <= 0:
+        return
+
+    def replace():
+        cache.set_many({key: _new_token() for key in keys}, timeout=None)
+    replace()
+    transaction.on_commit(replace)
+
+
+def invalidate_user(user_id):
+    _bump([_version_key(scope, user_id) for scope in ('models', 'sensors')])
+
+
+def invalidate_sensor(sensor):
+    """A sensor was created, changed or deleted"""
+    _bump([
+        _version_key('models', sensor.owner_id),
+        _version_key('sensors', sensor.owner_id),
+        _version_key('sensor', sensor.id),
+    ])
+
+
+def invalidate_readings(owners):
+    """New readings changed the stats of ``owners``, a {sensor id: owner id} mapping"""
+    keys = {_version_key('sensor', sensor_id) for sensor_id in owners}
+    keys.update(_version_key('sensors', owner_id) for owner_id in owners.values())
+    if keys:
+        _bump(sorted(keys))
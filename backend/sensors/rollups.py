@@ -0,0 +1,436 @@
+"""
+Downsampled rollup tiers for readings.
+
+Readings are folded into 1-minute rollups, minutes into hours and hours into
+days. ``build_rollups`` is incremental: it picks up readings inserted since the
+last run (tracked by id in RollupWatermark) and recomputes only the buckets they
+touched, so running it repeatedly is cheap and idempotent.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+from .aggregates import BUCKET_SECONDS, TimeBucket, aggregate_readings
+from .models import DayRollup, HourRollup, MinuteRollup, Reading, ReadingChunk, RollupWatermark
+
+# Finest first; each tier is built from the one before it (the first from raw readings)
+TIERS = [
+    ('1m', MinuteRollup),
+    ('1h', HourRollup),
+    ('1d', DayRollup),
+]
+
+WATERMARK = 'rollups'
+
+# Transactions that were still in flight on the previous run can commit ids below
+# the watermark, so every run re-reads this many ids behind it. Recomputing a
+# bucket is idempotent, so the overlap only costs time.
+WATERMARK_OVERLAP = 10000
+
+# Affected buckets closer together than this are recomputed with one range query
+SPAN_GAP = timedelta(hours=1)
+
+VALUE_FIELDS = [
+    'count', 'temperature_min', 'temperature_max', 'temperature_sum',
+    'humidity_min', 'humidity_max', 'humidity_sum',
+]
+
+
+def retention_cutoff(tier, now=None):
+    days = settings.READING_ROLLUP_RETENTION_DAYS.get(tier)
+    if not days:
+        return None
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def _floor(timestamp, seconds):
+    epoch = int(timestamp.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def _spans(buckets, seconds):
+    """Merge sorted bucket starts into (from, to) ranges that each cost one query"""
+    spans = []
+    width = timedelta(seconds=seconds)
+    for bucket in sorted(buckets):
+        if spans and bucket - spans[-1][1] <= SPAN_GAP:
+            spans[-1][1] = bucket + width
+        else:
+            spans.append([bucket, bucket + width])
+    return spans
+
+
+def _raw_buckets(queryset, seconds):
+    return (
+        queryset.order_by()
+        .annotate(start=TimeBucket('timestamp', seconds))
+        .values('sensor_id', 'start')
+        .annotate(
+            count=Count('id'),
+            temperature_min=Min('temperature'),
+            temperature_max=Max('temperature'),
+            # Sum of a real column is real on PostgreSQL; sum in double precision
+            temperature_sum=Sum(Cast('temperature', FloatField())),
+            humidity_min=Min('humidity'),
+            humidity_max=Max('humidity'),
+            humidity_sum=Sum(Cast('humidity', FloatField())),
+        )
+    )
+
+
+def _rollup_buckets(queryset, seconds):
+    return (
+        queryset.order_by()
+        .annotate(start=TimeBucket('bucket', seconds))
+        .values('sensor_id', 'start')
+        .annotate(
+            count=Sum('count'),
+            temperature_min=Min('temperature_min'),
+            temperature_max=Max('temperature_max'),
+            temperature_sum=Sum('temperature_sum'),
+            humidity_min=Min('humidity_min'),
+            humidity_max=Max('humidity_max'),
+            humidity_sum=Sum('humidity_sum'),
+        )
+    )
+
+
+def _rebuild_tier(model, source, affected, seconds):
+    """Recompute ``affected`` {sensor_id: bucket starts} of ``model`` from ``source``"""
+    rows = []
+    for sensor_id, buckets in affected.items():
+        for start, end in _spans(buckets, seconds):
+            if source is Reading:
+                queryset = Reading.objects.filter(sensor_id=sensor_id, timestamp__gte=start, timestamp__lt=end)
+                grouped = _raw_buckets(queryset, seconds)
+            else:
+                queryset = source.objects.filter(sensor_id=sensor_id, bucket__gte=start, bucket__lt=end)
+                grouped = _rollup_buckets(queryset, seconds)
+            rows.extend(
+                model(
+                    sensor_id=row['sensor_id'],
+                    bucket=row['start'],
+                    **{field: row[field] for field in VALUE_FIELDS}
+                )
+                for row in grouped
+            )
+    model.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['sensor', 'bucket'],
+        update_fields=VALUE_FIELDS
+    )
+    return len(rows)
+
+
+def build_rollups(batch_size=50000):
+    """
+    Fold readings inserted since the last run into every rollup tier.
+
+    Returns how many new readings were processed; call again until it returns 0
+    to catch up after a long pause.
+    """
+    watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK)
+    start_id = watermark.last_reading_id
+    if not Reading.objects.filter(id__gt=start_id).exists():
+        return 0
+
+    readings = list(
+        Reading.objects.filter(id__gt=max(start_id - WATERMARK_OVERLAP, 0))
+        .order_by('id')
+        .values_list('id', 'sensor_id', 'timestamp')[:batch_size + WATERMARK_OVERLAP]
+    )
+
+    with transaction.atomic():
+        _fold(readings)
+        watermark.last_reading_id = max(start_id, readings[-1][0])
+        watermark.save()
+
+    return sum(1 for reading_id, _, _ in readings if reading_id > start_id)
+
+
+def _fold(readings):
+    """Recompute every tier's buckets touched by ``(id, sensor_id, timestamp)`` rows"""
+    if not readings:
+        return
+    # Readings of archived days are no longer rows (see sensors.archive); their buckets are refolded with the chunk
+    archived = set(
+        ReadingChunk.objects.filter(
+            sensor_id__in={sensor_id for _, sensor_id, _ in readings},
+            day__in={timestamp.astimezone(dt_timezone.utc).date() for _, _, timestamp in readings}
+        ).values_list('sensor_id', 'day')
+    )
+    fresh = []
+    late = defaultdict(list)
+    for reading in readings:
+        key = (reading[1], reading[2].astimezone(dt_timezone.utc).date())
+        if key in archived:
+            late[key].append(reading[2])
+        else:
+            fresh.append(reading)
+
+    source, source_tier = Reading, None
+    for tier, model in TIERS:
+        seconds = BUCKET_SECONDS[tier]
+        # Don't rebuild a bucket from finer rollups that have already expired
+        cutoff = retention_cutoff(source_tier) if source_tier else None
+        affected = {}
+        for _, sensor_id, timestamp in fresh:
+            bucket = _floor(timestamp, seconds)
+            if cutoff is None or bucket >= cutoff:
+                affected.setdefault(sensor_id, set()).add(bucket)
+        _rebuild_tier(model, source, affected, seconds)
+        source, source_tier = model, tier
+
+    if late:
+        _fold_late(late)
+
+
+def _fold_late(late):
+    """Refold the buckets of rows that arrived for archived days, ``{(sensor_id, day): timestamps}``"""
+    from .archive import _chunks, unpack_chunk  # sensors.archive folds through this module
+
+    for chunk in _chunks(late):
+        start = datetime.combine(chunk.day, datetime.min.time(), tzinfo=dt_timezone.utc)
+        rows = Reading.objects.filter(
+            sensor_id=chunk.sensor_id, timestamp__gte=start, timestamp__lt=start + timedelta(days=1)
+        )
+        refold_archived(chunk.sensor_id, [*unpack_chunk(chunk.data, chunk.sensor_id), *rows], late[(chunk.sensor_id, chunk.day)])
+
+
+def _python_buckets(readings, seconds):
+    """``{(sensor_id, start): row}`` with the values of ``_raw_buckets`` rows, computed from ``readings``"""
+    buckets = {}
+    for reading in readings:
+        start = _floor(reading.timestamp, seconds)
+        values = {
+            'count': 1,
+            'temperature_min': reading.temperature,
+            'temperature_max': reading.temperature,
+            'temperature_sum': float(reading.temperature),
+            'humidity_min': reading.humidity,
+            'humidity_max': reading.humidity,
+            'humidity_sum': float(reading.humidity),
+        }
+        row = buckets.get((reading.sensor_id, start))
+        if row is None:
+            buckets[(reading.sensor_id, start)] = {'sensor_id': reading.sensor_id, 'start': start, **values}
+        else:
+            _merge_bucket(row, values)
+    return buckets
+
+
+def _merge_bucket(row, other):
+    """Add the values of bucket ``other`` to ``row``"""
+    row['count'] += other['count']
+    for field in ('temperature', 'humidity'):
+        row[f'{field}_min'] = min(row[f'{field}_min'], other[f'{field}_min'])
+        row[f'{field}_max'] = max(row[f'{field}_max'], other[f'{field}_max'])
+        row[f'{field}_sum'] += other[f'{field}_sum']
+
+
+def _with_archived(rows, sensor_ids, seconds, timestamp_from, timestamp_to):
+    """
+    ``_raw_buckets`` rows of ``sensor_ids`` merged with their archived readings in the range.
+
+    Archived days are always rolled up, so only a series that comes from raw
+    readings because no rollup tier covers its range needs their chunks.
+    """
+    from .archive import archived_readings  # sensors.archive folds through this module
+
+    buckets = _python_buckets(archived_readings(sensor_ids, timestamp_from, timestamp_to), seconds)
+    for row in rows:
+        key = (row['sensor_id'], row['start'])
+        if key in buckets:
+            _merge_bucket(buckets[key], row)
+        else:
+            buckets[key] = row
+    return [buckets[key] for key in sorted(buckets)]
+
+
+def refold_archived(sensor_id, readings, timestamps):
+    """
+    Recompute every tier's buckets around ``timestamps`` from ``readings``, all of one archived day.
+
+    ``readings`` are the day's chunk and any rows that arrived for it since;
+    a chunk holds a whole UTC day, so they cover each of those buckets.
+    Buckets past a tier's retention are left expired.
+    """
+    for tier, model in TIERS:
+        seconds = BUCKET_SECONDS[tier]
+        cutoff = retention_cutoff(tier)
+        buckets = {
+            bucket for bucket in (_floor(timestamp, seconds) for timestamp in timestamps)
+            if cutoff is None or bucket >= cutoff
+        }
+        rows = [
+            model(
+                sensor_id=sensor_id,
+                bucket=row['start'],
+                **{field: row[field] for field in VALUE_FIELDS}
+            )
+            for row in _python_buckets(
+                (reading for reading in readings if _floor(reading.timestamp, seconds) in buckets), seconds
+            ).values()
+        ]
+        model.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['sensor', 'bucket'],
+            update_fields=VALUE_FIELDS
+        )
+
+
+def refresh_rollups(updated):
+    """
+    Recompute the rolled-up buckets of overwritten readings.
+
+    An overwrite keeps the reading's id, so ``build_rollups`` would never see
+    the new values of updated readings behind its watermark. New readings,
+    late ones included, are left to its next pass.
+    """
+    if not updated:
+        return
+    last_reading_id = (
+        RollupWatermark.objects.filter(name=WATERMARK).values_list('last_reading_id', flat=True).first() or 0
+    )
+    _fold([
+        (reading.id, reading.sensor_id, reading.timestamp)
+        for reading in updated
+        if reading.id <= last_reading_id
+    ])
+
+
+def apply_retention(now=None):
+    """Delete rollup rows older than each tier's retention; returns {tier: rows deleted}"""
+    deleted = {}
+    for tier, model in TIERS:
+        cutoff = retention_cutoff(tier, now)
+        if cutoff is not None:
+            deleted[tier], _ = model.objects.filter(bucket__lt=cutoff).delete()
+    return deleted
+
+
+def pick_tier(bucket, timestamp_from, now=None):
+    """The coarsest rollup tier that can answer ``bucket``-wide buckets back to ``timestamp_from``"""
+    bucket_seconds = BUCKET_SECONDS[bucket]
+    for tier, model in reversed(TIERS):
+        tier_seconds = BUCKET_SECONDS[tier]
+        if tier_seconds > bucket_seconds or bucket_seconds % tier_seconds:
+            continue
+        cutoff = retention_cutoff(tier, now)
+        if cutoff is not None and (timestamp_from is None or timestamp_from < cutoff):
+            continue
+        return tier, model
+    return None, None
+
+
+def aggregate_series(sensor_id, bucket, timestamp_from=None, timestamp_to=None):
+    """
+    Per-bucket min/max/avg/count for one sensor, served from rollups when possible.
+
+    Rollup buckets are used up to the newest one built for the sensor; readings
+    after that come from the raw table. Readings that arrive late for rolled
+    buckets show up once ``build_rollups`` folds them in, while overwritten
+    ones are refolded as they are written (see refresh_rollups). A range no
+    rollup tier covers comes from raw readings and the chunks of archived
+    days. Buckets are whole, so the first and last may include readings just
+    outside the range.
+    """
+    tier, model = pick_tier(bucket, timestamp_from)
+    seconds = BUCKET_SECONDS[bucket]
+    raw = Reading.objects.filter(sensor_id=sensor_id)
+    if timestamp_from:
+        raw = raw.filter(timestamp__gte=timestamp_from)
+    if timestamp_to:
+        raw = raw.filter(timestamp__lte=timestamp_to)
+    if model is None:
+        rows = _with_archived(_raw_buckets(raw, seconds), [sensor_id], seconds, timestamp_from, timestamp_to)
+        return [_point(row) for row in rows]
+
+    rolled = model.objects.filter(sensor_id=sensor_id)
+    if timestamp_from:
+        rolled = rolled.filter(bucket__gte=_floor(timestamp_from, seconds))
+    if timestamp_to:
+        rolled = rolled.filter(bucket__lte=timestamp_to)
+    newest = rolled.aggregate(newest=Max('bucket'))['newest']
+    if newest is None:
+        return list(aggregate_readings(raw, bucket))
+
+    # The newest rolled bucket may still be filling up, so it comes from raw readings
+    raw_from = _floor(newest, seconds)
+    series = [
+        _point(row)
+        for row in _rollup_buckets(rolled.filter(bucket__lt=raw_from), seconds).order_by('start')
+    ]
+    series.extend(aggregate_readings(raw.filter(timestamp__gte=raw_from), bucket))
+    return series
+
+
+def _point(row):
+    """A series entry from a ``_raw_buckets``/``_rollup_buckets`` row"""
+    return {
+        'bucket': row['start'],
+        'count': row['count'],
+        'temperature_min': row['temperature_min'],
+        'temperature_max': row['temperature_max'],
+        'temperature_avg': row['temperature_sum'] / row['count'],
+        'humidity_min': row['humidity_min'],
+        'humidity_max': row['humidity_max'],
+        'humidity_avg': row['humidity_sum'] / row['count'],
+    }
+
+
+def aggregate_fleet_series(sensor_ids, bucket, timestamp_from=None, timestamp_to=None):
+    """
+    ``aggregate_series`` for many sensors at once, as {sensor_id: series}.
+
+    Costs one grouped query over the rollup tier and one over raw readings (or
+    over raw readings and archived chunks when no tier covers the range) no
+    matter how many sensors are asked for. Sensors without readings in the
+    range get an empty series.
+    """
+    series = {sensor_id: [] for sensor_id in sensor_ids}
+    if not series:
+        return series
+    seconds = BUCKET_SECONDS[bucket]
+    raw = Reading.objects.filter(sensor_id__in=series)
+    if timestamp_from:
+        raw = raw.filter(timestamp__gte=timestamp_from)
+    if timestamp_to:
+        raw = raw.filter(timestamp__lte=timestamp_to)
+
+    # Per sensor, the first bucket that comes from raw readings (None: all of them)
+    raw_from = {}
+    tier, model = pick_tier(bucket, timestamp_from)
+    if model is not None:
+        rolled = model.objects.filter(sensor_id__in=series)
+        if timestamp_from:
+            rolled = rolled.filter(bucket__gte=_floor(timestamp_from, seconds))
+        if timestamp_to:
+            rolled = rolled.filter(bucket__lte=timestamp_to)
+        rows = list(_rollup_buckets(rolled, seconds).order_by('sensor_id', 'start'))
+        # The newest rolled bucket may still be filling up, so it comes from raw readings
+        for row in rows:
+            raw_from[row['sensor_id']] = row['start']
+        for row in rows:
+            if row['start'] < raw_from[row['sensor_id']]:
+                series[row['sensor_id']].append(_point(row))
+
+    # Sensors rolled up to the same bucket share one condition
+    sensors_by_start = defaultdict(list)
+    for sensor_id in series:
+        sensors_by_start[raw_from.get(sensor_id)].append(sensor_id)
+    condition = Q()
+    for start, ids in sensors_by_start.items():
+        condition |= Q(sensor_id__in=ids, timestamp__gte=start) if start else Q(sensor_id__in=ids)
+    rows = _raw_buckets(raw.filter(condition), seconds).order_by('sensor_id', 'start')
+    if model is None:
+        rows = _with_archived(rows, list(series), seconds, timestamp_from, timestamp_to)
+    for row in rows:
+        series[row['sensor_id']].append(_point(row))
+    return series
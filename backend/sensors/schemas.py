@@ -1,6 +1,8 @@
-from ninja import Schema
+from ninja import Schema, Field
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Dict, List, Literal, Optional
+from pydantic import FiniteFloat, StringConstraints, model_validator
+from .ingest import MAX_BULK_READINGS
 
 # Auth Schemas
 class UserRegisterSchema(Schema):
@@ -37,6 +39,20 @@ class SensorUpdateSchema(Schema):
     description: Optional[str] = None
 
 # Reading Schemas 
+class IngestKeyIn(Schema):
+    name: str = Field('', max_length=100)
+
+class IngestKeyOut(Schema):
+    id: int
+    name: str
+    prefix: str
+    created_at: datetime
+    revoked_at: Optional[datetime] = None
+
+class IngestKeyCreatedOut(IngestKeyOut):
+    # Only returned when the key is created; the server keeps its hash
+    key: str
+
 class ReadingIn(Schema):
     temperature: float
     humidity: float
@@ -46,4 +62,138 @@ class ReadingOut(Schema):
     id: int
     temperature: float
     humidity: float
-    timestamp: datetime
\ No newline at end of file
+    timestamp: datetime
+
+class SensorReadingOut(ReadingOut):
+    sensor_id: int
+
+class ReadingQueuedOut(Schema):
+    sensor_id: int
+    timestamp: datetime
+    status: str
+
+class ReadingBulkIn(Schema):
+    readings: List[ReadingIn] = Field(..., min_length=1, max_length=MAX_BULK_READINGS)
+
+class SensorReadingIn(ReadingIn):
+    sensor_id: int
+
+class MultiSensorReadingBulkIn(Schema):
+    readings: List[SensorReadingIn] = Field(..., min_length=1, max_length=MAX_BULK_READINGS)
+
+class ReadingConflictOut(Schema):
+    index: int
+    sensor_id: int
+    timestamp: datetime
+    detail: str
+
+class ReadingBulkOut(Schema):
+    created: int
+    updated: int
+    duplicates: int
+    conflicts: List[ReadingConflictOut]
+
+class IngestBufferStatsOut(Schema):
+    enabled: bool
+    depth: int
+    max_depth: int
+    enqueued: int
+    flushed: int
+    dropped: int
+    rejected: int
+    flushes: int
+    last_flush_seconds: float
+    max_flush_seconds: float
+    avg_flush_seconds: float
+
+class ReadingBucketOut(Schema):
+    bucket: datetime
+    count: int
+    temperature_min: float
+    temperature_max: float
+    temperature_avg: float
+    humidity_min: float
+    humidity_max: float
+    humidity_avg: float
+
+class SensorSeriesOut(Schema):
+    sensor_id: int
+    buckets: List[ReadingBucketOut]
+
+# Measurement Schemas
+MetricName = Annotated[str, StringConstraints(pattern=r'^[a-z][a-z0-9_]*$', max_length=50)]
+
+class MeasurementIn(Schema):
+    timestamp: datetime
+    values: Dict[MetricName, FiniteFloat] = Field(..., min_length=1)
+
+class MeasurementBulkIn(Schema):
+    measurements: List[MeasurementIn] = Field(..., min_length=1, max_length=MAX_BULK_READINGS)
+
+    @model_validator(mode='after')
+    def check_value_count(self):
+        if sum(len(row.values) for row in self.measurements) > MAX_BULK_READINGS:
+            raise ValueError(f"At most {MAX_BULK_READINGS} values per request")
+        return self
+
+class MeasurementOut(Schema):
+    metric: str = Field(..., alias='metric_name')
+    timestamp: datetime
+    value: float
+
+class MeasurementConflictOut(Schema):
+    index: int
+    metric: str
+    timestamp: datetime
+    detail: str
+
+class MeasurementBulkOut(Schema):
+    created: int
+    conflicts: List[MeasurementConflictOut]
+
+class MeasurementBucketOut(Schema):
+    metric: str = Field(..., alias='metric_name')
+    bucket: datetime
+    count: int
+    min: float
+    max: float
+    avg: float
+
+# Alert Schemas
+class AlertRuleIn(Schema):
+    kind: Literal['threshold', 'rate_of_change', 'zscore']
+    metric: Literal['temperature', 'humidity']
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    max_rate: Optional[float] = Field(None, gt=0)
+    window: int = Field(20, ge=2, le=1000)
+    z_threshold: float = Field(3.0, gt=0)
+
+    @model_validator(mode='after')
+    def check_kind_settings(self):
+        if self.kind == 'threshold' and self.min_value is None and self.max_value is None:
+            raise ValueError("Threshold rules need min_value and/or max_value")
+        if self.kind == 'rate_of_change' and self.max_rate is None:
+            raise ValueError("Rate of change rules need max_rate")
+        return self
+
+class AlertRuleOut(Schema):
+    id: int
+    kind: str
+    metric: str
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    max_rate: Optional[float] = None
+    window: int
+    z_threshold: float
+    is_active: bool
+    created_at: datetime
+
+class AlertEventOut(Schema):
+    id: int
+    rule_id: int
+    sensor_id: int
+    timestamp: datetime
+    value: float
+    detail: str
+    created_at: datetime
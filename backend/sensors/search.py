@@ -0,0 +1,61 @@
+"""
+Ranked text search over a user's sensors.
+
+On PostgreSQL the ``q`` filter is served by the ``pg_trgm`` GIN indexes created
+in migration 0008. They are built on ``UPPER(column)``, the expression Django
+compares against for ``icontains``, so the substring match stays an index scan
+instead of a sequential ``ILIKE '%...%'``. Names also match on trigram word
+similarity, which tolerates typos ("thermostta"), and results are ranked by
+how closely the name, model (at 0.8 weight) and description (at half weight)
+resemble ``q``, so a name match outranks an equally close model match.
+
+Other databases keep the plain substring match, ranked by where it matched.
+"""
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest, Upper
+
+# Weight of a model and a description match relative to one on the name
+MODEL_WEIGHT = 0.8
+DESCRIPTION_WEIGHT = 0.5
+
+
+def _substring_match(q):
+    return (
+        Q(name__icontains=q)
+        | Q(model__icontains=q)
+        | Q(description__icontains=q)
+    )
+
+
+def _postgres_search(queryset, q):
+    queryset = queryset.annotate(
+        rank=Greatest(
+            TrigramWordSimilarity(q, 'name'),
+            TrigramWordSimilarity(q, 'model') * MODEL_WEIGHT,
+            Coalesce(TrigramWordSimilarity(q, 'description'), Value(0.0)) * DESCRIPTION_WEIGHT,
+        ),
+    )
+    similar_name = TrigramWordSimilar(Upper('name'), q.upper())
+    return queryset.filter(_substring_match(q) | Q(similar_name))
+
+
+def _fallback_search(queryset, q):
+    queryset = queryset.filter(_substring_match(q))
+    return queryset.annotate(rank=Case(
+        When(name__iexact=q, then=Value(1.0)),
+        When(name__istartswith=q, then=Value(0.75)),
+        When(Q(name__icontains=q) | Q(model__iexact=q), then=Value(0.5)),
+        When(model__icontains=q, then=Value(0.4)),
+        default=Value(0.4 * DESCRIPTION_WEIGHT),
+        output_field=FloatField(),
+    ))
+
+
+def search_sensors(queryset, q):
+    """Sensors of ``queryset`` matching ``q``, annotated with a ``rank`` between 0 and 1"""
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, q)
+    return _fallback_search(queryset, q)
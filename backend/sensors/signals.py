@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .auth import ingest_key_cache, token_cache
+from .models import IngestKey, Sensor, SensorStats
+from .partitions import ensure_partitions
+from .response_cache import invalidate_sensor, invalidate_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    """Drop cached tokens and ingest keys so deactivated or deleted users are re-checked"""
+    token_cache.invalidate(instance.pk)
+    invalidate_user(instance.pk)
+    # A deleted user's keys are deleted with their sensors and dropped by invalidate_cached_ingest_key
+    if not instance.is_active:
+        for key_id in IngestKey.objects.filter(sensor__owner_id=instance.pk).values_list('pk', flat=True):
+            ingest_key_cache.invalidate(key_id)
+
+
+@receiver(post_delete, sender=IngestKey)
+def invalidate_cached_ingest_key(sender, instance, **kwargs):
+    """Keys of a deleted sensor go with it; stop accepting them in this process"""
+    ingest_key_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Sensor)
+def create_sensor_stats(sender, instance, created, raw=False, **kwargs):
+    """Every sensor starts with an empty stats row that ingestion keeps updated"""
+    if created and not raw:
+        SensorStats.objects.create(sensor=instance, owner_id=instance.owner_id)
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def invalidate_sensor_responses(sender, instance, raw=False, **kwargs):
+    """Cached sensor lists, model lists and details change with every sensor write"""
+    if not raw:
+        invalidate_sensor(instance)
+
+
+def create_future_partitions(sender, **kwargs):
+    """Keep upcoming monthly reading partitions in place after every migrate"""
+    ensure_partitions()
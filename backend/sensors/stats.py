@@ -0,0 +1,137 @@
+from collections import defaultdict
+from django.db.models import Case, Count, F, Max, Min, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from .archive import archived_stats, newest_archived_reading
+from .models import Reading, Sensor, SensorStats
+
+STATS_FIELDS = [
+    'readings_count', 'first_reading_timestamp', 'last_reading_timestamp',
+    'last_temperature', 'last_humidity', 'min_temperature', 'max_temperature',
+    'min_humidity', 'max_humidity',
+]
+
+
+def _value(field_name, value):
+    return Value(value, output_field=SensorStats._meta.get_field(field_name))
+
+
+def _lowest(field_name, value):
+    return Least(Coalesce(F(field_name), _value(field_name, value)), _value(field_name, value))
+
+
+def _highest(field_name, value):
+    return Greatest(Coalesce(F(field_name), _value(field_name, value)), _value(field_name, value))
+
+
+def record_readings(readings, inserted=True):
+    """
+    Fold newly inserted readings into their sensors' SensorStats rows.
+
+    Each sensor gets a single UPDATE whose right-hand sides only reference the
+    old row, so concurrent ingestion into the same sensor stays consistent.
+    Pass ``inserted=False`` for readings whose values were overwritten: they
+    refresh the latest values and widen min/max without being counted again.
+    """
+    by_sensor = defaultdict(list)
+    for reading in readings:
+        by_sensor[reading.sensor_id].append(reading)
+
+    missing = []
+    for sensor_id, sensor_readings in by_sensor.items():
+        latest = max(sensor_readings, key=lambda reading: reading.timestamp)
+        first_timestamp = min(reading.timestamp for reading in sensor_readings)
+        temperatures = [reading.temperature for reading in sensor_readings]
+        humidities = [reading.humidity for reading in sensor_readings]
+        is_latest = Q(last_reading_timestamp__isnull=True) | Q(last_reading_timestamp__lte=latest.timestamp)
+
+        updated = SensorStats.objects.filter(sensor_id=sensor_id).update(
+            readings_count=F('readings_count') + (len(sensor_readings) if inserted else 0),
+            first_reading_timestamp=_lowest('first_reading_timestamp', first_timestamp),
+            last_reading_timestamp=_highest('last_reading_timestamp', latest.timestamp),
+            last_temperature=Case(
+                When(is_latest, then=_value('last_temperature', latest.temperature)),
+                default=F('last_temperature')
+            ),
+            last_humidity=Case(
+                When(is_latest, then=_value('last_humidity', latest.humidity)),
+                default=F('last_humidity')
+            ),
+            min_temperature=_lowest('min_temperature', min(temperatures)),
+            max_temperature=_highest('max_temperature', max(temperatures)),
+            min_humidity=_lowest('min_humidity', min(humidities)),
+            max_humidity=_highest('max_humidity', max(humidities)),
+        )
+        if not updated:
+            missing.append(sensor_id)
+
+    if missing:
+        rebuild_sensor_stats(missing)
+
+
+def _combine(totals, archived):
+    """Merge the aggregates of stored readings with those of archived chunks"""
+    combined = {'readings_count': totals['readings_count'] + archived['readings_count']}
+    for field, pick in (
+        ('first_reading_timestamp', min), ('last_reading_timestamp', max),
+        ('min_temperature', min), ('max_temperature', max),
+        ('min_humidity', min), ('max_humidity', max),
+    ):
+        values = [value for value in (totals[field], archived[field]) if value is not None]
+        combined[field] = pick(values) if values else None
+    return combined
+
+
+def compute_sensor_stats(sensor_id, owner_id):
+    """Compute a SensorStats row for one sensor from its stored and archived readings"""
+    readings = Reading.objects.filter(sensor_id=sensor_id)
+    totals = readings.order_by().aggregate(
+        readings_count=Count('id'),
+        first_reading_timestamp=Min('timestamp'),
+        last_reading_timestamp=Max('timestamp'),
+        min_temperature=Min('temperature'),
+        max_temperature=Max('temperature'),
+        min_humidity=Min('humidity'),
+        max_humidity=Max('humidity'),
+    )
+    latest = readings.order_by('-timestamp').values('temperature', 'humidity').first() or {}
+    archived = archived_stats(sensor_id)
+    if archived.pop('chunks'):
+        newest_stored = totals['last_reading_timestamp']
+        totals = _combine(totals, archived)
+        if newest_stored is None or newest_stored < totals['last_reading_timestamp']:
+            latest = newest_archived_reading(sensor_id)._asdict()
+    return SensorStats(
+        sensor_id=sensor_id,
+        owner_id=owner_id,
+        last_temperature=latest.get('temperature'),
+        last_humidity=latest.get('humidity'),
+        **totals
+    )
+
+
+def rebuild_sensor_stats(sensor_ids=None, batch_size=500):
+    """Recompute stats from the readings table; returns the number of sensors rebuilt"""
+    sensors = Sensor.objects.order_by('id')
+    if sensor_ids is not None:
+        sensors = sensors.filter(id__in=sensor_ids)
+
+    rebuilt = 0
+    batch = []
+    for sensor_id, owner_id in sensors.values_list('id', 'owner_id').iterator():
+        batch.append(compute_sensor_stats(sensor_id, owner_id))
+        if len(batch) >= batch_size:
+            rebuilt += _save_stats(batch)
+            batch = []
+    if batch:
+        rebuilt += _save_stats(batch)
+    return rebuilt
+
+
+def _save_stats(batch):
+    SensorStats.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['sensor'],
+        update_fields=STATS_FIELDS
+    )
+    return len(batch)
@@ -0,0 +1,97 @@
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+import pytest
+import json
+from django.contrib.auth.models import User
+from django.test import Client
+from sensors.models import Sensor, AlertRule, AlertEvent
+
+def get_token(client, email, password):
+    response = client.post('/api/auth/token/', {
+        "email": email, "password": password
+    }, content_type='application/json')
+    return json.loads(response.content)['access']
+
+def bulk_readings(temperatures, hour=10):
+    return {"readings": [
+        {"temperature": temperature, "humidity": 50.0, "timestamp": f"2024-01-01T{hour:02d}:{minute:02d}:00Z"}
+        for minute, temperature in enumerate(temperatures)
+    ]}
+
+@pytest.mark.django_db
+def test_threshold_rule_creates_alert_events():
+    """Test a threshold rule fires on out-of-range readings and the events are listed"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    
+    response = client.post(f'/api/sensors/{sensor.id}/alert-rules/', {
+        "kind": "threshold", "metric": "temperature", "max_value": 30
+    }, content_type='application/json', **headers)
+    assert response.status_code == 200
+    
+    client.post(f'/api/sensors/{sensor.id}/readings/', {
+        "temperature": 31.5, "humidity": 50.0, "timestamp": "2024-01-01T09:00:00Z"
+    }, content_type='application/json', **headers)
+    client.post(f'/api/sensors/{sensor.id}/readings/bulk/', bulk_readings([25, 35, 29]),
+                content_type='application/json', **headers)
+    
+    response = client.get(f'/api/sensors/{sensor.id}/alerts/', **headers)
+    data = response.json()
+    assert data['count'] == 2
+    assert [item['value'] for item in data['items']] == [35.0, 31.5]
+    assert 'above 30' in data['items'][0]['detail']
+    
+    response = client.get('/api/sensors/alerts/events/', **headers)
+    assert response.json()['count'] == 2
+
+@pytest.mark.django_db
+def test_rate_of_change_and_zscore_rules_use_rolling_state():
+    """Test stateful rules carry their state across ingestion batches"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    rate_rule = AlertRule.objects.create(sensor=sensor, kind='rate_of_change', metric='temperature', max_rate=2)
+    zscore_rule = AlertRule.objects.create(sensor=sensor, kind='zscore', metric='temperature', window=5, z_threshold=3)
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    
+    client.post(f'/api/sensors/{sensor.id}/readings/bulk/', bulk_readings([20, 20.5, 20, 20.5, 20]),
+                content_type='application/json', **headers)
+    assert not AlertEvent.objects.exists()
+    
+    client.post(f'/api/sensors/{sensor.id}/readings/bulk/', bulk_readings([20.5, 26], hour=11),
+                content_type='application/json', **headers)
+    
+    assert AlertEvent.objects.filter(rule=zscore_rule).get().value == 26
+    assert AlertEvent.objects.filter(rule=rate_rule).get().value == 26
+    zscore_rule.refresh_from_db()
+    assert len(zscore_rule.window_values) == 5
+    assert zscore_rule.window_sum == pytest.approx(20 + 20.5 + 20 + 20.5 + 26)
+
+@pytest.mark.django_db
+def test_alert_rule_validation_and_ownership():
+    """Test incomplete rules are rejected and other users' sensors are off limits"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    other = User.objects.create_user(email="other@example.com", username="other", password="test123")
+    sensor = Sensor.objects.create(owner=other, name="test-sensor", model="TestModel")
+    own_sensor = Sensor.objects.create(owner=user, name="own-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    
+    response = client.post(f'/api/sensors/{own_sensor.id}/alert-rules/', {
+        "kind": "rate_of_change", "metric": "humidity"
+    }, content_type='application/json', **headers)
+    assert response.status_code == 422
+    
+    response = client.post(f'/api/sensors/{sensor.id}/alert-rules/', {
+        "kind": "threshold", "metric": "humidity", "min_value": 10
+    }, content_type='application/json', **headers)
+    assert response.status_code == 404
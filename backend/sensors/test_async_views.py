@@ -0,0 +1,178 @@
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+import pytest
+import asyncio
+import json
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+from ninja.testing import TestAsyncClient
+from sensors.async_views import sensors_router, readings_router, alerts_router
+from sensors.auth import create_tokens, async_jwt_query_auth
+from sensors.ingest import ingest_readings
+from sensors.live import LIVE_CHANNEL, broker, live_response
+from sensors.models import Sensor, Reading
+from sensors.schemas import ReadingIn
+
+def auth_headers(user):
+    access_token, _ = create_tokens(user)
+    return {"Authorization": f"Bearer {access_token}"}
+
+@pytest.mark.django_db
+def test_async_sensor_list():
+    """Test the async sensors router lists the user's sensors with stats"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    for i in range(8):
+        Sensor.objects.create(owner=user, name=f"sensor-{i}", model="TestModel")
+    client = TestAsyncClient(sensors_router)
+    
+    response = async_to_sync(client.get)('/', headers=auth_headers(user))
+    
+    assert response.status_code == 200
+    assert response.data['count'] == 8
+    assert len(response.data['items']) == 6
+    assert response.data['items'][0]['readings_count'] == 0
+
+@pytest.mark.django_db
+def test_async_reading_ingestion_and_listing():
+    """Test readings created through the async router are listed back"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = TestAsyncClient(readings_router)
+    headers = auth_headers(user)
+    
+    response = async_to_sync(client.post)(f'/{sensor.id}/readings/', json={
+        "temperature": 23.5, "humidity": 65.0, "timestamp": "2024-01-01T10:00:00Z"
+    }, headers=headers)
+    assert response.status_code == 201
+    
+    response = async_to_sync(client.post)('/readings/bulk/', json={"readings": [
+        {"sensor_id": sensor.id, "temperature": 24.0, "humidity": 60.0, "timestamp": "2024-01-01T11:00:00Z"},
+        {"sensor_id": sensor.id, "temperature": 24.0, "humidity": 60.0, "timestamp": "2024-01-01T10:00:00Z"},
+    ]}, headers=headers)
+    assert (response.data['created'], response.data['duplicates']) == (1, 1)
+    assert response.data['conflicts'] == []
+    
+    response = async_to_sync(client.get)(f'/{sensor.id}/readings/cursor/', headers=headers)
+    assert [item['temperature'] for item in response.data['items']] == [24.0, 23.5]
+    assert Reading.objects.filter(sensor=sensor).count() == 2
+
+@pytest.mark.django_db
+def test_async_router_rejects_other_users_sensor():
+    """Test async views enforce sensor ownership"""
+    owner = User.objects.create_user(email="owner@example.com", username="owner", password="test123")
+    other = User.objects.create_user(email="other@example.com", username="other", password="test123")
+    sensor = Sensor.objects.create(owner=owner, name="test-sensor", model="TestModel")
+    client = TestAsyncClient(readings_router)
+    
+    response = async_to_sync(client.get)(f'/{sensor.id}/readings/', headers=auth_headers(other))
+    
+    assert response.status_code == 404
+
+@pytest.mark.django_db
+def test_live_readings_stream(settings):
+    """Test the SSE stream pushes coalesced updates for the subscribed sensors only"""
+    settings.LIVE_READINGS_MIN_INTERVAL = 0
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    other = Sensor.objects.create(owner=user, name="other-sensor", model="TestModel")
+
+    async def scenario():
+        response = live_response({sensor.id})
+        stream = response.streaming_content
+        frames = [await anext(stream)]
+        broker.publish([
+            {"sensor_id": other.id, "timestamp": "2024-01-01T10:00:00+00:00", "temperature": 1.0, "humidity": 1.0, "count": 1},
+            {"sensor_id": sensor.id, "timestamp": "2024-01-01T10:00:00+00:00", "temperature": 20.0, "humidity": 50.0, "count": 1},
+            {"sensor_id": sensor.id, "timestamp": "2024-01-01T10:01:00+00:00", "temperature": 21.0, "humidity": 51.0, "count": 2},
+        ])
+        frames.append(await anext(stream))
+        await stream.aclose()
+        return response, frames
+
+    response, frames = async_to_sync(scenario)()
+    
+    assert response['Content-Type'] == 'text/event-stream'
+    assert frames[0].startswith(b'retry:')
+    event, data = frames[1].decode().strip().split('\n')
+    assert event == 'event: readings'
+    assert json.loads(data[len('data: '):]) == [{
+        "sensor_id": sensor.id, "timestamp": "2024-01-01T10:01:00+00:00",
+        "temperature": 21.0, "humidity": 51.0, "count": 3
+    }]
+
+@pytest.mark.django_db
+def test_live_readings_token_query_auth():
+    """Test EventSource clients can authenticate with ?token="""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    access_token, _ = create_tokens(user)
+    
+    assert async_to_sync(async_jwt_query_auth)(RequestFactory().get(f'/?token={access_token}')) == user
+    assert async_to_sync(async_jwt_query_auth)(RequestFactory().get('/?token=invalid')) is None
+
+def listener_ready():
+    """Whether the broker's LISTEN connection is up; other databases have none to wait for"""
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_stat_activity WHERE datname = current_database() AND query = %s",
+            [f'LISTEN {LIVE_CHANNEL}']
+        )
+        return cursor.fetchone() is not None
+
+@pytest.mark.django_db(transaction=True)
+def test_ingestion_publishes_after_commit(settings):
+    """Test ingested readings reach live subscribers once the transaction commits"""
+    settings.LIVE_READINGS = True
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    rows = [
+        (sensor.id, ReadingIn(temperature=20 + i, humidity=50, timestamp=f"2024-01-01T10:0{i}:00Z"))
+        for i in range(3)
+    ]
+
+    async def scenario():
+        subscription = broker.subscribe({sensor.id})
+        try:
+            for _ in range(100):
+                if await sync_to_async(listener_ready)():
+                    break
+                await asyncio.sleep(0.05)
+            await sync_to_async(ingest_readings)(rows, allowed_sensor_ids={sensor.id})
+            return await subscription.next_batch(timeout=5)
+        finally:
+            subscription.close()
+
+    batch = async_to_sync(scenario)()
+    
+    assert batch == [{
+        "sensor_id": sensor.id, "timestamp": "2024-01-01T10:02:00+00:00",
+        "temperature": 22.0, "humidity": 50.0, "count": 3
+    }]
+
+@pytest.mark.django_db
+def test_async_alert_rules_and_events():
+    """Test alert rules created through the async router fire on ingestion"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    alerts = TestAsyncClient(alerts_router)
+    readings = TestAsyncClient(readings_router)
+    headers = auth_headers(user)
+    
+    response = async_to_sync(alerts.post)(f'/{sensor.id}/alert-rules/', json={
+        "kind": "threshold", "metric": "humidity", "min_value": 20
+    }, headers=headers)
+    assert response.status_code == 200
+    async_to_sync(readings.post)(f'/{sensor.id}/readings/', json={
+        "temperature": 21.0, "humidity": 15.0, "timestamp": "2024-01-01T10:00:00Z"
+    }, headers=headers)
+    
+    response = async_to_sync(alerts.get)('/alerts/events/', headers=headers)
+    assert response.data['count'] == 1
+    assert response.data['items'][0]['value'] == 15.0
@@ -5,8 +5,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
 import pytest
+import json
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from sensors.auth import token_cache
+from sensors.models import Sensor, Reading
 
 @pytest.mark.django_db
 def test_register():
@@ -39,4 +44,89 @@ def test_protected_endpoint_rejection():
     """Test protected endpoint rejects unauthenticated requests"""
     client = Client()
     response = client.get('/api/sensors/')
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def get_token(client, email, password):
+    response = client.post('/api/auth/token/', {
+        "email": email, "password": password
+    }, content_type='application/json')
+    return json.loads(response.content)['access']
+
+@pytest.mark.django_db
+def test_cached_token_invalidated_on_deactivation(settings, django_assert_num_queries):
+    """Test cached tokens skip the user query until the user is deactivated"""
+    settings.RESPONSE_CACHE_TIMEOUT = 0
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    assert client.get('/api/sensors/models/', HTTP_AUTHORIZATION=f'Bearer {token}').status_code == 200
+    with django_assert_num_queries(1):
+        response = client.get('/api/sensors/models/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 200
+    
+    user.is_active = False
+    user.save()
+    
+    response = client.get('/api/sensors/models/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 401
+
+@pytest.mark.django_db
+def test_trusted_claims_skip_user_query(settings, django_assert_num_queries):
+    """Test signed claims authenticate without reading the user row"""
+    settings.JWT_TRUST_CLAIMS = True
+    token_cache.clear()
+    User.objects.create_user(email="test@example.com", username="test", password="test123")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    # Only the sensor models query itself runs
+    with django_assert_num_queries(1):
+        response = client.get('/api/sensors/models/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 200
+
+@pytest.mark.django_db
+def test_ingest_key_writes_one_sensor_until_revoked():
+    """Test ingest keys write readings without auth queries once cached, and stop when revoked"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    other = Sensor.objects.create(owner=user, name="other-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    
+    response = client.post(f'/api/sensors/{sensor.id}/ingest-keys/', {"name": "gateway"}, content_type='application/json', **headers)
+    assert response.status_code == 200
+    created = response.json()
+    assert created['key'].startswith(created['prefix'])
+    key_headers = {'HTTP_X_INGEST_KEY': created['key']}
+    
+    def post_reading(sensor_id, minute):
+        return client.post(f'/api/sensors/{sensor_id}/readings/', {
+            "temperature": 21.5, "humidity": 40.0, "timestamp": f"2024-01-01T10:{minute:02d}:00Z"
+        }, content_type='application/json', **key_headers)
+    
+    assert post_reading(sensor.id, 0).status_code == 201
+    with CaptureQueriesContext(connection) as queries:
+        assert post_reading(sensor.id, 1).status_code == 201
+    assert not [query for query in queries if 'sensors_ingestkey' in query['sql'] or 'FROM "sensors_sensor"' in query['sql']]
+    assert Reading.objects.filter(sensor=sensor).count() == 2
+    
+    assert post_reading(other.id, 2).status_code == 404
+    assert client.get(f'/api/sensors/{sensor.id}/readings/', **key_headers).status_code == 401
+    
+    listed = client.get(f'/api/sensors/{sensor.id}/ingest-keys/', **headers).json()
+    assert [(key['prefix'], key['revoked_at']) for key in listed] == [(created['prefix'], None)]
+    assert 'key' not in listed[0]
+    
+    user.is_active = False
+    user.save()
+    assert post_reading(sensor.id, 3).status_code == 401
+    user.is_active = True
+    user.save()
+    assert post_reading(sensor.id, 3).status_code == 201
+    
+    response = client.delete(f'/api/sensors/{sensor.id}/ingest-keys/{created["id"]}/', **headers)
+    assert response.status_code == 200
+    assert post_reading(sensor.id, 4).status_code == 401
+    assert client.get(f'/api/sensors/{sensor.id}/ingest-keys/', **headers).json()[0]['revoked_at'] is not None
@@ -0,0 +1,100 @@
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+import pytest
+import json
+from io import BytesIO
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from sensors.auth import create_ingest_key, create_tokens
+from sensors.fastpath import IngestASGIHandler, IngestWSGIHandler
+from sensors.models import Sensor, SensorStats, Reading
+
+def wsgi_post(path, body, key, query=''):
+    body = json.dumps(body).encode()
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.input': BytesIO(body),
+    }
+    if key:
+        environ['HTTP_X_INGEST_KEY'] = key
+    started = []
+    chunks = IngestWSGIHandler()(environ, lambda status, headers: started.append(status))
+    return int(started[0].split()[0]), json.loads(b''.join(chunks))
+
+@pytest.mark.django_db
+def test_wsgi_fast_path_matches_api(monkeypatch):
+    """Test the WSGI ingestion app stores readings and answers like the API route"""
+    # The test's transaction holds the connection, so keep it open like Django's test client does
+    monkeypatch.setattr('sensors.fastpath.close_old_connections', lambda: None)
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    other = Sensor.objects.create(owner=user, name="other-sensor", model="TestModel")
+    _, key = create_ingest_key(sensor)
+    token, _ = create_tokens(user)
+    
+    status, body = wsgi_post(f'/api/sensors/{sensor.id}/readings/', {
+        "temperature": 21.456, "humidity": 40.0, "timestamp": "2024-01-01T10:00:00.123456Z"
+    }, key)
+    assert status == 201
+    api = Client().post(
+        f'/api/sensors/{sensor.id}/readings/',
+        {"temperature": 21.456, "humidity": 40.0, "timestamp": "2024-01-01T10:00:00.123456Z"},
+        content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}'
+    )
+    assert api.status_code == 200
+    assert api.json() == body
+    
+    status, body = wsgi_post(f'/api/sensors/{sensor.id}/readings/bulk/', {"readings": [
+        {"temperature": 22.0, "humidity": 41.0, "timestamp": "2024-01-01T10:00:00.123456Z"},
+        {"temperature": 23.0, "humidity": 42.0, "timestamp": "2024-01-01T11:00:00Z"},
+        {"temperature": 1000, "humidity": 42.0, "timestamp": "2024-01-01T12:00:00Z"},
+    ]}, key, query='on_conflict=overwrite')
+    assert status == 200
+    assert (body['created'], body['updated'], body['duplicates']) == (1, 1, 0)
+    assert [conflict['index'] for conflict in body['conflicts']] == [2]
+    assert list(Reading.objects.filter(sensor=sensor).order_by('timestamp').values_list('temperature', flat=True)) == [22.0, 23.0]
+    
+    status, body = wsgi_post(f'/api/sensors/{sensor.id}/readings/', {"temperature": "warm", "timestamp": "2024-01-01T13:00:00Z"}, key)
+    assert status == 422
+    assert {tuple(error['loc']) for error in body['detail']} == {('body', 'data', 'temperature'), ('body', 'data', 'humidity')}
+    assert wsgi_post(f'/api/sensors/{other.id}/readings/', {}, key)[0] == 404
+    assert wsgi_post(f'/api/sensors/{sensor.id}/readings/', {}, None)[0] == 401
+    assert wsgi_post(f'/api/sensors/{sensor.id}/', {}, key)[0] == 404
+
+@pytest.mark.django_db(transaction=True)
+def test_asgi_fast_path_stores_reading(monkeypatch):
+    """Test the ASGI ingestion app reads a chunked body and stores the reading"""
+    # Requests run in pool threads; don't let them keep connections to the test database
+    monkeypatch.setitem(connection.settings_dict, 'CONN_MAX_AGE', 0)
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    _, key = create_ingest_key(sensor)
+    body = json.dumps({"temperature": 21.5, "humidity": 40.0, "timestamp": "2024-01-01T10:00:00Z"}).encode()
+    messages = [
+        {'type': 'http.request', 'body': body[:10], 'more_body': True},
+        {'type': 'http.request', 'body': body[10:]},
+    ]
+    sent = []
+    
+    async def receive():
+        return messages.pop(0)
+    
+    async def send(message):
+        sent.append(message)
+    
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': f'/api/sensors/{sensor.id}/readings/',
+        'query_string': b'', 'headers': [(b'x-ingest-key', key.encode())],
+    }
+    async_to_sync(IngestASGIHandler())(scope, receive, send)
+    
+    assert sent[0]['status'] == 201
+    reading = Reading.objects.get(sensor=sensor)
+    assert json.loads(sent[1]['body']) == {"id": reading.id, "temperature": 21.5, "humidity": 40.0, "timestamp": "2024-01-01T10:00:00Z"}
+    assert SensorStats.objects.get(sensor=sensor).readings_count == 1
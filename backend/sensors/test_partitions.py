@@ -0,0 +1,41 @@
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from sensors.models import Sensor, Reading, SensorStats
+from sensors.partitions import add_months, month_starts, partition_name
+
+def test_month_helpers():
+    """Test monthly partition ranges roll over year boundaries"""
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert list(month_starts(date(2024, 12, 15), date(2025, 2, 3))) == [
+        date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)
+    ]
+    assert partition_name(date(2025, 1, 1)) == "sensors_reading_p2025_01"
+
+@pytest.mark.django_db
+def test_prune_readings_removes_expired_rows():
+    """Test retention removes old readings and refreshes sensor stats"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    for timestamp in [timezone.make_aware(datetime(2020, 1, 1)), timezone.now()]:
+        Reading.objects.create(
+            sensor=sensor,
+            timestamp=timestamp,
+            temperature=Decimal('20.0'),
+            humidity=Decimal('60.0')
+        )
+    
+    call_command('prune_readings', '--older-than-days', '365', stdout=StringIO())
+    
+    assert Reading.objects.filter(sensor=sensor).count() == 1
+    assert SensorStats.objects.get(sensor=sensor).readings_count == 1
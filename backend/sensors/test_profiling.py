@@ -0,0 +1,49 @@
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+import pytest
+import json
+from django.contrib.auth.models import User
+from django.test import Client
+from backend.urls import api
+from sensors.models import Sensor
+from sensors.profiling import instrument_api
+
+def get_token(client, email, password):
+    response = client.post('/api/auth/token/', {
+        "email": email, "password": password
+    }, content_type='application/json')
+    return json.loads(response.content)['access']
+
+@pytest.mark.django_db
+def test_profiling_middleware_reports_timings_and_metrics(settings, tmp_path):
+    """Test profiled requests get Server-Timing headers, per-route metrics and slow-request dumps"""
+    settings.PROFILING = True
+    settings.MIDDLEWARE = ['sensors.profiling.ProfilingMiddleware', *settings.MIDDLEWARE]
+    settings.RESPONSE_CACHE_TIMEOUT = 0
+    settings.PROFILING_SAMPLE_RATE = 1.0
+    settings.PROFILING_SLOW_MS = 0
+    settings.PROFILING_DIR = str(tmp_path)
+    settings.METRICS_TOKEN = "scrape"
+    # urls.py instruments the API when it is imported, which happened with PROFILING off
+    instrument_api(api)
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    response = client.get('/api/sensors/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+    assert set(timing) == {'total', 'db', 'auth', 'serialize'}
+    assert float(timing['serialize'].removeprefix('dur=')) > 0
+    assert timing['db'].endswith('queries"') and 'desc="0 queries"' not in timing['db']
+    assert any(path.suffix == '.prof' for path in tmp_path.iterdir())
+    
+    assert client.get('/metrics').status_code == 401
+    body = client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/sensors/",status="200"}' in body
+    assert 'http_request_db_queries_bucket{method="GET",route="/api/sensors/",status="200",le="5"} 1' in body
+    assert 'ingest_buffer_depth 0' in body
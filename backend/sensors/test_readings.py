@@ -5,13 +5,22 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
 import pytest
+import gzip
 import json
 from django.contrib.auth.models import User
 from django.test import Client
-from sensors.models import Sensor, Reading
-from datetime import datetime
+from sensors.models import Sensor, Reading, ReadingChunk, DayRollup, HourRollup, Measurement, Metric
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
 from django.utils import timezone
+from django.core.management import call_command
+from io import StringIO
+from sensors.columnar import COLUMNAR_CONTENT_TYPE, unpack_blocks
+from sensors import buffer, measurements
+from sensors.buffer import ingest_buffer
+from sensors.measurements import MAX_NEW_METRICS
+from sensors.schemas import ReadingIn
+from sensors.stats import rebuild_sensor_stats
 
 def get_token(client, email, password):
     response = client.post('/api/auth/token/', {
@@ -33,7 +42,7 @@ def test_create_reading():
         "timestamp": "2024-01-01T10:00:00Z"
     }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
     
-    assert response.status_code == 200
+    assert response.status_code == 201
     assert Reading.objects.filter(sensor=sensor).count() == 1
 
 @pytest.mark.django_db
@@ -93,4 +102,621 @@ def test_readings_date_filter():
     
     assert response.status_code == 200
     assert len(data['items']) == 1 
-    assert '2024-01-02' in data['items'][0]['timestamp']
\ No newline at end of file
+    assert '2024-01-02' in data['items'][0]['timestamp']
+
+@pytest.mark.django_db
+def test_bulk_create_readings_deduplicates():
+    """Test bulk reading creation counts stored and repeated timestamps as duplicates"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    Reading.objects.create(
+        sensor=sensor,
+        timestamp=timezone.make_aware(datetime(2024, 1, 1, 10, 0, 0)),
+        temperature=Decimal('20.0'),
+        humidity=Decimal('60.0')
+    )
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    response = client.post(f'/api/sensors/{sensor.id}/readings/bulk/', {
+        "readings": [
+            {"temperature": 21.0, "humidity": 61.0, "timestamp": "2024-01-01T10:00:00Z"},
+            {"temperature": 22.0, "humidity": 62.0, "timestamp": "2024-01-01T11:00:00Z"},
+            {"temperature": 23.0, "humidity": 63.0, "timestamp": "2024-01-01T11:00:00Z"},
+            {"temperature": 24.0, "humidity": 64.0, "timestamp": "2024-01-01T12:00:00Z"},
+        ]
+    }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    data = json.loads(response.content)
+    
+    assert response.status_code == 200
+    assert (data['created'], data['updated'], data['duplicates']) == (2, 0, 2)
+    assert data['conflicts'] == []
+    assert Reading.objects.filter(sensor=sensor).count() == 3
+    assert Reading.objects.get(sensor=sensor, timestamp=datetime(2024, 1, 1, 10, tzinfo=dt_timezone.utc)).temperature == 20.0
+    assert Reading.objects.get(sensor=sensor, timestamp=datetime(2024, 1, 1, 11, tzinfo=dt_timezone.utc)).temperature == 22.0
+
+@pytest.mark.django_db
+def test_reading_retries_follow_conflict_policy():
+    """Test retried readings are stored once and rewritten only as the conflict policy says"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    reading = {"temperature": 21.3, "humidity": 40.0, "timestamp": "2024-01-01T10:00:00Z"}
+    
+    first = client.post(f'/api/sensors/{sensor.id}/readings/', reading, content_type='application/json', **headers)
+    retry = client.post(f'/api/sensors/{sensor.id}/readings/', {**reading, "temperature": 25.0}, content_type='application/json', **headers)
+    assert first.status_code == 201
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    
+    overwritten = client.post(
+        f'/api/sensors/{sensor.id}/readings/?on_conflict=overwrite', {**reading, "temperature": 25.0},
+        content_type='application/json', **headers
+    )
+    assert overwritten.json() == {**first.json(), "temperature": 25.0}
+    sensor.stats.refresh_from_db()
+    assert (sensor.stats.readings_count, sensor.stats.last_temperature) == (1, Decimal('25.00'))
+    
+    batch = {"readings": [
+        {"temperature": 25.0, "humidity": 40.0, "timestamp": "2024-01-01T10:00:00Z"},
+        {"temperature": 22.0, "humidity": 41.0, "timestamp": "2024-01-01T11:00:00Z"},
+        {"temperature": 23.0, "humidity": 41.0, "timestamp": "2024-01-01T11:00:00Z"},
+    ]}
+    response = client.post(f'/api/sensors/{sensor.id}/readings/bulk/?on_conflict=overwrite', batch, content_type='application/json', **headers)
+    assert {key: response.json()[key] for key in ('created', 'updated', 'duplicates')} == {'created': 1, 'updated': 0, 'duplicates': 2}
+    assert Reading.objects.get(sensor=sensor, timestamp=datetime(2024, 1, 1, 11, tzinfo=dt_timezone.utc)).temperature == 23.0
+    
+    batch["readings"][0]["temperature"] = 26.0
+    response = client.post(f'/api/sensors/{sensor.id}/readings/bulk/?on_conflict=overwrite', batch, content_type='application/json', **headers)
+    assert {key: response.json()[key] for key in ('created', 'updated', 'duplicates')} == {'created': 0, 'updated': 1, 'duplicates': 2}
+    assert list(Reading.objects.filter(sensor=sensor).order_by('timestamp').values_list('temperature', flat=True)) == [26.0, 23.0]
+    sensor.stats.refresh_from_db()
+    assert sensor.stats.readings_count == 2
+
+@pytest.mark.django_db
+def test_bulk_create_readings_multi_sensor():
+    """Test multi-sensor bulk creation skips sensors owned by someone else"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    other = User.objects.create_user(email="other@example.com", username="other", password="test123")
+    sensor_a = Sensor.objects.create(owner=user, name="sensor-a", model="TestModel")
+    sensor_b = Sensor.objects.create(owner=user, name="sensor-b", model="TestModel")
+    foreign = Sensor.objects.create(owner=other, name="foreign", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    response = client.post('/api/sensors/readings/bulk/', {
+        "readings": [
+            {"sensor_id": sensor_a.id, "temperature": 21.0, "humidity": 61.0, "timestamp": "2024-01-01T10:00:00Z"},
+            {"sensor_id": sensor_b.id, "temperature": 22.0, "humidity": 62.0, "timestamp": "2024-01-01T10:00:00Z"},
+            {"sensor_id": foreign.id, "temperature": 23.0, "humidity": 63.0, "timestamp": "2024-01-01T10:00:00Z"},
+        ]
+    }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    data = json.loads(response.content)
+    
+    assert response.status_code == 200
+    assert data['created'] == 2
+    assert data['conflicts'][0]['index'] == 2
+    assert not Reading.objects.filter(sensor=foreign).exists()
+
+@pytest.mark.django_db
+def test_aggregate_readings_by_hour():
+    """Test readings are aggregated per time bucket"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    for minute, temperature in [(0, '20.0'), (30, '22.0'), (65, '30.0')]:
+        Reading.objects.create(
+            sensor=sensor,
+            timestamp=timezone.make_aware(datetime(2024, 1, 1, 10, 0, 0)) + timezone.timedelta(minutes=minute),
+            temperature=Decimal(temperature),
+            humidity=Decimal('50.0')
+        )
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    response = client.get(
+        f'/api/sensors/{sensor.id}/readings/aggregate/?bucket=1h&timestamp_from=2024-01-01T00:00:00Z',
+        HTTP_AUTHORIZATION=f'Bearer {token}'
+    )
+    data = json.loads(response.content)
+    
+    assert response.status_code == 200
+    assert len(data) == 2
+    assert '2024-01-01T10:00:00' in data[0]['bucket']
+    assert data[0]['count'] == 2
+    assert data[0]['temperature_min'] == 20.0
+    assert data[0]['temperature_max'] == 22.0
+    assert data[0]['temperature_avg'] == 21.0
+    assert data[1]['count'] == 1
+    
+    # Open ranges are bounded by the oldest and newest readings the sensor's stats have seen
+    Reading.objects.create(sensor=sensor, timestamp=timezone.make_aware(datetime(2025, 1, 1)), temperature=20.0, humidity=50.0)
+    rebuild_sensor_stats([sensor.id])
+    url = f'/api/sensors/{sensor.id}/readings/aggregate/?bucket=1m'
+    assert client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').status_code == 400
+    assert client.get(f'{url}&timestamp_from=2024-12-31T12:00:00Z', HTTP_AUTHORIZATION=f'Bearer {token}').status_code == 200
+    response = client.get(f'{url}&timestamp_to=2024-01-02T00:00:00Z', HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+@pytest.mark.django_db
+def test_readings_cursor_pagination():
+    """Test cursor pagination walks readings newest first in both directions"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    for hour in range(120):
+        Reading.objects.create(
+            sensor=sensor,
+            timestamp=timezone.make_aware(datetime(2024, 1, 1)) + timezone.timedelta(hours=hour),
+            temperature=Decimal('20.0'),
+            humidity=Decimal('50.0')
+        )
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    url = f'/api/sensors/{sensor.id}/readings/cursor/'
+    
+    first = json.loads(client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').content)
+    assert len(first['items']) == 50
+    assert first['previous'] is None
+    assert 'count' not in first
+    
+    second = json.loads(client.get(f"{url}?cursor={first['next']}", HTTP_AUTHORIZATION=f'Bearer {token}').content)
+    assert second['items'][0]['timestamp'] < first['items'][-1]['timestamp']
+    
+    third = json.loads(client.get(f"{url}?cursor={second['next']}", HTTP_AUTHORIZATION=f'Bearer {token}').content)
+    assert len(third['items']) == 20
+    assert third['next'] is None
+    
+    back = json.loads(client.get(f"{url}?cursor={second['previous']}", HTTP_AUTHORIZATION=f'Bearer {token}').content)
+    assert back['items'] == first['items']
+    assert back['previous'] is None
+    
+    response = client.get(f"{url}?cursor=garbage", HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 400
+
+@pytest.mark.django_db
+def test_aggregate_readings_served_from_rollups():
+    """Test aggregates use the rollup tiers once they are built"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    start = timezone.now().replace(minute=0, second=0, microsecond=0) - timezone.timedelta(hours=3)
+    for minute in range(0, 180, 10):
+        Reading.objects.create(
+            sensor=sensor,
+            timestamp=start + timezone.timedelta(minutes=minute),
+            temperature=Decimal(20 + minute // 60),
+            humidity=Decimal('50.0')
+        )
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    url = f'/api/sensors/{sensor.id}/readings/aggregate/?bucket=1h&timestamp_from={start.isoformat().replace("+00:00", "Z")}'
+    
+    raw = json.loads(client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').content)
+    call_command('build_rollups', stdout=StringIO())
+    assert HourRollup.objects.filter(sensor=sensor).count() == 3
+    
+    # Rolled-up hours no longer need the raw rows; the newest hour still comes from them
+    Reading.objects.filter(sensor=sensor, timestamp__lt=start + timezone.timedelta(hours=2)).delete()
+    rolled = json.loads(client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').content)
+    
+    assert rolled == raw
+    assert [bucket['count'] for bucket in rolled] == [6, 6, 6]
+    assert rolled[1]['temperature_avg'] == 21.0
+    
+    # A late reading for a rolled-up hour shows up after the next build_rollups pass
+    client.post(f'/api/sensors/{sensor.id}/readings/', {
+        "temperature": 27.0, "humidity": 50.0, "timestamp": (start + timezone.timedelta(minutes=5)).isoformat()
+    }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    call_command('build_rollups', stdout=StringIO())
+    rolled = json.loads(client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').content)
+    assert [bucket['count'] for bucket in rolled] == [7, 6, 6]
+    assert rolled[0]['temperature_max'] == 27.0
+
+@pytest.mark.django_db
+def test_export_readings_streams_csv_and_ndjson():
+    """Test readings export as CSV, NDJSON and gzip"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    for day in (1, 2, 3):
+        Reading.objects.create(
+            sensor=sensor,
+            timestamp=timezone.make_aware(datetime(2024, 1, day, 10, 0, 0)),
+            temperature=Decimal('20.5'),
+            humidity=Decimal('60.0')
+        )
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    url = f'/api/sensors/{sensor.id}/readings/export/'
+    
+    response = client.get(f'{url}?timestamp_from=2024-01-02T00:00:00Z', HTTP_AUTHORIZATION=f'Bearer {token}')
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert response['Content-Type'] == 'text/csv'
+    assert lines[0] == 'sensor_id,timestamp,temperature,humidity'
+    assert len(lines) == 3
+    assert lines[1].startswith(f'{sensor.id},2024-01-02T10:00:00')
+    
+    response = client.get(f'{url}?format=ndjson&gzip=true', HTTP_AUTHORIZATION=f'Bearer {token}')
+    rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+    assert len(rows) == 3
+    assert rows[0]['temperature'] == 20.5
+
+@pytest.mark.django_db
+def test_export_fleet_readings_only_includes_own_sensors():
+    """Test fleet export covers the user's sensors and nobody else's"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    other = User.objects.create_user(email="other@example.com", username="other", password="test123")
+    timestamp = timezone.make_aware(datetime(2024, 1, 1, 10, 0, 0))
+    for owner, name in [(user, "a"), (user, "b"), (other, "foreign")]:
+        sensor = Sensor.objects.create(owner=owner, name=name, model="TestModel")
+        Reading.objects.create(sensor=sensor, timestamp=timestamp, temperature=Decimal('20.0'), humidity=Decimal('60.0'))
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    response = client.get('/api/sensors/readings/export/?format=ndjson', HTTP_AUTHORIZATION=f'Bearer {token}')
+    rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+    
+    assert response.status_code == 200
+    assert {row['sensor_id'] for row in rows} == set(Sensor.objects.filter(owner=user).values_list('id', flat=True))
+
+@pytest.mark.django_db
+def test_list_readings_columnar_format():
+    """Test readings come back as packed columns when the client accepts them"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    for minute in range(60):
+        Reading.objects.create(
+            sensor=sensor,
+            timestamp=timezone.make_aware(datetime(2024, 1, 1, 10, minute, 0)),
+            temperature=Decimal('20.25'),
+            humidity=Decimal('60.5')
+        )
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}', 'HTTP_ACCEPT': COLUMNAR_CONTENT_TYPE}
+    
+    response = client.get(f'/api/sensors/{sensor.id}/readings/', **headers)
+    columns = unpack_blocks(response.content)
+    assert response['Content-Type'] == COLUMNAR_CONTENT_TYPE
+    assert response['X-Total-Count'] == '60'
+    assert len(columns['id']) == 50
+    assert set(columns['temperature']) == {20.25}
+    assert set(columns['sensor_id']) == {sensor.id}
+    
+    response = client.get(f'/api/sensors/{sensor.id}/readings/cursor/', **headers)
+    columns = unpack_blocks(response.content)
+    assert columns['timestamp'][0] == int(datetime(2024, 1, 1, 10, 59, tzinfo=dt_timezone.utc).timestamp()) * 1000000
+    
+    response = client.get(f"/api/sensors/{sensor.id}/readings/cursor/?cursor={response['X-Next-Cursor']}", **headers)
+    assert len(unpack_blocks(response.content)['id']) == 10
+    
+    response = client.get(f'/api/sensors/{sensor.id}/readings/export/?format=columns&gzip=true', HTTP_AUTHORIZATION=f'Bearer {token}')
+    columns = unpack_blocks(gzip.decompress(b''.join(response.streaming_content)))
+    assert len(columns['id']) == 60
+    assert columns['humidity'][0] == 60.5
+
+@pytest.mark.django_db
+def test_reading_values_stored_as_two_decimal_reals():
+    """Test reading values keep two decimals and stay within the old numeric(5, 2) range"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    response = client.post(f'/api/sensors/{sensor.id}/readings/bulk/', {"readings": [
+        {"temperature": 21.456, "humidity": 40.1, "timestamp": "2024-01-01T10:00:00Z"},
+        {"temperature": 1000, "humidity": 40.1, "timestamp": "2024-01-01T11:00:00Z"},
+        {"temperature": float('nan'), "humidity": 40.1, "timestamp": "2024-01-01T12:00:00Z"},
+    ]}, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    assert response.json()['created'] == 1
+    assert [conflict['index'] for conflict in response.json()['conflicts']] == [1, 2]
+    reading = Reading.objects.get(sensor=sensor)
+    assert (reading.temperature, reading.humidity) == (21.46, 40.1)
+    
+    response = client.post(f'/api/sensors/{sensor.id}/readings/', {
+        "temperature": 21.0, "humidity": float('inf'), "timestamp": "2024-01-01T13:00:00Z"
+    }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 422
+    assert Reading.objects.filter(sensor=sensor).count() == 1
+
+@pytest.mark.django_db(transaction=True)
+def test_buffered_reading_ingestion(settings, monkeypatch):
+    """Test buffered readings are accepted with 202 and group-committed on flush"""
+    settings.INGEST_BUFFER = True
+    # Flush by hand instead of from the background thread
+    monkeypatch.setattr(ingest_buffer, 'start', lambda: None)
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123", is_staff=True)
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    before = ingest_buffer.stats()
+    
+    for timestamp in ["2024-01-01T10:00:00Z", "2024-01-01T11:00:00Z", "2024-01-01T11:00:00Z"]:
+        response = client.post(f'/api/sensors/{sensor.id}/readings/', {
+            "temperature": 21.0, "humidity": 55.0, "timestamp": timestamp
+        }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        assert response.status_code == 202
+        assert response.json()['status'] == "queued"
+    response = client.post(f'/api/sensors/{sensor.id}/readings/', {
+        "temperature": 2100.0, "humidity": 55.0, "timestamp": "2024-01-01T12:00:00Z"
+    }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 422
+    assert not Reading.objects.filter(sensor=sensor).exists()
+    
+    assert ingest_buffer.flush() == 2
+    assert Reading.objects.filter(sensor=sensor).count() == 2
+    
+    stats = client.get('/api/sensors/readings/buffer/', HTTP_AUTHORIZATION=f'Bearer {token}').json()
+    assert stats['enabled'] is True
+    assert stats['depth'] == 0
+    assert stats['enqueued'] - before['enqueued'] == 3
+    assert stats['flushed'] - before['flushed'] == 2
+    assert stats['dropped'] - before['dropped'] == 1
+    assert stats['flushes'] - before['flushes'] == 1
+
+@pytest.mark.django_db(transaction=True)
+def test_buffered_readings_survive_a_deleted_sensor(monkeypatch):
+    """Test deleting a sensor with buffered readings drops only that sensor's readings"""
+    monkeypatch.setattr(ingest_buffer, 'start', lambda: None)
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    kept, deleted, racing = [Sensor.objects.create(owner=user, name=f"sensor-{i}", model="TestModel") for i in range(3)]
+    
+    def enqueue(*sensors):
+        for sensor in sensors:
+            ingest_buffer.enqueue(sensor.id, ReadingIn(temperature=21.0, humidity=55.0, timestamp=f"2024-01-01T{10 + sensor.id % 10:02d}:00:00Z"))
+    
+    before = ingest_buffer.stats()
+    enqueue(kept, deleted)
+    deleted.delete()
+    assert ingest_buffer.flush() == 1
+    assert ingest_buffer.stats()['dropped'] - before['dropped'] == 1
+    
+    # A sensor deleted while the batch is being written fails the whole batch; it is retried per sensor
+    ingest_readings = buffer.ingest_readings
+    
+    def delete_racing_sensor(batch, **kwargs):
+        Sensor.objects.filter(id=racing.id).delete()
+        return ingest_readings(batch, **kwargs)
+    
+    monkeypatch.setattr(buffer, 'ingest_readings', delete_racing_sensor)
+    Reading.objects.all().delete()
+    before = ingest_buffer.stats()
+    enqueue(kept, racing)
+    assert ingest_buffer.flush() == 1
+    assert list(Reading.objects.values_list('sensor_id', flat=True)) == [kept.id]
+    assert ingest_buffer.stats()['dropped'] - before['dropped'] == 1
+
+@pytest.mark.django_db
+def test_fleet_latest_readings_and_series(django_assert_max_num_queries):
+    """Test the latest readings and series of many sensors come from one request with a fixed number of queries"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    other = User.objects.create_user(email="other@example.com", username="other", password="test123")
+    sensors = [Sensor.objects.create(owner=user, name=f"sensor-{i}", model="TestModel") for i in range(3)]
+    foreign = Sensor.objects.create(owner=other, name="foreign", model="TestModel")
+    start = timezone.now().replace(minute=0, second=0, microsecond=0) - timezone.timedelta(hours=3)
+    for sensor in sensors[:2] + [foreign]:
+        for minute in range(0, 180, 30):
+            Reading.objects.create(
+                sensor=sensor,
+                timestamp=start + timezone.timedelta(minutes=minute),
+                temperature=Decimal(20 + minute // 60 + sensor.id),
+                humidity=Decimal('50.0')
+            )
+    call_command('build_rollups', stdout=StringIO())
+    Reading.objects.create(sensor=sensors[0], timestamp=start + timezone.timedelta(minutes=170), temperature=Decimal('30.0'), humidity=Decimal('40.0'))
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    
+    with django_assert_max_num_queries(4):
+        latest = client.get('/api/sensors/readings/latest/', **headers).json()
+    assert [reading['sensor_id'] for reading in latest] == [sensors[0].id, sensors[1].id]
+    assert latest[0]['temperature'] == 30.0
+    
+    ids = f'sensor_ids={sensors[1].id}&sensor_ids={foreign.id}'
+    assert [reading['sensor_id'] for reading in client.get(f'/api/sensors/readings/latest/?{ids}', **headers).json()] == [sensors[1].id]
+    
+    timestamp_from = start.isoformat().replace("+00:00", "Z")
+    with django_assert_max_num_queries(4):
+        series = client.get(f'/api/sensors/readings/series/?bucket=1h&timestamp_from={timestamp_from}', **headers).json()
+    assert [entry['sensor_id'] for entry in series] == [sensor.id for sensor in sensors]
+    for entry, sensor in zip(series, sensors):
+        single = client.get(f'/api/sensors/{sensor.id}/readings/aggregate/?bucket=1h&timestamp_from={timestamp_from}', **headers).json()
+        assert [bucket['bucket'] for bucket in entry['buckets']] == [bucket['bucket'] for bucket in single]
+        assert [bucket['temperature_avg'] for bucket in entry['buckets']] == pytest.approx(
+            [bucket['temperature_avg'] for bucket in single], abs=0.01
+        )
+    assert [bucket['count'] for bucket in series[0]['buckets']] == [2, 2, 3]
+    assert series[2]['buckets'] == []
+    
+    # The bucket limit covers the series of all sensors together
+    range_query = 'bucket=1m&timestamp_from=2024-01-01T00:00:00Z&timestamp_to=2024-01-03T20:00:00Z'
+    assert client.get(f'/api/sensors/{sensors[0].id}/readings/aggregate/?{range_query}', **headers).status_code == 200
+    assert client.get(f'/api/sensors/readings/series/?{range_query}', **headers).status_code == 400
+
+@pytest.mark.django_db
+def test_measurements_ingest_list_and_aggregate():
+    """Test arbitrary metric channels are stored per value and can be listed and aggregated"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    
+    response = client.post(f'/api/sensors/{sensor.id}/measurements/', {"measurements": [
+        {"timestamp": "2024-01-01T10:00:00Z", "values": {"co2": 410.0, "battery": 3.7}},
+        {"timestamp": "2024-01-01T10:30:00Z", "values": {"co2": 430.0}},
+        {"timestamp": "2024-01-01T11:00:00Z", "values": {"co2": 500.0, "battery": 3.6}},
+    ]}, content_type='application/json', **headers)
+    assert response.status_code == 200
+    assert response.json() == {"created": 5, "conflicts": []}
+    assert set(Metric.objects.values_list('name', flat=True)) == {"co2", "battery"}
+    
+    response = client.post(f'/api/sensors/{sensor.id}/measurements/', {"measurements": [
+        {"timestamp": "2024-01-01T11:00:00Z", "values": {"co2": 505.0, "pressure": 1013.2}},
+    ]}, content_type='application/json', **headers)
+    body = response.json()
+    assert body['created'] == 1
+    assert [(conflict['index'], conflict['metric']) for conflict in body['conflicts']] == [(0, "co2")]
+    assert Measurement.objects.filter(sensor=sensor).count() == 6
+    
+    response = client.post(f'/api/sensors/{sensor.id}/measurements/', {"measurements": [
+        {"timestamp": "2024-01-01T12:00:00Z", "values": {"CO2 ppm": 1.0}},
+    ]}, content_type='application/json', **headers)
+    assert response.status_code == 422
+    response = client.post(f'/api/sensors/{sensor.id}/measurements/', {"measurements": [
+        {"timestamp": "2024-01-01T12:00:00Z", "values": {f"channel_{i}": 1.0 for i in range(MAX_NEW_METRICS + 1)}},
+    ]}, content_type='application/json', **headers)
+    assert response.status_code == 422
+    assert Metric.objects.count() == 3
+    
+    listed = client.get(f'/api/sensors/{sensor.id}/measurements/?metrics=battery', **headers).json()
+    assert listed['count'] == 2
+    assert [(item['metric'], item['value']) for item in listed['items']] == [("battery", 3.6), ("battery", 3.7)]
+    
+    buckets = client.get(f'/api/sensors/{sensor.id}/measurements/aggregate/?bucket=1h&metrics=co2', **headers).json()
+    assert [(bucket['bucket'][:13], bucket['count'], bucket['avg']) for bucket in buckets] == [
+        ("2024-01-01T10", 2, 420.0), ("2024-01-01T11", 1, 500.0)
+    ]
+    assert {bucket['metric'] for bucket in client.get(f'/api/sensors/{sensor.id}/measurements/aggregate/?bucket=1d', **headers).json()} == {"battery", "co2", "pressure"}
+
+@pytest.mark.django_db
+def test_metric_names_are_per_user(monkeypatch):
+    """Test each user's metric names are their own and capped per user"""
+    monkeypatch.setattr(measurements, 'MAX_METRICS_PER_OWNER', 2)
+    client = Client()
+    sensors = {}
+    for email in ("test@example.com", "other@example.com"):
+        user = User.objects.create_user(email=email, username=email, password="test123")
+        sensors[email] = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    
+    def post(email, values):
+        token = get_token(client, email, "test123")
+        return client.post(f'/api/sensors/{sensors[email].id}/measurements/', {"measurements": [
+            {"timestamp": "2024-01-01T10:00:00Z", "values": values},
+        ]}, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    assert post("test@example.com", {"co2": 410.0, "battery": 3.7}).status_code == 200
+    assert post("test@example.com", {"pressure": 1013.2}).status_code == 422
+    assert post("other@example.com", {"co2": 380.0, "pressure": 1013.2}).status_code == 200
+    assert sorted(Metric.objects.values_list('owner__email', 'name')) == [
+        ("other@example.com", "co2"), ("other@example.com", "pressure"),
+        ("test@example.com", "battery"), ("test@example.com", "co2"),
+    ]
+    
+    User.objects.get(email="test@example.com").delete()
+    assert sorted(Metric.objects.values_list('name', flat=True)) == ["co2", "pressure"]
+    assert Measurement.objects.count() == 2
+
+@pytest.mark.django_db
+def test_archived_readings_listed_and_exported():
+    """Test readings packed into daily chunks are still listed, exported and counted the same"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    Reading.objects.bulk_create([
+        Reading(
+            sensor=sensor,
+            timestamp=start + timezone.timedelta(minutes=30 * i),
+            temperature=Decimal(f'{20 + i % 7 * 0.25:.2f}'),
+            humidity=Decimal(f'{50 - i % 5 * 1.5:.2f}')
+        )
+        for i in range(48 * 3)
+    ])
+    Reading.objects.create(sensor=sensor, timestamp=timezone.now() - timezone.timedelta(hours=1), temperature=Decimal('25.0'), humidity=Decimal('45.0'))
+    rebuild_sensor_stats([sensor.id])
+    call_command('build_rollups', stdout=StringIO())
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    window = 'timestamp_from=2024-01-01T20:00:00Z&timestamp_to=2024-01-03T04:00:00Z'
+    
+    def snapshot():
+        pages = [client.get(f'/api/sensors/{sensor.id}/readings/?page={page}', **headers).json() for page in (1, 2, 3, 4)]
+        cursor_pages = [client.get(f'/api/sensors/{sensor.id}/readings/cursor/?{window}', **headers).json()]
+        while cursor_pages[-1]['next']:
+            cursor_pages.append(client.get(f'/api/sensors/{sensor.id}/readings/cursor/?{window}&cursor={cursor_pages[-1]["next"]}', **headers).json())
+        cursor_pages.append(client.get(f'/api/sensors/{sensor.id}/readings/cursor/?{window}&cursor={cursor_pages[-1]["previous"]}', **headers).json())
+        return {
+            'pages': pages,
+            'window': client.get(f'/api/sensors/{sensor.id}/readings/?page=2&{window}', **headers).json(),
+            'cursor': cursor_pages,
+            'latest': client.get('/api/sensors/readings/latest/?timestamp_to=2024-01-02T12:10:00Z', **headers).json(),
+            'aggregate': client.get(f'/api/sensors/{sensor.id}/readings/aggregate/?bucket=1h&{window}', **headers).json(),
+            'series': client.get(f'/api/sensors/readings/series/?bucket=5m&{window}', **headers).json(),
+            'csv': b''.join(client.get(f'/api/sensors/{sensor.id}/readings/export/?{window}', **headers).streaming_content),
+            'fleet': b''.join(client.get('/api/sensors/readings/export/?format=ndjson', **headers).streaming_content),
+        }
+    
+    before = snapshot()
+    out = StringIO()
+    call_command('archive_readings', '--older-than-days', '1', stdout=out)
+    assert "Archived 144 readings into 3 daily chunks" in out.getvalue()
+    assert Reading.objects.filter(sensor=sensor).count() == 1
+    assert ReadingChunk.objects.filter(sensor=sensor).count() == 3
+    assert snapshot() == before
+    assert before['pages'][3]['count'] == 145
+    assert sum(len(page['items']) for page in before['cursor'][:-1]) == 65
+    assert before['cursor'][-1] == before['cursor'][-3]
+    assert before['latest'][0]['timestamp'].startswith('2024-01-02T12:00:00')
+    assert sum(bucket['count'] for bucket in before['aggregate']) == 65
+    
+    late = Reading.objects.create(sensor=sensor, timestamp=start + timezone.timedelta(days=1, minutes=15), temperature=Decimal('30.0'), humidity=Decimal('40.0'))
+    call_command('build_rollups', stdout=StringIO())
+    items = client.get(f'/api/sensors/{sensor.id}/readings/?page=2&{window}', **headers).json()['items']
+    assert [item['id'] for item in items].count(late.id) == 1
+    assert [item['timestamp'] for item in items] == sorted((item['timestamp'] for item in items), reverse=True)
+    cursor = client.get(f'/api/sensors/{sensor.id}/readings/cursor/?{window}', **headers).json()
+    items = cursor['items'] + client.get(f'/api/sensors/{sensor.id}/readings/cursor/?{window}&cursor={cursor["next"]}', **headers).json()['items']
+    assert [item['id'] for item in items].count(late.id) == 1
+    assert DayRollup.objects.get(sensor=sensor, bucket=start + timezone.timedelta(days=1)).count == 49
+    
+    call_command('archive_readings', '--older-than-days', '1', stdout=StringIO())
+    assert Reading.objects.filter(sensor=sensor).count() == 1
+    assert ReadingChunk.objects.get(sensor=sensor, day=late.timestamp.date()).count == 49
+    rebuild_sensor_stats([sensor.id])
+    sensor.stats.refresh_from_db()
+    assert sensor.stats.readings_count == 146
+    assert sensor.stats.first_reading_timestamp == start
+    assert sensor.stats.max_temperature == Decimal('30.0')
+
+@pytest.mark.django_db
+def test_archived_readings_follow_conflict_policy():
+    """Test readings retried for an archived day are matched against its chunk under the conflict policy"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    day = (timezone.now() - timezone.timedelta(days=3)).replace(hour=0, minute=0, second=0, microsecond=0)
+    Reading.objects.bulk_create([
+        Reading(sensor=sensor, timestamp=day + timezone.timedelta(hours=hour), temperature=20.0, humidity=50.0)
+        for hour in range(24)
+    ])
+    rebuild_sensor_stats([sensor.id])
+    call_command('build_rollups', stdout=StringIO())
+    call_command('archive_readings', '--older-than-days', '1', stdout=StringIO())
+    assert not Reading.objects.filter(sensor=sensor).exists()
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    url = f'/api/sensors/{sensor.id}/readings/'
+    retry = {"temperature": 25.0, "humidity": 50.0, "timestamp": (day + timezone.timedelta(hours=5)).isoformat()}
+    late = {**retry, "timestamp": (day + timezone.timedelta(hours=5, minutes=30)).isoformat()}
+    
+    response = client.post(url, retry, content_type='application/json', **headers)
+    assert response.status_code == 200
+    assert response.json()['temperature'] == 20.0
+    result = client.post(f'{url}bulk/', {"readings": [retry, late]}, content_type='application/json', **headers).json()
+    assert (result['created'], result['updated'], result['duplicates']) == (1, 0, 1)
+    
+    response = client.post(f'{url}?on_conflict=overwrite', retry, content_type='application/json', **headers)
+    assert response.status_code == 200
+    assert response.json()['temperature'] == 25.0
+    items = client.get(url, **headers).json()['items']
+    assert len(items) == 25
+    assert [item['temperature'] for item in items].count(25.0) == 2
+    assert ReadingChunk.objects.get(sensor=sensor).temperature_max == 25.0
+    assert HourRollup.objects.get(sensor=sensor, bucket=day + timezone.timedelta(hours=5)).temperature_max == Decimal('25.0')
+    assert DayRollup.objects.get(sensor=sensor, bucket=day).temperature_sum == 23 * 20.0 + 2 * 25.0
+    sensor.stats.refresh_from_db()
+    assert sensor.stats.readings_count == 25
+    assert sensor.stats.max_temperature == Decimal('25.0')
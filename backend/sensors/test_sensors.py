@@ -6,9 +6,14 @@ django.setup()
 
 import pytest
 import json
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import Client
-from sensors.models import Sensor
+from django.utils import timezone
+from sensors.models import Sensor, Reading, SensorStats
 
 def get_token(client, email, password):
     response = client.post('/api/auth/token/', {
@@ -92,4 +97,107 @@ def test_list_with_pagination():
         data_page2 = json.loads(response.content)
         
         assert response.status_code == 200
-        assert data_page2['count'] == 25
\ No newline at end of file
+        assert data_page2['count'] == 25
+
+@pytest.mark.django_db
+def test_sensor_stats_follow_ingestion():
+    """Test sensor stats are updated by single and bulk reading ingestion"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    busy = Sensor.objects.create(owner=user, name="busy", model="TestModel")
+    Sensor.objects.create(owner=user, name="idle", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    client.post(f'/api/sensors/{busy.id}/readings/', {
+        "temperature": 23.5, "humidity": 65.0, "timestamp": "2024-01-02T10:00:00Z"
+    }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    client.post(f'/api/sensors/{busy.id}/readings/bulk/', {
+        "readings": [
+            {"temperature": 18.0, "humidity": 40.0, "timestamp": "2024-01-01T10:00:00Z"},
+            {"temperature": 25.0, "humidity": 70.0, "timestamp": "2024-01-01T11:00:00Z"},
+        ]
+    }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    stats = SensorStats.objects.get(sensor=busy)
+    assert stats.readings_count == 3
+    assert stats.last_temperature == Decimal('23.5')
+    assert stats.min_temperature == Decimal('18.0')
+    assert stats.max_humidity == Decimal('70.0')
+    
+    response = client.get('/api/sensors/?sort_by=-readings_count', HTTP_AUTHORIZATION=f'Bearer {token}')
+    data = json.loads(response.content)
+    assert data['items'][0]['name'] == "busy"
+    assert data['items'][0]['readings_count'] == 3
+    assert '2024-01-02' in data['items'][0]['last_reading_timestamp']
+    assert data['items'][1]['readings_count'] == 0
+
+@pytest.mark.django_db
+def test_rebuild_sensor_stats_command():
+    """Test the rebuild command recomputes stats from stored readings"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    Reading.objects.create(
+        sensor=sensor,
+        timestamp=timezone.make_aware(datetime(2024, 1, 1, 10, 0, 0)),
+        temperature=Decimal('20.0'),
+        humidity=Decimal('60.0')
+    )
+    
+    call_command('rebuild_sensor_stats', stdout=StringIO())
+    
+    stats = SensorStats.objects.get(sensor=sensor)
+    assert stats.readings_count == 1
+    assert stats.last_humidity == Decimal('60.0')
+
+@pytest.mark.django_db
+def test_sensor_responses_cached_with_etags(settings, django_assert_num_queries):
+    """Test sensor list/models/detail responses are cached, revalidated with ETags and invalidated by writes"""
+    settings.RESPONSE_CACHE_TIMEOUT = 300
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    sensor = Sensor.objects.create(owner=user, name="test-sensor", model="TestModel")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    
+    response = client.get('/api/sensors/', **headers)
+    etag = response['ETag']
+    with django_assert_num_queries(0):
+        assert client.get('/api/sensors/', **headers).json() == response.json()
+        assert client.get('/api/sensors/', HTTP_IF_NONE_MATCH=etag, **headers).status_code == 304
+    
+    client.post(f'/api/sensors/{sensor.id}/readings/', {
+        "temperature": 20.0, "humidity": 50.0, "timestamp": "2024-01-01T10:00:00Z"
+    }, content_type='application/json', **headers)
+    response = client.get('/api/sensors/', HTTP_IF_NONE_MATCH=etag, **headers)
+    assert response.status_code == 200
+    assert response.json()['items'][0]['readings_count'] == 1
+    
+    assert client.get('/api/sensors/models/', **headers).json() == ["TestModel"]
+    client.get(f'/api/sensors/{sensor.id}/', **headers)
+    client.put(f'/api/sensors/{sensor.id}/', {"model": "OtherModel"}, content_type='application/json', **headers)
+    assert client.get('/api/sensors/models/', **headers).json() == ["OtherModel"]
+    assert client.get(f'/api/sensors/{sensor.id}/', **headers).json()['model'] == "OtherModel"
+    
+    client.delete(f'/api/sensors/{sensor.id}/', **headers)
+    assert client.get(f'/api/sensors/{sensor.id}/', **headers).status_code == 404
+    assert client.get('/api/sensors/', **headers).json()['count'] == 0
+
+@pytest.mark.django_db
+def test_search_ranks_best_matches_first():
+    """Test the sensor search matches name, model and description and orders by relevance"""
+    user = User.objects.create_user(email="test@example.com", username="test", password="test123")
+    Sensor.objects.create(owner=user, name="greenhouse", model="Thermo-2", description="")
+    Sensor.objects.create(owner=user, name="basement", model="Hygro", description="Next to the thermostat")
+    Sensor.objects.create(owner=user, name="thermo", model="Hygro")
+    Sensor.objects.create(owner=user, name="thermometer-attic", model="Hygro")
+    Sensor.objects.create(owner=user, name="garage", model="Hygro")
+    client = Client()
+    token = get_token(client, "test@example.com", "test123")
+    
+    response = client.get('/api/sensors/?q=THERMO', HTTP_AUTHORIZATION=f'Bearer {token}')
+    names = [sensor['name'] for sensor in response.json()['items']]
+    assert names == ["thermo", "thermometer-attic", "greenhouse", "basement"]
+    
+    response = client.get('/api/sensors/?q=thermo&sort_by=name', HTTP_AUTHORIZATION=f'Bearer {token}')
+    names = [sensor['name'] for sensor in response.json()['items']]
+    assert names == ["basement", "greenhouse", "thermo", "thermometer-attic"]
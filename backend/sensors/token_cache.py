@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class TokenCache:
+    """
+    Per-process LRU of validated credentials: users keyed by JWT signature, or
+    ingest keys keyed by their hash.
+
+    Entries expire after ``ttl`` seconds or when the token itself expires,
+    whichever comes first, and can be dropped by the pk of the cached object
+    when the account changes or the key is revoked.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.maxsize:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user, token_exp=None):
+        if not self.maxsize:
+            return
+        expires_at = time.monotonic() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, time.monotonic() + (token_exp - time.time()))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (user, expires_at)
+            self._keys_by_user[user.pk].add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, pk):
+        with self._lock:
+            for key in list(self._keys_by_user.get(pk, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        user, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user.pk]
@@ -1,48 +1,84 @@
 from typing import List, Optional, Union
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count, Max
+from django.db.models import F, Max, Min
+from django.utils import timezone
 from ninja import Router, Query
+from ninja.decorators import decorate_view
+from ninja.errors import HttpError
 from ninja.pagination import paginate, PageNumberPagination
-from django.http import JsonResponse
-from .models import Sensor, Reading
-from .schemas import SensorIn, SensorOut, SensorUpdateSchema, ReadingIn, ReadingOut
-from .query_schemas import SensorListQuery, ReadingListQuery
-from .auth import jwt_auth
+from django.http import Http404, JsonResponse
+from .models import Sensor, SensorStats, IngestKey, Reading, ReadingChunk, Measurement, AlertRule, AlertEvent
+from .schemas import (
+    SensorIn, SensorOut, SensorUpdateSchema, IngestKeyIn, IngestKeyOut, IngestKeyCreatedOut, ReadingIn, ReadingOut,
+    ReadingBulkIn, MultiSensorReadingBulkIn, ReadingBulkOut, ReadingBucketOut,
+    ReadingQueuedOut, IngestBufferStatsOut, SensorReadingOut, SensorSeriesOut, AlertRuleIn, AlertRuleOut, AlertEventOut,
+    MeasurementBulkIn, MeasurementBulkOut, MeasurementOut, MeasurementBucketOut
+)
+from .query_schemas import (
+    SensorListQuery, ReadingListQuery, ReadingAggregateQuery,
+    ReadingExportQuery, FleetReadingExportQuery, FleetReadingListQuery, FleetReadingAggregateQuery,
+    AlertEventQuery, MeasurementListQuery, MeasurementAggregateQuery, IngestQuery
+)
+from .auth import create_ingest_key, ingest_key_auth, jwt_auth, revoke_ingest_key
+from .ingest import ingest_readings, store_reading
+from .buffer import BufferFull, ingest_buffer
+from .pagination import CursorPagination
+from .aggregates import BUCKET_SECONDS, MAX_BUCKETS
+from .rollups import aggregate_fleet_series, aggregate_series
+from .overview import latest_readings
+from .measurements import ingest_measurements, list_measurements, aggregate_measurements
+from .export import export_response
+from .archive import archived_rows, filter_chunks, with_archive
+from .columnar import columnar_response, columnar_rows
+from .response_cache import cached_response
+from .search import search_sensors
 from datetime import datetime
 
 sensors_router = Router()
 readings_router = Router()
+alerts_router = Router()
 
-@sensors_router.get("/", response=List[SensorOut], auth=jwt_auth)
-@paginate(PageNumberPagination, page_size=6)
-def list_sensors(request, query: SensorListQuery = Query()):
-    
-    queryset = Sensor.objects.filter(owner=request.auth).annotate(
-        readings_count=Count('readings'),
-        last_reading_timestamp=Max('readings__timestamp')
+def sensors_with_stats(user):
+    """The user's sensors annotated from their maintained SensorStats row"""
+    # Filtering on the stats' owner as well lets sorted pages come from its (owner, ...) indexes
+    return Sensor.objects.filter(owner=user, stats__owner=user).annotate(
+        readings_count=F('stats__readings_count'),
+        last_reading_timestamp=F('stats__last_reading_timestamp')
     )
-    
+
+def filter_sensors(queryset, query):
+    """Apply the search, model filter and sorting of a SensorListQuery"""
     if query.q:
-        queryset = queryset.filter(
-            Q(name__icontains=query.q) | Q(model__icontains=query.q)
-        )
+        queryset = search_sensors(queryset, query.q)
     
     if query.model:
         queryset = queryset.filter(model__icontains=query.model)
     
-    # Handle sorting
+    # Handle sorting; searches default to the best matches first
     valid_sort_fields = [
         'name', 'model', 'readings_count', '-readings_count',
         'last_reading_timestamp', '-last_reading_timestamp'
     ]
-    if query.sort_by in valid_sort_fields:
-        queryset = queryset.order_by(query.sort_by)
+    sort_by = query.sort_by or ('relevance' if query.q else 'name')
+    if sort_by == 'relevance' and query.q:
+        queryset = queryset.order_by('-rank', 'name')
+    elif sort_by in valid_sort_fields:
+        queryset = queryset.order_by(sort_by)
     else:
         queryset = queryset.order_by('name')
     
     return queryset
 
+@sensors_router.get("/", response=List[SensorOut], auth=jwt_auth)
+@decorate_view(cached_response('sensors'))
+@paginate(PageNumberPagination, page_size=6)
+def list_sensors(request, query: SensorListQuery = Query()):
+    return filter_sensors(sensors_with_stats(request.auth), query)
+
 @sensors_router.get("/models/", auth=jwt_auth)
+@decorate_view(cached_response('models'))
 def get_available_models(request):
     """Get list of unique sensor models for the authenticated user"""
     models = Sensor.objects.filter(owner=request.auth).values_list('model', flat=True).distinct()
@@ -61,24 +97,20 @@ def create_sensor(request, data: SensorIn):
     return sensor
 
 @sensors_router.get("/{sensor_id}/", response=SensorOut, auth=jwt_auth)
+@decorate_view(cached_response('sensor'))
 def get_sensor(request, sensor_id: int):
-    sensor = get_object_or_404(
-        Sensor.objects.annotate(readings_count=Count('readings')),
-        id=sensor_id,
-        owner=request.auth
-    )
+    sensor = get_object_or_404(sensors_with_stats(request.auth), id=sensor_id)
     return sensor
 
 @sensors_router.put("/{sensor_id}/", response=SensorOut, auth=jwt_auth)
 def update_sensor(request, sensor_id: int, data: SensorUpdateSchema):
-    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    sensor = get_object_or_404(sensors_with_stats(request.auth), id=sensor_id)
     
     update_fields = data.dict(exclude_unset=True)
     for field, value in update_fields.items():
         setattr(sensor, field, value)
     
     sensor.save()
-    sensor.readings_count = sensor.readings.count()
     return sensor
 
 @sensors_router.delete("/{sensor_id}/", auth=jwt_auth)
@@ -87,7 +119,117 @@ def delete_sensor(request, sensor_id: int):
     sensor.delete()
     return {"message": "Sensor deleted successfully"}
 
+@sensors_router.get("/{sensor_id}/ingest-keys/", response=List[IngestKeyOut], auth=jwt_auth)
+def list_ingest_keys(request, sensor_id: int):
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return IngestKey.objects.filter(sensor=sensor).order_by('-created_at')
+
+@sensors_router.post("/{sensor_id}/ingest-keys/", response=IngestKeyCreatedOut, auth=jwt_auth)
+def create_sensor_ingest_key(request, sensor_id: int, data: IngestKeyIn):
+    """Issue a key that lets a device write this sensor's readings; the key is only shown here"""
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    ingest_key, key = create_ingest_key(sensor, data.name)
+    ingest_key.key = key
+    return ingest_key
+
+@sensors_router.delete("/{sensor_id}/ingest-keys/{key_id}/", auth=jwt_auth)
+def revoke_sensor_ingest_key(request, sensor_id: int, key_id: int):
+    ingest_key = get_object_or_404(IngestKey, id=key_id, sensor_id=sensor_id, sensor__owner=request.auth)
+    revoke_ingest_key(ingest_key)
+    return {"message": "Ingest key revoked successfully"}
+
+def key_sensor(ingest_key, sensor_id):
+    """The sensor an ingest key writes to, loaded with the key; any other sensor is a 404"""
+    if ingest_key.sensor_id != sensor_id:
+        raise Http404("No Sensor matches the given query.")
+    return ingest_key.sensor
+
+def ingest_sensor(request, sensor_id):
+    """The sensor a write goes to, from the ingest key without a query or owned by the JWT user"""
+    if isinstance(request.auth, IngestKey):
+        return key_sensor(request.auth, sensor_id)
+    return get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+
+def aware(timestamp):
+    # Naive query timestamps are in the current time zone, as when filtering on them
+    return timezone.make_aware(timestamp) if timezone.is_naive(timestamp) else timestamp
+
+def filter_readings(queryset, query):
+    """Apply the timestamp_from/timestamp_to range of a ReadingListQuery"""
+    if query.timestamp_from:
+        queryset = queryset.filter(timestamp__gte=query.timestamp_from)
+    if query.timestamp_to:
+        queryset = queryset.filter(timestamp__lte=query.timestamp_to)
+    return queryset
+
+def stored_range(queryset, query, first='timestamp', last='timestamp'):
+    """The oldest ``first`` and newest ``last`` timestamps of ``queryset``, looked up only for an open range"""
+    if query.timestamp_from and query.timestamp_to:
+        return None, None
+    stored = queryset.aggregate(first=Min(first), last=Max(last))
+    return stored['first'], stored['last']
+
+def stored_reading_range(stats, query):
+    """stored_range of readings from the sensors' SensorStats ``stats``, which count archived readings too"""
+    return stored_range(stats, query, 'first_reading_timestamp', 'last_reading_timestamp')
+
+def check_bucket_count(query, stored=(None, None), series=1):
+    """
+    Reject ranges of more than MAX_BUCKETS buckets over all ``series``. An open
+    range is bounded by ``stored``, the oldest and newest timestamps it covers
+    (see stored_range).
+    """
+    start = query.timestamp_from or stored[0]
+    end = query.timestamp_to or stored[1]
+    if start is None or end is None:
+        return
+    span = (aware(end) - aware(start)).total_seconds()
+    if span / BUCKET_SECONDS[query.bucket] * series > MAX_BUCKETS:
+        raise HttpError(400, "Time range is too large for this bucket size")
+
+def owned_sensor_ids(user, sensor_ids):
+    """The user's sensors, or those of ``sensor_ids`` the user owns, as an id values_list"""
+    sensors = Sensor.objects.filter(owner=user)
+    if sensor_ids:
+        sensors = sensors.filter(id__in=sensor_ids)
+    return sensors.order_by('id').values_list('id', flat=True)
+
+def fleet_series(sensor_ids, query):
+    series = aggregate_fleet_series(sensor_ids, query.bucket, query.timestamp_from, query.timestamp_to)
+    return [{"sensor_id": sensor_id, "buckets": buckets} for sensor_id, buckets in series.items()]
+
+def queue_reading(sensor, data):
+    """Hand a reading to the write-behind buffer; the body of the 202 response"""
+    try:
+        ingest_buffer.enqueue(sensor.id, data)
+    except ValidationError as e:
+        raise HttpError(422, "; ".join(e.messages))
+    except BufferFull as e:
+        raise HttpError(503, str(e))
+    return {"sensor_id": sensor.id, "timestamp": data.timestamp, "status": "queued"}
+
+def save_reading(sensor, data, policy):
+    """Store a reading right away; 201 with a new reading, 200 with the stored one for a retry"""
+    try:
+        reading, created = store_reading(sensor, data, policy)
+    except ValidationError as e:
+        raise HttpError(422, "; ".join(e.messages))
+    return (201 if created else 200), reading
+
+def save_measurements(sensor, rows):
+    """Store measurements right away; the body of the 200 response"""
+    try:
+        return ingest_measurements(sensor, rows)
+    except ValidationError as e:
+        raise HttpError(422, "; ".join(e.messages))
+
+def buffer_stats(user):
+    if not user.is_staff:
+        raise HttpError(403, "Only staff can see ingestion metrics")
+    return {"enabled": settings.INGEST_BUFFER, **ingest_buffer.stats()}
+
 @readings_router.get("/{sensor_id}/readings/", response=List[ReadingOut], auth=jwt_auth)
+@columnar_response
 @paginate(PageNumberPagination, page_size=50)
 def list_readings(
     request, 
@@ -95,24 +237,142 @@ def list_readings(
     query: ReadingListQuery = Query()
 ):
     sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
-    queryset = Reading.objects.filter(sensor=sensor)
-    
-    if query.timestamp_from:
-        queryset = queryset.filter(timestamp__gte=query.timestamp_from)
-    if query.timestamp_to:
-        queryset = queryset.filter(timestamp__lte=query.timestamp_to)
-    
-    return queryset
+    rows = columnar_rows(request, filter_readings(Reading.objects.filter(sensor=sensor), query))
+    return with_archive(rows, ReadingChunk.objects.filter(sensor=sensor), query)
 
-@readings_router.post("/{sensor_id}/readings/", response=ReadingOut, auth=jwt_auth)
-def create_reading(request, sensor_id: int, data: ReadingIn):
+@readings_router.get("/{sensor_id}/readings/cursor/", response=List[ReadingOut], auth=jwt_auth)
+@columnar_response
+@paginate(CursorPagination, page_size=50)
+def list_readings_cursor(request, sensor_id: int, query: ReadingListQuery = Query()):
+    """List readings newest first using opaque next/previous cursors instead of page numbers"""
     sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
-    
-    reading = Reading.objects.create(
-        sensor=sensor,
-        temperature=data.temperature,
-        humidity=data.humidity,
-        timestamp=data.timestamp
+    rows = columnar_rows(request, filter_readings(Reading.objects.filter(sensor=sensor), query))
+    return with_archive(rows, ReadingChunk.objects.filter(sensor=sensor), query)
+
+@readings_router.get("/{sensor_id}/readings/aggregate/", response=List[ReadingBucketOut], auth=jwt_auth)
+def aggregate_sensor_readings(request, sensor_id: int, query: ReadingAggregateQuery = Query()):
+    """Min/max/avg/count of readings per time bucket, computed in the database"""
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    check_bucket_count(query, stored_reading_range(SensorStats.objects.filter(sensor=sensor), query))
+    return aggregate_series(sensor.id, query.bucket, query.timestamp_from, query.timestamp_to)
+
+@readings_router.get("/readings/latest/", response=List[SensorReadingOut], auth=jwt_auth)
+def fleet_latest_readings(request, query: FleetReadingListQuery = Query()):
+    """The newest reading of each (or each selected) sensor of the user in one query"""
+    sensor_ids = owned_sensor_ids(request.auth, query.sensor_ids)
+    return latest_readings(sensor_ids, query.timestamp_from, query.timestamp_to)
+
+@readings_router.get("/readings/series/", response=List[SensorSeriesOut], auth=jwt_auth)
+def fleet_aggregate_readings(request, query: FleetReadingAggregateQuery = Query()):
+    """Downsampled series of each (or each selected) sensor of the user"""
+    sensor_ids = list(owned_sensor_ids(request.auth, query.sensor_ids))
+    check_bucket_count(query, stored_reading_range(SensorStats.objects.filter(sensor_id__in=sensor_ids), query), len(sensor_ids))
+    return fleet_series(sensor_ids, query)
+
+@readings_router.get("/{sensor_id}/readings/export/", auth=jwt_auth)
+def export_sensor_readings(request, sensor_id: int, query: ReadingExportQuery = Query()):
+    """Stream a sensor's readings as CSV or NDJSON, optionally gzipped"""
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    queryset = filter_readings(Reading.objects.filter(sensor=sensor), query)
+    archived = archived_rows(filter_chunks(ReadingChunk.objects.filter(sensor=sensor), query), query)
+    return export_response(queryset, query.format, query.gzip, f"sensor-{sensor.id}-readings", archived=archived)
+
+@readings_router.get("/readings/export/", auth=jwt_auth)
+def export_fleet_readings(request, query: FleetReadingExportQuery = Query()):
+    """Stream readings of all (or the selected) sensors of the user"""
+    queryset = Reading.objects.filter(sensor__owner=request.auth)
+    chunks = ReadingChunk.objects.filter(sensor__owner=request.auth)
+    if query.sensor_ids:
+        queryset = queryset.filter(sensor_id__in=query.sensor_ids)
+        chunks = chunks.filter(sensor_id__in=query.sensor_ids)
+    queryset = filter_readings(queryset, query)
+    archived = archived_rows(filter_chunks(chunks, query), query)
+    return export_response(queryset, query.format, query.gzip, "readings", archived=archived)
+
+@readings_router.post("/{sensor_id}/readings/", response={200: ReadingOut, 201: ReadingOut, 202: ReadingQueuedOut}, auth=[ingest_key_auth, jwt_auth])
+def create_reading(request, sensor_id: int, data: ReadingIn, query: IngestQuery = Query()):
+    sensor = ingest_sensor(request, sensor_id)
+    if settings.INGEST_BUFFER:
+        return 202, queue_reading(sensor, data)
+    return save_reading(sensor, data, query.on_conflict)
+
+@readings_router.get("/readings/buffer/", response=IngestBufferStatsOut, auth=jwt_auth)
+def ingest_buffer_stats(request):
+    """Queue depth, flush latency and dropped rows of this worker's ingestion buffer"""
+    return buffer_stats(request.auth)
+
+@readings_router.post("/{sensor_id}/readings/bulk/", response=ReadingBulkOut, auth=[ingest_key_auth, jwt_auth])
+def create_readings_bulk(request, sensor_id: int, data: ReadingBulkIn, query: IngestQuery = Query()):
+    """Create many readings for one sensor, reporting rows that conflict"""
+    sensor = ingest_sensor(request, sensor_id)
+    return ingest_readings(
+        [(sensor.id, reading) for reading in data.readings],
+        allowed_sensor_ids={sensor.id},
+        policy=query.on_conflict
     )
-    
-    return reading
+
+@readings_router.post("/readings/bulk/", response=ReadingBulkOut, auth=jwt_auth)
+def create_readings_bulk_multi(request, data: MultiSensorReadingBulkIn, query: IngestQuery = Query()):
+    """Create readings for several of the user's sensors in one request"""
+    sensor_ids = {reading.sensor_id for reading in data.readings}
+    owned_ids = set(
+        Sensor.objects.filter(owner=request.auth, id__in=sensor_ids).values_list('id', flat=True)
+    )
+    return ingest_readings(
+        [(reading.sensor_id, reading) for reading in data.readings],
+        allowed_sensor_ids=owned_ids,
+        policy=query.on_conflict
+    )
+
+@readings_router.post("/{sensor_id}/measurements/", response=MeasurementBulkOut, auth=[ingest_key_auth, jwt_auth])
+def create_measurements(request, sensor_id: int, data: MeasurementBulkIn):
+    """Store any metric channels of a sensor, adding metric names on first use"""
+    sensor = ingest_sensor(request, sensor_id)
+    return save_measurements(sensor, data.measurements)
+
+@readings_router.get("/{sensor_id}/measurements/", response=List[MeasurementOut], auth=jwt_auth)
+@paginate(PageNumberPagination, page_size=50)
+def list_sensor_measurements(request, sensor_id: int, query: MeasurementListQuery = Query()):
+    """A sensor's measurements newest first, optionally only some metrics"""
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return list_measurements(sensor.id, query)
+
+@readings_router.get("/{sensor_id}/measurements/aggregate/", response=List[MeasurementBucketOut], auth=jwt_auth)
+def aggregate_sensor_measurements(request, sensor_id: int, query: MeasurementAggregateQuery = Query()):
+    """Min/max/avg/count per metric and time bucket, computed in the database"""
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    check_bucket_count(query, stored_range(Measurement.objects.filter(sensor=sensor), query))
+    return aggregate_measurements(sensor.id, query)
+
+@alerts_router.get("/{sensor_id}/alert-rules/", response=List[AlertRuleOut], auth=jwt_auth)
+def list_alert_rules(request, sensor_id: int):
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return AlertRule.objects.filter(sensor=sensor)
+
+@alerts_router.post("/{sensor_id}/alert-rules/", response=AlertRuleOut, auth=jwt_auth)
+def create_alert_rule(request, sensor_id: int, data: AlertRuleIn):
+    """Add a rule that is checked against every new reading of the sensor"""
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return AlertRule.objects.create(sensor=sensor, **data.dict())
+
+@alerts_router.delete("/{sensor_id}/alert-rules/{rule_id}/", auth=jwt_auth)
+def delete_alert_rule(request, sensor_id: int, rule_id: int):
+    rule = get_object_or_404(AlertRule, id=rule_id, sensor_id=sensor_id, sensor__owner=request.auth)
+    rule.delete()
+    return {"message": "Alert rule deleted successfully"}
+
+@alerts_router.get("/{sensor_id}/alerts/", response=List[AlertEventOut], auth=jwt_auth)
+@paginate(PageNumberPagination, page_size=50)
+def list_sensor_alerts(request, sensor_id: int, query: ReadingListQuery = Query()):
+    """Alert events of one sensor, newest first"""
+    sensor = get_object_or_404(Sensor, id=sensor_id, owner=request.auth)
+    return filter_readings(AlertEvent.objects.filter(sensor=sensor), query)
+
+@alerts_router.get("/alerts/events/", response=List[AlertEventOut], auth=jwt_auth)
+@paginate(PageNumberPagination, page_size=50)
+def list_alerts(request, query: AlertEventQuery = Query()):
+    """Alert events of all (or the selected) sensors of the user, newest first"""
+    queryset = AlertEvent.objects.filter(sensor__owner=request.auth)
+    if query.sensor_ids:
+        queryset = queryset.filter(sensor_id__in=query.sensor_ids)
+    return filter_readings(queryset, query)
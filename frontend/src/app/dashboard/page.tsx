@@ -308,6 +308,7 @@ export default function DashboardPage() {
                         <SelectValue placeholder="Sort by" />
                       </SelectTrigger>
                       <SelectContent>
+                        <SelectItem value="relevance">Best Match</SelectItem>
                         <SelectItem value="name">Name</SelectItem>
                         <SelectItem value="model">Model</SelectItem>
                         <SelectItem value="readings_count">
@@ -143,33 +143,31 @@ export default function AllSensorsChart({ className }: AllSensorsChartProps) {
         return;
       }
 
-      // Get readings for each sensor
+      // Get downsampled readings of every listed sensor in one request
       const timestampFrom = getTimeRangeFilter();
       const timestampTo = getToDateFilter();
-      const sensorDataPromises = sensorsList.map(
-        async (sensor): Promise<SensorData> => {
-          try {
-            const readingsResponse = await readingsAPI.list(
-              sensor.id,
-              1,
-              100, 
-              timestampFrom,
-              timestampTo
-            );
-            return {
-              sensor,
-              readings: readingsResponse.items,
-            };
-          } catch {
-            return {
-              sensor,
-              readings: [],
-            };
-          }
-        }
+      const span =
+        (new Date(timestampTo).getTime() - new Date(timestampFrom).getTime()) /
+        (1000 * 60 * 60 * 24);
+      const bucket = span <= 1 ? "5m" : span <= 7 ? "1h" : "1d";
+      const series = await readingsAPI.series(
+        sensorsList.map((sensor) => sensor.id),
+        bucket,
+        timestampFrom,
+        timestampTo
       );
-
-      const allSensorData = await Promise.all(sensorDataPromises);
+      const bucketsBySensor = new Map(
+        series.map((entry) => [entry.sensor_id, entry.buckets])
+      );
+      const allSensorData: SensorData[] = sensorsList.map((sensor) => ({
+        sensor,
+        readings: (bucketsBySensor.get(sensor.id) || []).map((bucket) => ({
+          id: 0,
+          timestamp: bucket.bucket,
+          temperature: bucket.temperature_avg,
+          humidity: bucket.humidity_avg,
+        })),
+      }));
 
       const allReadings: Array<
         Reading & { sensorName: string; sensorId: number }
@@ -47,6 +47,22 @@ export interface Reading {
   timestamp: string;
 }
 
+export interface ReadingBucket {
+  bucket: string;
+  count: number;
+  temperature_min: number;
+  temperature_max: number;
+  temperature_avg: number;
+  humidity_min: number;
+  humidity_max: number;
+  humidity_avg: number;
+}
+
+export interface SensorSeries {
+  sensor_id: number;
+  buckets: ReadingBucket[];
+}
+
 export interface PaginatedResponse<T> {
   items: T[];
   count: number;
@@ -130,6 +146,22 @@ export const readingsAPI = {
     return response.data;
   },
   
+  series: async (
+    sensorIds: number[],
+    bucket: '1m' | '5m' | '1h' | '1d',
+    timestampFrom?: string,
+    timestampTo?: string
+  ): Promise<SensorSeries[]> => {
+    const params = new URLSearchParams({ bucket });
+    
+    sensorIds.forEach((id) => params.append('sensor_ids', id.toString()));
+    if (timestampFrom) params.append('timestamp_from', timestampFrom);
+    if (timestampTo) params.append('timestamp_to', timestampTo);
+    
+    const response = await api.get(`/sensors/readings/series/?${params}`);
+    return response.data;
+  },
+  
   create: async (sensorId: number, data: { temperature: number; humidity: number; timestamp: string }): Promise<Reading> => {
     const response = await api.post(`/sensors/${sensorId}/readings/`, data);
     return response.data;